@@ -0,0 +1,113 @@
+"""
+Per-user achievement bitsets.
+
+Each user has one `user_achievements` document whose `bits` field holds the
+achievements earned so far, one bit per rule of utils.scoring.ACHIEVEMENT_RULES.
+A submission ORs the bits of its score into the document with a single
+`$bit` update (write-behind batches: one per user of the batch), and a
+profile reads its achievements back with one lookup.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+from bson import Int64
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from utils.scoring import ACHIEVEMENTS, achievement_evaluator
+from leaderboard_engine import VISIBLE_FILTER
+
+logger = logging.getLogger(__name__)
+
+GUEST_USER_ID = "guest"
+BACKFILL_PROJECTION = {"_id": 0, "user_id": 1, "difficulty": 1, "completion_time": 1, "moves": 1, "score": 1}
+
+
+def _bit_update(mask: int) -> Dict:
+    return {"$bit": {"bits": {"or": Int64(mask)}}, "$set": {"updated_at": datetime.utcnow()}}
+
+
+async def record_achievements(db: AsyncIOMotorDatabase, user_id: str, mask: int):
+    """
+    Add the achievements in `mask` to the user's bitset
+    """
+    if not mask or user_id == GUEST_USER_ID:
+        return
+
+    await db.user_achievements.update_one({"user_id": user_id}, _bit_update(mask), upsert=True)
+
+
+async def record_score_achievements(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    """
+    Add the achievements of a batch of stored scores, one `$bit` per user
+    """
+    player_scores = [score for score in scores if score["user_id"] != GUEST_USER_ID]
+    if player_scores:
+        await _merge_achievements(db, player_scores)
+
+
+async def get_user_achievements(db: AsyncIOMotorDatabase, user_id: str) -> Dict:
+    """
+    Achievements earned by a user, with their definitions and total points
+    """
+    doc = await db.user_achievements.find_one({"user_id": user_id}, {"_id": 0, "bits": 1})
+    mask = int(doc["bits"]) if doc else 0
+    earned = [ACHIEVEMENTS[achievement_id] for achievement_id in achievement_evaluator.ids_for(mask)]
+
+    return {
+        "user_id": user_id,
+        "achievements": earned,
+        "total_points": sum(achievement["points"] for achievement in earned)
+    }
+
+
+async def _merge_achievements(db: AsyncIOMotorDatabase, docs: List[Dict]) -> int:
+    masks = achievement_evaluator.evaluate_batch(
+        [doc["difficulty"] for doc in docs],
+        [doc["completion_time"] for doc in docs],
+        [doc["moves"] for doc in docs],
+        [doc["score"] for doc in docs]
+    )
+
+    # OR the masks of each user's scores together
+    users, inverse = np.unique([doc["user_id"] for doc in docs], return_inverse=True)
+    user_masks = np.zeros(len(users), dtype=np.uint64)
+    np.bitwise_or.at(user_masks, inverse, masks)
+
+    updates = [
+        UpdateOne({"user_id": str(user_id)}, _bit_update(int(mask)), upsert=True)
+        for user_id, mask in zip(users, user_masks) if mask
+    ]
+    if updates:
+        await db.user_achievements.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+async def backfill_achievements(db: AsyncIOMotorDatabase, chunk_size: int = 10000) -> Dict:
+    """
+    Evaluate the achievements of every stored score and merge them into the
+    user bitsets. Bits are only ever added, so this is safe to run while
+    scores are being submitted.
+
+    Returns:
+        Totals: scores evaluated, user updates written
+    """
+    query = {**VISIBLE_FILTER, "user_id": {"$ne": GUEST_USER_ID}}
+    totals = {"scores": 0, "user_updates": 0}
+
+    chunk = []
+    async for doc in db.scores.find(query, BACKFILL_PROJECTION, batch_size=chunk_size):
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            totals["user_updates"] += await _merge_achievements(db, chunk)
+            totals["scores"] += len(chunk)
+            chunk = []
+    if chunk:
+        totals["user_updates"] += await _merge_achievements(db, chunk)
+        totals["scores"] += len(chunk)
+
+    logger.info(f"Achievement backfill: {totals['scores']} scores, {totals['user_updates']} user updates")
+    return totals
@@ -1,23 +1,34 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Depends, Request
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 import json
+import uuid
+import zipfile
 
-from models import Puzzle, PuzzleCreate, PuzzleUpdate, PuzzleImage
+from models import Puzzle, PuzzleCreate, PuzzleUpdate, ImportJob
+from persistence import to_document
+from pagination import fetch_page, PUZZLE_SORT, NEXT_CURSOR_HEADER
 from cloudinary_service import (
+    GRID_CONFIG,
     upload_puzzle_image,
-    generate_thumbnail_url,
-    generate_all_difficulty_pieces,
-    delete_puzzle_image,
-    configure_cloudinary
+    generate_puzzle_pieces,
+    generate_atlas_url,
+    atlas_layout,
+    delete_puzzle_image
 )
+from puzzle_builder import build_puzzle
+import bulk_import
+from executors import executor_stats
+from response_cache import response_cache
+from aggregates import puzzle_categories
+from encoders import TrustedAdapter
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Initialize Cloudinary on module load
-configure_cloudinary()
-
+# Serializers of the cached read endpoints
+PUZZLE_LIST_ADAPTER = TrustedAdapter(Puzzle, many=True)
+PUZZLE_ADAPTER = TrustedAdapter(Puzzle)
 
 # Dependency to get database
 async def get_db():
@@ -50,105 +61,190 @@ async def create_puzzle(
         # Upload image to Cloudinary
         upload_result = await upload_puzzle_image(file)
         
-        # Generate thumbnail URL
-        thumbnail = generate_thumbnail_url(upload_result["cloudinary_public_id"])
-        
-        # Generate puzzle pieces for all difficulties
-        piece_data = generate_all_difficulty_pieces(
-            upload_result["cloudinary_public_id"],
-            upload_result["width"],
-            upload_result["height"]
-        )
-        
-        # Create puzzle object
-        puzzle = Puzzle(
-            title=title,
-            description=description,
-            category=category,
-            tags=tags_list,
-            original_image=PuzzleImage(
-                cloudinary_public_id=upload_result["cloudinary_public_id"],
-                url=upload_result["url"],
-                width=upload_result["width"],
-                height=upload_result["height"],
-                format=upload_result["format"]
-            ),
-            thumbnail_url=thumbnail,
-            piece_data=piece_data,
-            difficulty_available=difficulty_list,
-            status=status,
-            is_featured=is_featured,
-            display_order=display_order
+        # Generate thumbnail, pieces and the puzzle object
+        await file.seek(0)
+        puzzle, puzzle_dict = await build_puzzle(
+            upload_result,
+            file.file,
+            PuzzleCreate(
+                title=title,
+                description=description,
+                category=category,
+                tags=tags_list,
+                difficulty_available=difficulty_list,
+                status=status,
+                is_featured=is_featured,
+                display_order=display_order
+            )
         )
         
         # Save to MongoDB
-        puzzle_dict = puzzle.model_dump()
-        puzzle_dict["created_at"] = puzzle_dict["created_at"].isoformat()
-        puzzle_dict["updated_at"] = puzzle_dict["updated_at"].isoformat()
-        
         await db.puzzles.insert_one(puzzle_dict)
+        await response_cache.invalidate(db)
         
         return puzzle
     
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON in tags or difficulty_available")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create puzzle: {str(e)}")
 
 
+@router.post("/puzzles/import", response_model=ImportJob, status_code=202)
+async def import_puzzles(
+    archive: UploadFile = File(...),
+    manifest: Optional[UploadFile] = File(None),
+    concurrency: Optional[int] = Form(None),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Bulk import puzzles from a ZIP archive of images.
+    The manifest (CSV or JSON with filename, title, category, tags,
+    difficulty_available, ...) is either uploaded separately or stored as
+    manifest.csv / manifest.json at the root of the archive.
+    Processing runs in the background; poll GET /admin/imports/{job_id}.
+    """
+    job_id = None
+    bulk_import.IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    staging_path = bulk_import.IMPORT_DIR / f"upload-{uuid.uuid4()}.zip"
+    
+    # Stream the archive to disk so the job can be resumed later
+    with open(staging_path, "wb") as out:
+        while True:
+            chunk = await archive.read(1024 * 1024)
+            if not chunk:
+                break
+            out.write(chunk)
+    
+    try:
+        if not zipfile.is_zipfile(staging_path):
+            raise HTTPException(status_code=400, detail="Archive must be a ZIP file")
+        
+        if manifest is not None:
+            manifest_items = bulk_import.parse_manifest(await manifest.read(), manifest.filename or "manifest.csv")
+        else:
+            bundled = bulk_import.read_archive_manifest(staging_path)
+            if bundled is None:
+                raise HTTPException(status_code=400, detail="No manifest uploaded or found in archive")
+            manifest_items = bulk_import.parse_manifest(*bundled)
+        
+        if not manifest_items:
+            raise HTTPException(status_code=400, detail="Manifest is empty")
+        
+        job = bulk_import.create_job(manifest_items, concurrency)
+        job_id = job.id
+        staging_path.rename(bulk_import.archive_path_for(job.id))
+    finally:
+        if job_id is None:
+            staging_path.unlink(missing_ok=True)
+    
+    await db.import_jobs.insert_one(to_document(job))
+    bulk_import.start_import(db, job)
+    
+    return job
+
+
+@router.get("/imports/{job_id}", response_model=ImportJob)
+async def get_import_job(
+    job_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Get the status of a bulk import job, per item
+    """
+    job = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    return job
+
+
+@router.post("/imports/{job_id}/resume", response_model=ImportJob, status_code=202)
+async def resume_import_job(
+    job_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Resume an interrupted or partially failed import: only items not yet
+    imported are processed again.
+    """
+    doc = await db.import_jobs.find_one({"id": job_id}, {"_id": 0})
+    
+    if not doc:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    if not bulk_import.archive_path_for(job_id).exists():
+        raise HTTPException(status_code=409, detail="Import archive no longer available")
+    
+    job = ImportJob(**doc)
+    if not bulk_import.start_import(db, job):
+        raise HTTPException(status_code=409, detail="Import job is already running")
+    
+    return job
+
+
 @router.get("/puzzles", response_model=List[Puzzle])
 async def get_all_puzzles(
+    request: Request,
     status: Optional[str] = None,
     category: Optional[str] = None,
     is_featured: Optional[bool] = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    include_pieces: bool = False,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
-    Get all puzzles with optional filters
+    Get all puzzles with optional filters, ordered by display_order.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
+    Piece URLs are left out unless include_pieces is set; use the pieces endpoint.
+    Cached until the catalog changes; supports If-None-Match.
     """
-    query = {}
-    
-    if status:
-        query["status"] = status
-    if category:
-        query["category"] = category
-    if is_featured is not None:
-        query["is_featured"] = is_featured
-    
-    puzzles = await db.puzzles.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(limit)
-    
-    # Convert ISO string timestamps back to datetime
-    for puzzle in puzzles:
-        if isinstance(puzzle.get("created_at"), str):
-            puzzle["created_at"] = datetime.fromisoformat(puzzle["created_at"])
-        if isinstance(puzzle.get("updated_at"), str):
-            puzzle["updated_at"] = datetime.fromisoformat(puzzle["updated_at"])
+    async def build():
+        query = {}
+        
+        if status:
+            query["status"] = status
+        if category:
+            query["category"] = category
+        if is_featured is not None:
+            query["is_featured"] = is_featured
+        
+        projection = {"_id": 0}
+        if not include_pieces:
+            projection["piece_data"] = 0
+        
+        puzzles, next_cursor = await fetch_page(
+            db.puzzles, query, projection, PUZZLE_SORT, limit, cursor=cursor, skip=skip
+        )
+        
+        return puzzles, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
     
-    return puzzles
+    return await response_cache.respond(request, build, PUZZLE_LIST_ADAPTER)
 
 
 @router.get("/puzzles/{puzzle_id}", response_model=Puzzle)
 async def get_puzzle(
     puzzle_id: str,
+    request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
-    Get a single puzzle by ID
+    Get a single puzzle by ID (cached until the puzzle changes)
     """
-    puzzle = await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0})
-    
-    if not puzzle:
-        raise HTTPException(status_code=404, detail="Puzzle not found")
-    
-    # Convert ISO string timestamps back to datetime
-    if isinstance(puzzle.get("created_at"), str):
-        puzzle["created_at"] = datetime.fromisoformat(puzzle["created_at"])
-    if isinstance(puzzle.get("updated_at"), str):
-        puzzle["updated_at"] = datetime.fromisoformat(puzzle["updated_at"])
+    async def build():
+        puzzle = await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0})
+        
+        if not puzzle:
+            raise HTTPException(status_code=404, detail="Puzzle not found")
+        
+        return puzzle, {}
     
-    return puzzle
+    return await response_cache.respond(request, build, PUZZLE_ADAPTER, puzzle_id=puzzle_id)
 
 
 @router.put("/puzzles/{puzzle_id}", response_model=Puzzle)
@@ -169,23 +265,19 @@ async def update_puzzle(
     update_dict = update_data.model_dump(exclude_unset=True)
     
     if update_dict:
-        update_dict["updated_at"] = datetime.utcnow().isoformat()
+        update_dict["updated_at"] = datetime.utcnow()
         
         # Update in MongoDB
         await db.puzzles.update_one(
             {"id": puzzle_id},
             {"$set": update_dict}
         )
+        await response_cache.invalidate(db, puzzle_id)
+        if "category" in update_dict:
+            puzzle_categories.forget(puzzle_id)
     
     # Fetch and return updated puzzle
     updated_puzzle = await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0})
-    
-    # Convert ISO string timestamps back to datetime
-    if isinstance(updated_puzzle.get("created_at"), str):
-        updated_puzzle["created_at"] = datetime.fromisoformat(updated_puzzle["created_at"])
-    if isinstance(updated_puzzle.get("updated_at"), str):
-        updated_puzzle["updated_at"] = datetime.fromisoformat(updated_puzzle["updated_at"])
-    
     return updated_puzzle
 
 
@@ -209,6 +301,8 @@ async def delete_puzzle(
     
     # Delete from MongoDB
     await db.puzzles.delete_one({"id": puzzle_id})
+    await response_cache.invalidate(db, puzzle_id)
+    puzzle_categories.forget(puzzle_id)
     
     return {"success": True, "message": "Puzzle deleted successfully"}
 
@@ -217,21 +311,72 @@ async def delete_puzzle(
 async def get_puzzle_pieces(
     puzzle_id: str,
     difficulty: str,
+    request: Request,
+    delivery: str = "urls",  # "urls" | "atlas"
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
-    Get puzzle pieces for a specific difficulty level
+    Get puzzle pieces for a specific difficulty level.
+    With delivery=atlas, returns one atlas image plus piece rectangles
+    instead of one URL per piece. Cached until the puzzle changes.
     """
-    puzzle = await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0})
+    if delivery not in ("urls", "atlas"):
+        raise HTTPException(status_code=400, detail="delivery must be 'urls' or 'atlas'")
     
-    if not puzzle:
-        raise HTTPException(status_code=404, detail="Puzzle not found")
-    
-    if difficulty not in puzzle.get("piece_data", {}):
-        raise HTTPException(status_code=400, detail=f"Difficulty '{difficulty}' not available for this puzzle")
-    
-    return {
-        "puzzle_id": puzzle_id,
-        "difficulty": difficulty,
-        "pieces": puzzle["piece_data"][difficulty]
-    }
+    async def build():
+        puzzle = await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0})
+        
+        if not puzzle:
+            raise HTTPException(status_code=404, detail="Puzzle not found")
+        
+        stored_pieces = puzzle.get("piece_data") or {}
+        if difficulty not in GRID_CONFIG or (stored_pieces and difficulty not in stored_pieces):
+            raise HTTPException(status_code=400, detail=f"Difficulty '{difficulty}' not available for this puzzle")
+        
+        if delivery == "atlas":
+            # Puzzles created before atlases existed derive it from the Cloudinary image
+            atlas_url = puzzle.get("atlas_url") or generate_atlas_url(
+                puzzle["original_image"]["cloudinary_public_id"]
+            )
+            return {
+                "puzzle_id": puzzle_id,
+                "difficulty": difficulty,
+                "delivery": "atlas",
+                "atlas_url": atlas_url,
+                **atlas_layout(difficulty)
+            }, {}
+        
+        if difficulty in stored_pieces:
+            pieces = stored_pieces[difficulty]
+        else:
+            image = puzzle["original_image"]
+            pieces = generate_puzzle_pieces(
+                image["cloudinary_public_id"],
+                image["width"],
+                image["height"],
+                difficulty
+            )
+        
+        return {
+            "puzzle_id": puzzle_id,
+            "difficulty": difficulty,
+            "pieces": pieces
+        }, {}
+        
+    return await response_cache.respond(request, build, puzzle_id=puzzle_id)
+
+
+@router.get("/executors")
+async def get_executor_stats():
+    """
+    Queue depth and throughput of the image and I/O executors
+    """
+    return executor_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Response cache size and hit counters
+    """
+    return response_cache.stats()
@@ -0,0 +1,354 @@
+"""
+Incrementally maintained player and puzzle aggregates.
+
+Every accepted score adds to running counters with `$inc`:
+
+    puzzles.metadata   total_plays, total_completions, total_completion_time
+    users.stats        total_puzzles_completed, total_play_time,
+                       category_counts.<category>
+
+Averages and the favorite category are derived from these counters by the
+UserStats / PuzzleMetadata models, so profile and puzzle pages read one
+document instead of scanning score history.
+
+Flagged scores count nowhere (as if never submitted), but flagging or
+deleting a score does not subtract it: `reconcile_aggregates` recomputes
+every counter from `scores` with aggregation pipelines. Each `$inc` also
+bumps the document's revision (`metadata.revision`, `stats.revision`);
+reconcile writes a recomputed counter only if the revision did not change
+while it was computed, and recomputes the documents that did.
+
+The category of each puzzle (for `stats.category_counts`) is cached for
+PUZZLE_CATEGORY_TTL seconds, so a submission does not look it up.
+"""
+
+import logging
+import os
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from enrichment import fetch_by_ids
+from leaderboard_engine import VISIBLE_FILTER
+
+logger = logging.getLogger(__name__)
+
+GUEST_USER_ID = "guest"
+DEFAULT_CATEGORY = "General"
+RECONCILE_BATCH_SIZE = 1000
+# Recomputations of documents changed by submissions during a reconcile
+RECONCILE_PASSES = 3
+PUZZLE_CATEGORY_TTL = float(os.environ.get("PUZZLE_CATEGORY_TTL", "300"))
+PUZZLE_CATEGORY_CACHE_SIZE = 10000
+
+PUZZLE_REVISION = "metadata.revision"
+USER_REVISION = "stats.revision"
+
+
+def category_key(category: str) -> str:
+    """
+    Category name usable as a field name in `stats.category_counts`
+    """
+    return (category or DEFAULT_CATEGORY).replace(".", "_").lstrip("$") or DEFAULT_CATEGORY
+
+
+def _puzzle_set(plays: int, completions: int, completion_time: int) -> Dict:
+    return {
+        "metadata.total_plays": plays,
+        "metadata.total_completions": completions,
+        "metadata.total_completion_time": completion_time,
+        "metadata.average_completion_time": completion_time // completions if completions else 0
+    }
+
+
+def _user_set(completed: int, play_time: int, category_counts: Dict[str, int]) -> Dict:
+    favorite = min(category_counts, key=lambda c: (-category_counts[c], c)) if category_counts else None
+    return {
+        "stats.total_puzzles_completed": completed,
+        "stats.total_play_time": play_time,
+        "stats.average_completion_time": play_time // completed if completed else 0,
+        "stats.category_counts": category_counts,
+        "stats.favorite_category": favorite
+    }
+
+
+class PuzzleCategories:
+    """
+    LRU cache of puzzle categories, entries expire after `ttl` seconds.
+    Edits call `forget`; other workers pick them up within the TTL.
+    """
+
+    def __init__(self, ttl: float = PUZZLE_CATEGORY_TTL, max_entries: int = PUZZLE_CATEGORY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+    async def get_many(self, db: AsyncIOMotorDatabase, puzzle_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        now = time.monotonic()
+        categories = {}
+        missing = []
+        for puzzle_id in dict.fromkeys(puzzle_ids):
+            entry = self._entries.get(puzzle_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(puzzle_id)
+                categories[puzzle_id] = entry[0]
+            else:
+                missing.append(puzzle_id)
+
+        if missing:
+            puzzles = await fetch_by_ids(db.puzzles, missing, {"category": 1})
+            for puzzle_id in missing:
+                category = puzzles.get(puzzle_id, {}).get("category")
+                categories[puzzle_id] = category
+                # Unknown puzzles are not cached: they may be created later
+                if puzzle_id in puzzles:
+                    self._entries[puzzle_id] = (category, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return categories
+
+    def forget(self, puzzle_id: str):
+        self._entries.pop(puzzle_id, None)
+
+
+puzzle_categories = PuzzleCategories()
+
+
+async def apply_score_aggregates(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    """
+    Add newly stored scores to the puzzle and user counters.
+    Updates are coalesced: one `$inc` per puzzle and per user.
+    """
+    scores = [score for score in scores if score.get("is_validated") is not False]
+
+    puzzle_incs: Dict[str, Counter] = defaultdict(Counter)
+    for score in scores:
+        inc = puzzle_incs[score["puzzle_id"]]
+        inc["metadata.total_plays"] += 1
+        inc["metadata.total_completions"] += 1
+        inc["metadata.total_completion_time"] += score["completion_time"]
+        inc[PUZZLE_REVISION] += 1
+
+    player_scores = [score for score in scores if score["user_id"] != GUEST_USER_ID]
+    user_incs: Dict[str, Counter] = defaultdict(Counter)
+    if player_scores:
+        # Category of each puzzle, for the per-category counters
+        categories = await puzzle_categories.get_many(db, (score["puzzle_id"] for score in player_scores))
+        for score in player_scores:
+            inc = user_incs[score["user_id"]]
+            inc["stats.total_puzzles_completed"] += 1
+            inc["stats.total_play_time"] += score["completion_time"]
+            inc[f"stats.category_counts.{category_key(categories[score['puzzle_id']])}"] += 1
+            inc[USER_REVISION] += 1
+
+    if puzzle_incs:
+        await db.puzzles.bulk_write(
+            [UpdateOne({"id": puzzle_id}, {"$inc": dict(inc)}) for puzzle_id, inc in puzzle_incs.items()],
+            ordered=False
+        )
+    if user_incs:
+        await db.users.bulk_write(
+            [UpdateOne({"id": user_id}, {"$inc": dict(inc)}) for user_id, inc in user_incs.items()],
+            ordered=False
+        )
+
+
+def _field(doc: Dict, path: str):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+async def _revisions(
+    collection: AsyncIOMotorCollection,
+    revision_field: str,
+    ids: Optional[List[str]] = None
+) -> Dict[str, Optional[int]]:
+    query = {} if ids is None else {"id": {"$in": ids}}
+    return {
+        doc["id"]: _field(doc, revision_field)
+        async for doc in collection.find(query, {"_id": 0, "id": 1, revision_field: 1})
+    }
+
+
+class _ConditionalSets:
+    """
+    Batched `$set`s of recomputed counters, each applied only if the
+    document's revision still equals the one read before the recomputation
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, revision_field: str, revisions: Dict):
+        self.collection = collection
+        self.revision_field = revision_field
+        self.revisions = revisions
+        self.batch: Dict[str, Dict] = {}
+        self.written = 0
+        # Documents changed meanwhile, to recompute
+        self.changed: List[str] = []
+
+    async def set(self, doc_id: str, fields: Dict):
+        self.batch[doc_id] = fields
+        if len(self.batch) >= RECONCILE_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, {}
+        await self.collection.bulk_write(
+            [
+                # A missing revision is matched by None
+                UpdateOne({"id": doc_id, self.revision_field: self.revisions.get(doc_id)}, {"$set": fields})
+                for doc_id, fields in batch.items()
+            ],
+            ordered=False
+        )
+        current = await _revisions(self.collection, self.revision_field, list(batch))
+        changed = [doc_id for doc_id, revision in current.items() if revision != self.revisions.get(doc_id)]
+        self.changed += changed
+        self.written += len(current) - len(changed)
+
+
+async def _reconcile(
+    collection: AsyncIOMotorCollection,
+    revision_field: str,
+    nonzero_field: str,
+    reset: Dict,
+    recompute
+) -> int:
+    """
+    Write the counters produced by `recompute(ids)` ((id, fields) pairs; ids
+    None for all documents) and zero the documents it no longer produces.
+
+    Returns:
+        Number of documents updated
+    """
+    ids = None
+    updated = 0
+    for _ in range(RECONCILE_PASSES):
+        # Read before the scores are aggregated: a later $inc changes the revision
+        sets = _ConditionalSets(collection, revision_field, await _revisions(collection, revision_field, ids))
+
+        seen = set()
+        async for doc_id, fields in recompute(ids):
+            seen.add(doc_id)
+            await sets.set(doc_id, fields)
+
+        # Zero the counters of documents that no longer have any counted score
+        stale_query = {nonzero_field: {"$gt": 0}}
+        if ids is not None:
+            stale_query["id"] = {"$in": ids}
+        async for doc in collection.find(stale_query, {"_id": 0, "id": 1}):
+            if doc["id"] not in seen:
+                await sets.set(doc["id"], reset)
+
+        await sets.flush()
+        updated += sets.written
+        ids = sets.changed
+        if not ids:
+            break
+    else:
+        logger.warning(f"{collection.name}: {len(ids)} documents changed during every reconcile pass, skipped")
+
+    return updated
+
+
+async def _puzzle_rows(db: AsyncIOMotorDatabase, ids: Optional[List[str]]) -> AsyncIterator[Tuple[str, Dict]]:
+    match = dict(VISIBLE_FILTER)
+    if ids is not None:
+        match["puzzle_id"] = {"$in": ids}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": "$puzzle_id", "plays": {"$sum": 1}, "completion_time": {"$sum": "$completion_time"}}}
+    ]
+
+    async for row in db.scores.aggregate(pipeline, allowDiskUse=True):
+        # Every counted play is a completion
+        yield row["_id"], _puzzle_set(row["plays"], row["plays"], row["completion_time"])
+
+
+async def reconcile_puzzles(db: AsyncIOMotorDatabase) -> int:
+    """
+    Recompute puzzle counters from scores
+
+    Returns:
+        Number of puzzles updated
+    """
+    return await _reconcile(
+        db.puzzles, PUZZLE_REVISION, "metadata.total_plays", _puzzle_set(0, 0, 0),
+        lambda ids: _puzzle_rows(db, ids)
+    )
+
+
+def _user_row(current: Dict) -> Tuple[str, Dict]:
+    return current["user_id"], _user_set(current["completed"], current["play_time"], dict(current["categories"]))
+
+
+async def _user_rows(
+    db: AsyncIOMotorDatabase,
+    categories: Dict[str, str],
+    ids: Optional[List[str]]
+) -> AsyncIterator[Tuple[str, Dict]]:
+    match = {**VISIBLE_FILTER, "user_id": {"$ne": GUEST_USER_ID}}
+    if ids is not None:
+        match["user_id"] = {"$in": [user_id for user_id in ids if user_id != GUEST_USER_ID]}
+
+    # One row per (user, puzzle), streamed in user order
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "puzzle_id": "$puzzle_id"},
+            "completed": {"$sum": 1},
+            "play_time": {"$sum": "$completion_time"}
+        }},
+        {"$sort": {"_id.user_id": 1}}
+    ]
+
+    current = None
+    async for row in db.scores.aggregate(pipeline, allowDiskUse=True):
+        user_id = row["_id"]["user_id"]
+        if current is None or current["user_id"] != user_id:
+            if current is not None:
+                yield _user_row(current)
+            current = {"user_id": user_id, "completed": 0, "play_time": 0, "categories": Counter()}
+
+        current["completed"] += row["completed"]
+        current["play_time"] += row["play_time"]
+        current["categories"][categories.get(row["_id"]["puzzle_id"], DEFAULT_CATEGORY)] += row["completed"]
+
+    if current is not None:
+        yield _user_row(current)
+
+
+async def reconcile_users(db: AsyncIOMotorDatabase) -> int:
+    """
+    Recompute player stats from scores
+
+    Returns:
+        Number of users updated
+    """
+    categories = {
+        doc["id"]: category_key(doc.get("category"))
+        async for doc in db.puzzles.find({}, {"_id": 0, "id": 1, "category": 1})
+    }
+
+    return await _reconcile(
+        db.users, USER_REVISION, "stats.total_puzzles_completed", _user_set(0, 0, {}),
+        lambda ids: _user_rows(db, categories, ids)
+    )
+
+
+async def reconcile_aggregates(db: AsyncIOMotorDatabase) -> Dict:
+    """
+    Recompute every puzzle and user aggregate from the scores collection
+    """
+    totals = {
+        "puzzles": await reconcile_puzzles(db),
+        "users": await reconcile_users(db)
+    }
+    logger.info(f"Aggregates reconciled: {totals['puzzles']} puzzles, {totals['users']} users")
+    return totals
@@ -0,0 +1,275 @@
+"""
+Bulk puzzle import from a ZIP archive and a CSV/JSON manifest.
+
+Every manifest row goes through the same pipeline as a single upload:
+
+    extract -> validate/compress -> Cloudinary upload -> pieces -> insert_many
+
+Rows are processed with bounded concurrency and inserted in batches. Job
+progress is persisted in `import_jobs` after every batch, so an interrupted
+job can be resumed: only rows not yet marked "done" are processed again.
+Cloudinary public ids and puzzle ids are derived from (job id, row index),
+which makes re-processing a row idempotent.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from models import ImportItemStatus, ImportJob, PuzzleCreate, PuzzleImportItem
+from cloudinary_service import (
+    MAX_UPLOAD_BYTES,
+    SPOOL_MEMORY_LIMIT,
+    UPLOAD_CHUNK_SIZE,
+    upload_image_stream
+)
+from puzzle_builder import build_puzzle
+from executors import image_executor
+from response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_DIR = Path(os.environ.get("IMPORT_DIR", Path(__file__).parent / "import_archives"))
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", "4"))
+INSERT_BATCH_SIZE = 20
+MANIFEST_NAMES = ("manifest.json", "manifest.csv")
+LIST_FIELDS = ("tags", "difficulty_available")
+
+# Import jobs currently running in this process
+_running: Dict[str, asyncio.Task] = {}
+
+
+# ---------- manifest ----------
+
+def _parse_list(value: str) -> List[str]:
+    """
+    CSV list cell: a JSON array or a "|"-separated string
+    """
+    value = value.strip()
+    if not value:
+        return []
+    if value.startswith("["):
+        return json.loads(value)
+    return [part.strip() for part in value.split("|") if part.strip()]
+
+
+def parse_manifest(data: bytes, filename: str) -> List[PuzzleImportItem]:
+    """
+    Parse a JSON (list of objects) or CSV (header row) manifest
+    """
+    try:
+        if filename.lower().endswith(".json"):
+            rows = json.loads(data)
+            if isinstance(rows, dict):
+                rows = rows.get("items", [])
+        else:
+            rows = []
+            for row in csv.DictReader(io.StringIO(data.decode("utf-8-sig"))):
+                row = {key: value for key, value in row.items() if value not in (None, "")}
+                for field in LIST_FIELDS:
+                    if field in row:
+                        row[field] = _parse_list(row[field])
+                rows.append(row)
+
+        return [PuzzleImportItem(**row) for row in rows]
+
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid manifest: {str(e)}")
+
+
+def read_archive_manifest(archive_path: Path) -> Optional[Tuple[bytes, str]]:
+    """
+    Manifest bundled at the root of the archive, if any
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        names = set(archive.namelist())
+        for name in MANIFEST_NAMES:
+            if name in names:
+                return archive.read(name), name
+    return None
+
+
+def extract_entry(archive_path: Path, filename: str) -> BinaryIO:
+    """
+    Stream one archive entry into a spooled temp file (blocking)
+    """
+    with zipfile.ZipFile(archive_path) as archive:
+        try:
+            info = archive.getinfo(filename)
+        except KeyError:
+            raise ValueError(f"'{filename}' not found in archive")
+
+        if info.file_size > MAX_UPLOAD_BYTES:
+            raise ValueError(f"'{filename}' larger than {MAX_UPLOAD_BYTES // (1024 * 1024)}MB")
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+        with archive.open(info) as entry:
+            shutil.copyfileobj(entry, spool, UPLOAD_CHUNK_SIZE)
+
+    spool.seek(0)
+    return spool
+
+
+def archive_path_for(job_id: str) -> Path:
+    return IMPORT_DIR / f"{job_id}.zip"
+
+
+# ---------- jobs ----------
+
+def create_job(manifest: List[PuzzleImportItem], concurrency: Optional[int] = None) -> ImportJob:
+    return ImportJob(
+        concurrency=concurrency or IMPORT_CONCURRENCY,
+        total=len(manifest),
+        manifest=manifest,
+        items=[ImportItemStatus(filename=item.filename, title=item.title) for item in manifest]
+    )
+
+
+class ImportRunner:
+    """
+    Processes the pending rows of one import job
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, job: ImportJob):
+        self.db = db
+        self.job = job
+        self.archive_path = archive_path_for(job.id)
+        self._batch: List[Tuple[int, Dict]] = []
+        self._flush_lock = asyncio.Lock()
+
+    def _row_puzzle_id(self, index: int) -> str:
+        return str(uuid.uuid5(uuid.UUID(self.job.id), str(index)))
+
+    async def _save_progress(self, indexes: List[int]):
+        job = self.job
+        job.done = sum(1 for item in job.items if item.status == "done")
+        job.failed = sum(1 for item in job.items if item.status == "failed")
+        job.updated_at = datetime.utcnow()
+
+        update = {"done": job.done, "failed": job.failed, "status": job.status, "updated_at": job.updated_at}
+        for index in indexes:
+            update[f"items.{index}"] = job.items[index].model_dump()
+
+        await self.db.import_jobs.update_one({"id": job.id}, {"$set": update})
+
+    async def _fail(self, index: int, error: str):
+        item = self.job.items[index]
+        item.status = "failed"
+        item.error = error
+        await self._save_progress([index])
+
+    async def _flush(self):
+        async with self._flush_lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+
+            failed = {}
+            try:
+                await self.db.puzzles.insert_many([doc for _, doc in batch], ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    # Duplicate id: row inserted by an earlier, interrupted run
+                    if error.get("code") != 11000:
+                        failed[error["index"]] = error.get("errmsg", "insert failed")
+
+            for position, (index, doc) in enumerate(batch):
+                item = self.job.items[index]
+                if position in failed:
+                    item.status = "failed"
+                    item.error = failed[position]
+                else:
+                    item.status = "done"
+                    item.puzzle_id = doc["id"]
+                    item.error = None
+
+            await response_cache.invalidate(self.db)
+            await self._save_progress([index for index, _ in batch])
+
+    async def _process(self, index: int, semaphore: asyncio.Semaphore):
+        spec = self.job.manifest[index]
+
+        async with semaphore:
+            try:
+                source = await image_executor.run(extract_entry, self.archive_path, spec.filename)
+                try:
+                    upload_result = await upload_image_stream(
+                        source,
+                        public_id=f"import-{self.job.id}-{index}",
+                        overwrite=True
+                    )
+                    _, puzzle_dict = await build_puzzle(
+                        upload_result,
+                        source,
+                        PuzzleCreate(**spec.model_dump(exclude={"filename"})),
+                        puzzle_id=self._row_puzzle_id(index)
+                    )
+                finally:
+                    source.close()
+            except HTTPException as e:
+                await self._fail(index, str(e.detail))
+                return
+            except Exception as e:
+                await self._fail(index, str(e))
+                return
+
+        self._batch.append((index, puzzle_dict))
+        if len(self._batch) >= INSERT_BATCH_SIZE:
+            await self._flush()
+
+    async def run(self):
+        job = self.job
+        pending = [index for index, item in enumerate(job.items) if item.status != "done"]
+
+        job.status = "running"
+        for index in pending:
+            job.items[index].status = "pending"
+            job.items[index].error = None
+        await self._save_progress(pending)
+
+        semaphore = asyncio.Semaphore(job.concurrency)
+        await asyncio.gather(*(self._process(index, semaphore) for index in pending))
+        await self._flush()
+
+        job.status = "completed_with_errors" if any(item.status == "failed" for item in job.items) else "completed"
+        await self._save_progress([])
+
+        if job.status == "completed":
+            self.archive_path.unlink(missing_ok=True)
+
+        logger.info(f"Import {job.id}: {job.done}/{job.total} imported, {job.failed} failed")
+
+
+def start_import(db: AsyncIOMotorDatabase, job: ImportJob) -> bool:
+    """
+    Run an import job in the background. Returns False if it is already running.
+    """
+    if job.id in _running:
+        return False
+
+    async def run():
+        try:
+            await ImportRunner(db, job).run()
+        except Exception as e:
+            logger.error(f"Import {job.id} crashed: {str(e)}")
+            await db.import_jobs.update_one({"id": job.id}, {"$set": {"status": "interrupted"}})
+        finally:
+            _running.pop(job.id, None)
+
+    _running[job.id] = asyncio.create_task(run())
+    return True
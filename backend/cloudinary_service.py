@@ -1,12 +1,11 @@
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, List, Tuple
 import os
-import math
+import tempfile
+from functools import lru_cache
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-import io
+
+from executors import image_executor, io_executor
+from metrics import CLOUDINARY_SECONDS, IMAGE_SECONDS, timed_call
 
 # Grid configurations
 GRID_CONFIG = {
@@ -18,77 +17,211 @@ GRID_CONFIG = {
     "master": {"rows": 7, "cols": 7}
 }
 
+# STANDARDIZED IMAGE SIZE: 1260x1260 (quadrato, divisibile per 2,3,4,5,6,7)
+# 1260 = LCM(2,3,4,5,6,7) * 3 = 420 * 3
+# Divisione perfetta:
+# - Beginner 2x2: 630px per pezzo
+# - Easy 3x3: 420px per pezzo
+# - Medium 4x4: 315px per pezzo
+# - Hard 5x5: 252px per pezzo
+# - Expert 6x6: 210px per pezzo
+# - Master 7x7: 180px per pezzo
+STANDARD_SIZE = 1260
+
+# Sprite atlas: the fill-crop shared by every piece transformation.
+# Also requested as an eager transformation at upload, so it must stay
+# identical to the chain of the atlas URL to reuse the pre-rendered asset.
+ATLAS_TRANSFORMATION = [
+    {"width": STANDARD_SIZE, "height": STANDARD_SIZE, "crop": "fill", "gravity": "auto"},
+    {"quality": "auto:best"}
+]
+
+# Upload pipeline limits: peak memory per upload is roughly the upload's
+# in-memory spool (Starlette keeps 1MB, SPOOL_MEMORY_LIMIT for our own spools)
+# plus one decoded bitmap. JPEGs are decoded at a reduced DCT scale (draft()),
+# other formats at full size, hence their lower pixel limit (~96MB as RGBA).
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+SPOOL_MEMORY_LIMIT = 2 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+MAX_IMAGE_PIXELS = 80_000_000
+MAX_FULL_DECODE_PIXELS = 24_000_000
+DRAFT_FORMATS = {"JPEG", "MPO"}
+ALLOWED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "GIF", "BMP", "TIFF"}
+
+# (public_id, difficulty) entries kept by the piece URL generator
+PIECE_URL_CACHE_SIZE = 2048
+
+
+_configured = False
+
 
 def configure_cloudinary():
     """Configure Cloudinary with environment variables"""
+    global _configured
+    import cloudinary
+    
     cloudinary.config(
         cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
         api_key=os.getenv('CLOUDINARY_API_KEY'),
         api_secret=os.getenv('CLOUDINARY_API_SECRET'),
         secure=True
     )
+    _configured = True
 
 
-async def upload_puzzle_image(file: UploadFile) -> Dict:
+def cloudinary_sdk():
     """
-    Upload puzzle image to Cloudinary with automatic compression for large files
-    Returns: dict with public_id, url, width, height, format
+    The Cloudinary SDK, imported and configured on first use so that
+    neither slows down startup
+    """
+    import cloudinary
+    import cloudinary.uploader
+    
+    if not _configured:
+        configure_cloudinary()
+    return cloudinary
+
+
+def upload_stream(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> BinaryIO:
+    """
+    The upload's own spooled temp file (Starlette already spilled it to disk
+    beyond 1MB), rewound, after checking its size. Not copied: the request
+    owns and closes it.
+    """
+    stream = file.file
+    if _stream_size(stream) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_bytes // (1024 * 1024)}MB")
+    return stream
+
+
+def inspect_image(source: BinaryIO) -> Dict:
+    """
+    Validate an image from its header only, without decoding the pixels.
+    Returns: dict with format, width, height, mode
     """
     try:
-        # Validate file type
-        if not file.content_type or not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read file contents
-        contents = await file.read()
-        
-        # Check file size and compress if necessary
-        MAX_SIZE_MB = 10  # Cloudinary free tier limit: 10MB for optimal performance
-        file_size_mb = len(contents) / (1024 * 1024)
+        from PIL import Image
         
-        if file_size_mb > MAX_SIZE_MB:
-            # Compress/resize image using PIL
-            img = Image.open(io.BytesIO(contents))
-            
-            # Convert RGBA to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Resize to reasonable dimensions (max 4000px on longest side)
-            MAX_DIMENSION = 4000
-            if max(img.size) > MAX_DIMENSION:
-                ratio = MAX_DIMENSION / max(img.size)
-                new_size = tuple(int(dim * ratio) for dim in img.size)
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Compress to JPEG with high quality
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            contents = output.getvalue()
-            
-            print(f"Image compressed: {file_size_mb:.2f}MB → {len(contents)/(1024*1024):.2f}MB")
+        with Image.open(source) as img:
+            info = {"format": img.format, "width": img.width, "height": img.height, "mode": img.mode}
+    except Exception:
+        raise HTTPException(status_code=400, detail="File is not a valid image")
+    finally:
+        source.seek(0)
+    
+    if info["format"] not in ALLOWED_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported image format: {info['format']}")
+    max_pixels = MAX_IMAGE_PIXELS if info["format"] in DRAFT_FORMATS else MAX_FULL_DECODE_PIXELS
+    if info["width"] * info["height"] > max_pixels:
+        raise HTTPException(status_code=400, detail="Image dimensions too large")
+    
+    return info
+
+
+def compress_image(source: BinaryIO) -> BinaryIO:
+    """
+    Downscale and re-encode an oversized image as JPEG (CPU-bound, blocking).
+    JPEGs are decoded at a reduced DCT scale via draft(), so the full-size
+    bitmap is never materialized.
+    """
+    from PIL import Image
+    
+    MAX_DIMENSION = 4000
+    
+    img = Image.open(source)
+    img.draft("RGB", (MAX_DIMENSION, MAX_DIMENSION))
+    
+    # Palette images resample poorly, expand them first
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    
+    # Resize to reasonable dimensions (max 4000px on longest side)
+    img.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+    
+    # Convert RGBA to RGB if necessary
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    # Compress to JPEG with high quality
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+    img.save(output, format='JPEG', quality=85, optimize=True)
+    output.seek(0)
+    return output
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    return size
+
+
+async def upload_image_stream(source: BinaryIO, **upload_options) -> Dict:
+    """
+    Validate, compress if necessary and upload an image stream to Cloudinary.
+    Image processing and the SDK upload run on the bounded executors, so the
+    event loop only awaits their results. The caller keeps ownership of source.
+    Returns: dict with public_id, url, width, height, format
+    """
+    await image_executor.run(IMAGE_SECONDS.timed(inspect_image, "inspect"), source)
+    
+    # Check file size and compress if necessary
+    MAX_SIZE_MB = 10  # Cloudinary free tier limit: 10MB for optimal performance
+    file_size_mb = _stream_size(source) / (1024 * 1024)
+    
+    contents = source
+    if file_size_mb > MAX_SIZE_MB:
+        # Compress/resize image using PIL
+        contents = await image_executor.run(IMAGE_SECONDS.timed(compress_image, "compress"), source)
         
+        print(f"Image compressed: {file_size_mb:.2f}MB → {_stream_size(contents)/(1024*1024):.2f}MB")
+    
+    try:
         # Upload to Cloudinary with optimized settings
-        result = cloudinary.uploader.upload(
+        result = await io_executor.run(
+            timed_call(CLOUDINARY_SECONDS, cloudinary_sdk().uploader.upload, "upload"),
             contents,
             folder="mavi-puzzles",
             resource_type="image",
             quality="auto:best",
-            tags=["puzzle", "mavi", "historical"]
+            tags=["puzzle", "mavi", "historical"],
+            # Pre-render the sprite atlas so the first player does not pay for it
+            eager=[{"transformation": ATLAS_TRANSFORMATION}],
+            eager_async=True,
+            **upload_options
         )
+    finally:
+        if contents is not source:
+            contents.close()
+    
+    return {
+        "cloudinary_public_id": result["public_id"],
+        "url": result["secure_url"],
+        "width": result["width"],
+        "height": result["height"],
+        "format": result["format"]
+    }
+
+
+async def upload_puzzle_image(file: UploadFile) -> Dict:
+    """
+    Upload puzzle image to Cloudinary with automatic compression for large files.
+    The upload's spooled temp file is validated from its header before any
+    decoding and uploaded without being copied.
+    Returns: dict with public_id, url, width, height, format
+    """
+    try:
+        # Validate file type
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
         
-        return {
-            "cloudinary_public_id": result["public_id"],
-            "url": result["secure_url"],
-            "width": result["width"],
-            "height": result["height"],
-            "format": result["format"]
-        }
+        return await upload_image_stream(upload_stream(file))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
 
@@ -97,7 +230,7 @@ def generate_thumbnail_url(public_id: str, width: int = 300, height: int = 225)
     """
     Generate thumbnail URL using Cloudinary transformations
     """
-    return cloudinary.CloudinaryImage(public_id).build_url(
+    return cloudinary_sdk().CloudinaryImage(public_id).build_url(
         width=width,
         height=height,
         crop="fill",
@@ -126,26 +259,22 @@ def generate_puzzle_pieces(public_id: str, image_width: int, image_height: int,
     if difficulty not in GRID_CONFIG:
         raise ValueError(f"Invalid difficulty: {difficulty}")
     
+    # URLs depend only on public_id and difficulty, so they are memoized
+    return list(_cached_piece_urls(public_id, difficulty))
+
+
+@lru_cache(maxsize=PIECE_URL_CACHE_SIZE)
+def _cached_piece_urls(public_id: str, difficulty: str) -> Tuple[str, ...]:
     config = GRID_CONFIG[difficulty]
     rows = config["rows"]
     cols = config["cols"]
     
-    # STANDARDIZED IMAGE SIZE: 1260x1260 (quadrato, divisibile per 2,3,4,5,6,7)
-    # 1260 = LCM(2,3,4,5,6,7) * 3 = 420 * 3
-    # Divisione perfetta:
-    # - Beginner 2x2: 630px per pezzo
-    # - Easy 3x3: 420px per pezzo
-    # - Medium 4x4: 315px per pezzo
-    # - Hard 5x5: 252px per pezzo
-    # - Expert 6x6: 210px per pezzo
-    # - Master 7x7: 180px per pezzo
-    STANDARD_SIZE = 1260
-    
     # Calculate perfect piece dimensions (no rounding needed!)
     piece_width = STANDARD_SIZE // cols
     piece_height = STANDARD_SIZE // rows
     
     piece_urls = []
+    cloudinary = cloudinary_sdk()
     
     for row in range(rows):
         for col in range(cols):
@@ -180,7 +309,44 @@ def generate_puzzle_pieces(public_id: str, image_width: int, image_height: int,
             
             piece_urls.append(piece_url)
     
-    return piece_urls
+    return tuple(piece_urls)
+
+
+def generate_atlas_url(public_id: str) -> str:
+    """
+    Generate the sprite atlas URL: the image fill-cropped to STANDARD_SIZE,
+    i.e. the first step shared by every piece transformation.
+    """
+    return cloudinary_sdk().CloudinaryImage(public_id).build_url(transformation=ATLAS_TRANSFORMATION)
+
+
+def atlas_layout(difficulty: str) -> Dict:
+    """
+    Piece rectangles inside the atlas for a difficulty, in the same
+    row-major order as generate_puzzle_pieces.
+    
+    Returns:
+        Dict with atlas size, grid and a list of [x, y, width, height] rects
+    """
+    if difficulty not in GRID_CONFIG:
+        raise ValueError(f"Invalid difficulty: {difficulty}")
+    
+    rows = GRID_CONFIG[difficulty]["rows"]
+    cols = GRID_CONFIG[difficulty]["cols"]
+    piece_width = STANDARD_SIZE // cols
+    piece_height = STANDARD_SIZE // rows
+    
+    return {
+        "width": STANDARD_SIZE,
+        "height": STANDARD_SIZE,
+        "rows": rows,
+        "cols": cols,
+        "rects": [
+            [col * piece_width, row * piece_height, piece_width, piece_height]
+            for row in range(rows)
+            for col in range(cols)
+        ]
+    }
 
 
 def generate_all_difficulty_pieces(public_id: str, image_width: int, image_height: int) -> Dict[str, List[str]]:
@@ -203,7 +369,9 @@ async def delete_puzzle_image(public_id: str) -> bool:
     Delete image from Cloudinary
     """
     try:
-        result = cloudinary.uploader.destroy(public_id)
+        result = await io_executor.run(
+            timed_call(CLOUDINARY_SECONDS, cloudinary_sdk().uploader.destroy, "destroy"), public_id
+        )
         return result.get("result") == "ok"
     except Exception as e:
         print(f"Error deleting image: {str(e)}")
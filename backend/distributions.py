@@ -0,0 +1,292 @@
+"""
+Score distributions per (puzzle, difficulty) as fixed-bucket histograms.
+
+Each metric (completion_time, moves, score) has fixed bucket edges, so a
+distribution is just a vector of bucket counts: recording a result is one
+`$inc` per metric, and two distributions merge by adding their counts. The
+per-worker `$inc` updates therefore merge on the shared MongoDB document,
+and distributions of several puzzles merge into one for cross-puzzle views.
+
+Percentiles are read from the cumulative bucket counts, interpolating
+within a bucket, so the cost depends on the number of buckets, not on the
+number of scores. Time and moves buckets are logarithmic (about 2.5%
+relative error); score buckets are 100 points wide.
+
+Documents (`score_distributions`) store only non-empty buckets:
+
+    {"puzzle_id": ..., "difficulty": ..., "count": 1234,
+     "completion_time": {"87": 12, "88": 30, ...}, "moves": {...}, "score": {...}}
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from leaderboard_engine import VISIBLE_FILTER
+
+logger = logging.getLogger(__name__)
+
+
+def _log_edges(low: float, high: float, growth: float) -> np.ndarray:
+    count = int(np.ceil(np.log(high / low) / np.log(growth))) + 1
+    # Integer edges: small values get exact buckets
+    return np.unique(np.ceil(low * growth ** np.arange(count)))
+
+
+# Bucket i holds values in [edges[i - 1], edges[i]); the first and last
+# buckets are open-ended.
+METRIC_EDGES: Dict[str, np.ndarray] = {
+    "completion_time": _log_edges(1000, 24 * 3600 * 1000, 1.05),  # 1s .. 24h, in ms
+    "moves": _log_edges(1, 100000, 1.05),
+    "score": np.arange(0, 30001, 100, dtype=np.float64),
+}
+
+# Metrics where a larger value is a better result
+HIGHER_IS_BETTER = {"score"}
+
+DISTRIBUTION_PROJECTION = {"_id": 0, "count": 1, **{metric: 1 for metric in METRIC_EDGES}}
+
+
+class QuantileSketch:
+    """
+    Fixed-bucket histogram of one metric
+    """
+
+    def __init__(self, metric: str, counts: Optional[np.ndarray] = None):
+        self.metric = metric
+        self.edges = METRIC_EDGES[metric]
+        self.counts = counts if counts is not None else np.zeros(len(self.edges) + 1, dtype=np.int64)
+
+    @classmethod
+    def from_document(cls, metric: str, buckets: Optional[Dict[str, int]]) -> "QuantileSketch":
+        sketch = cls(metric)
+        for index, count in (buckets or {}).items():
+            if int(index) < len(sketch.counts):
+                sketch.counts[int(index)] += count
+        return sketch
+
+    def to_document(self) -> Dict[str, int]:
+        return {str(index): int(self.counts[index]) for index in np.flatnonzero(self.counts)}
+
+    def bucket(self, value: float) -> int:
+        return int(np.searchsorted(self.edges, value, side="right"))
+
+    def add(self, values) -> "QuantileSketch":
+        indexes = np.searchsorted(self.edges, np.asarray(values, dtype=np.float64), side="right")
+        self.counts += np.bincount(indexes, minlength=len(self.counts))
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self.counts += other.counts
+        return self
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def _bounds(self, index: int):
+        low = self.edges[index - 1] if index > 0 else None
+        high = self.edges[index] if index < len(self.edges) else None
+        return low, high
+
+    def cdf(self, value: float) -> float:
+        """
+        Estimated fraction of recorded values below `value`
+        """
+        total = self.total
+        if not total:
+            return 0.0
+
+        index = self.bucket(value)
+        below = self.counts[:index].sum()
+        low, high = self._bounds(index)
+        # Position inside the bucket, assuming values spread evenly
+        fraction = 0.5 if low is None or high is None else (value - low) / (high - low)
+        return float((below + self.counts[index] * fraction) / total)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimated value at quantile q (0..1)
+        """
+        total = self.total
+        if not total:
+            return None
+
+        cumulative = np.cumsum(self.counts)
+        target = q * total
+        index = int(np.searchsorted(cumulative, target, side="left"))
+        index = min(index, len(self.counts) - 1)
+        low, high = self._bounds(index)
+        if low is None:
+            return float(high)
+        if high is None:
+            return float(low)
+
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (target - before) / self.counts[index] if self.counts[index] else 0.0
+        return float(low + (high - low) * fraction)
+
+    def histogram(self) -> List[Dict]:
+        """
+        Non-empty buckets as {min, max, count}; open ends are None
+        """
+        result = []
+        for index in np.flatnonzero(self.counts):
+            low, high = self._bounds(index)
+            result.append({
+                "min": None if low is None else float(low),
+                "max": None if high is None else float(high),
+                "count": int(self.counts[index])
+            })
+        return result
+
+
+class ScoreDistribution:
+    """
+    The sketches of every metric for one (puzzle, difficulty), or a merge of several
+    """
+
+    def __init__(self, count: int = 0, sketches: Optional[Dict[str, QuantileSketch]] = None):
+        self.count = count
+        self.sketches = sketches or {metric: QuantileSketch(metric) for metric in METRIC_EDGES}
+
+    @classmethod
+    def from_document(cls, doc: Dict) -> "ScoreDistribution":
+        return cls(
+            doc.get("count", 0),
+            {metric: QuantileSketch.from_document(metric, doc.get(metric)) for metric in METRIC_EDGES}
+        )
+
+    def to_document(self) -> Dict:
+        return {"count": self.count, **{metric: sketch.to_document() for metric, sketch in self.sketches.items()}}
+
+    def merge(self, other: "ScoreDistribution") -> "ScoreDistribution":
+        self.count += other.count
+        for metric, sketch in self.sketches.items():
+            sketch.merge(other.sketches[metric])
+        return self
+
+    def standing(self, values: Dict[str, float]) -> Dict[str, Dict]:
+        """
+        How each given value compares with the recorded results.
+        `beats` is the estimated fraction of results that are worse.
+        """
+        result = {}
+        for metric, sketch in self.sketches.items():
+            entry = {
+                "median": sketch.quantile(0.5),
+                "p90": sketch.quantile(0.9),
+                "histogram": sketch.histogram()
+            }
+            value = values.get(metric)
+            if value is not None:
+                below = sketch.cdf(value)
+                beats = below if metric in HIGHER_IS_BETTER else 1.0 - below
+                entry.update({"value": value, "beats": round(beats, 4), "percentile": round(beats * 100, 1)})
+            result[metric] = entry
+        return result
+
+
+def _distribution_key(score: Dict):
+    return score["puzzle_id"], score["difficulty"]
+
+
+async def record_distributions(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    """
+    Add stored scores to their distributions (one `$inc` per puzzle/difficulty)
+    """
+    incs: Dict[tuple, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for score in scores:
+        inc = incs[_distribution_key(score)]
+        inc["count"] += 1
+        for metric, edges in METRIC_EDGES.items():
+            bucket = int(np.searchsorted(edges, score[metric], side="right"))
+            inc[f"{metric}.{bucket}"] += 1
+
+    if incs:
+        await db.score_distributions.bulk_write(
+            [
+                UpdateOne({"puzzle_id": puzzle_id, "difficulty": difficulty}, {"$inc": dict(inc)}, upsert=True)
+                for (puzzle_id, difficulty), inc in incs.items()
+            ],
+            ordered=False
+        )
+
+
+async def load_distribution(
+    db: AsyncIOMotorDatabase,
+    difficulty: str,
+    puzzle_id: Optional[str] = None
+) -> ScoreDistribution:
+    """
+    Distribution of one puzzle, or of every puzzle at this difficulty
+    merged together when puzzle_id is None
+    """
+    query = {"difficulty": difficulty}
+    if puzzle_id:
+        query["puzzle_id"] = puzzle_id
+
+    distribution = ScoreDistribution()
+    async for doc in db.score_distributions.find(query, DISTRIBUTION_PROJECTION):
+        distribution.merge(ScoreDistribution.from_document(doc))
+    return distribution
+
+
+async def rebuild_distributions(db: AsyncIOMotorDatabase, chunk_size: int = 10000) -> int:
+    """
+    Recompute every distribution from the visible scores (drops flagged and
+    deleted scores, or picks up new bucket edges). Results submitted while
+    the rebuild runs may be missed until the next rebuild.
+
+    Returns:
+        Number of distributions written
+    """
+    projection = {"_id": 0, "puzzle_id": 1, "difficulty": 1, **{metric: 1 for metric in METRIC_EDGES}}
+    distributions: Dict[tuple, ScoreDistribution] = defaultdict(ScoreDistribution)
+
+    def add_chunk(docs: List[Dict]):
+        groups = defaultdict(list)
+        for doc in docs:
+            groups[_distribution_key(doc)].append(doc)
+        for key, group in groups.items():
+            distribution = distributions[key]
+            distribution.count += len(group)
+            for metric, sketch in distribution.sketches.items():
+                sketch.add([doc[metric] for doc in group])
+
+    chunk = []
+    async for doc in db.scores.find(VISIBLE_FILTER, projection, batch_size=chunk_size):
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            add_chunk(chunk)
+            chunk = []
+    add_chunk(chunk)
+
+    # Distributions left without any visible score
+    stale = [
+        {"puzzle_id": doc["puzzle_id"], "difficulty": doc["difficulty"]}
+        async for doc in db.score_distributions.find({}, {"_id": 0, "puzzle_id": 1, "difficulty": 1})
+        if _distribution_key(doc) not in distributions
+    ]
+    for i in range(0, len(stale), 1000):
+        await db.score_distributions.delete_many({"$or": stale[i:i + 1000]})
+
+    if distributions:
+        await db.score_distributions.bulk_write(
+            [
+                UpdateOne(
+                    {"puzzle_id": puzzle_id, "difficulty": difficulty},
+                    {"$set": distribution.to_document()},
+                    upsert=True
+                )
+                for (puzzle_id, difficulty), distribution in distributions.items()
+            ],
+            ordered=False
+        )
+
+    logger.info(f"Score distributions rebuilt: {len(distributions)}")
+    return len(distributions)
@@ -0,0 +1,150 @@
+"""
+Fast response encoding for read-heavy endpoints.
+
+Routes returning documents straight from MongoDB normally pay twice:
+FastAPI validates every dict against the response model (building nested
+Pydantic objects) and then serializes the models back to JSON. Documents
+written through our own models are already valid, so these routes use
+`TrustedAdapter` to fill in model defaults without validation and encode
+with orjson.
+
+Encoders are selected from the request's Accept header; MessagePack
+(application/msgpack) is available when the optional `msgpack` package is
+installed. More encoders can be added to ENCODERS.
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def _default(value: Any) -> Any:
+    # Types orjson does not encode natively (ObjectId, numpy scalars, ...)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgpack_default(value: Any) -> Any:
+    # Same representation as the JSON encoder
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return _default(value)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default)
+
+
+# Media type -> encoder, in order of preference for "*/*"
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {JSON_MEDIA_TYPE: encode_json}
+if msgpack is not None:
+    ENCODERS[MSGPACK_MEDIA_TYPE] = encode_msgpack
+
+
+def negotiate(request: Request) -> Tuple[str, Callable[[Any], bytes]]:
+    """
+    Encoder for the first supported media type of the Accept header (JSON by default)
+    """
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in ENCODERS:
+            return media_type, ENCODERS[media_type]
+    return JSON_MEDIA_TYPE, encode_json
+
+
+def encoded_response(
+    request: Request,
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Response encoded for the request's Accept header
+    """
+    media_type, encode = negotiate(request)
+    return Response(
+        content=encode(content),
+        status_code=status_code,
+        media_type=media_type,
+        headers={**(headers or {}), "Vary": "Accept"}
+    )
+
+
+class TrustedAdapter:
+    """
+    Shapes trusted documents like a response model without validating them.
+
+    Missing fields get the model's defaults and unknown fields (such as
+    `_id`) are dropped; field order follows the document. Nested models that derive fields in validators are
+    still validated, since they are small; other nested models are filled
+    with their defaults recursively.
+    """
+
+    def __init__(self, model: Type[BaseModel], many: bool = False):
+        self.model = model
+        self.many = many
+        self._field_set = frozenset(model.model_fields)
+        self._defaults: Dict[str, Callable[[], Any]] = {}
+        self._nested: Dict[str, Callable[[Dict], Dict]] = {}
+
+        for name, field in model.model_fields.items():
+            annotation = field.annotation
+            if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+                if annotation.__pydantic_decorators__.model_validators:
+                    self._nested[name] = self._validating(annotation)
+                else:
+                    self._nested[name] = TrustedAdapter(annotation)._prepare_one
+            if field.default_factory is not None:
+                self._defaults[name] = field.default_factory
+            elif not field.is_required():
+                self._defaults[name] = (lambda default: lambda: default)(field.default)
+
+    @staticmethod
+    def _validating(model: Type[BaseModel]) -> Callable[[Dict], Dict]:
+        # Straight to pydantic-core, without the model_validate/model_dump wrappers
+        validate = model.__pydantic_validator__.validate_python
+        dump = model.__pydantic_serializer__.to_python
+        return lambda value: dump(validate(value))
+
+    def _prepare_one(self, doc: Dict) -> Dict:
+        keys = doc.keys()
+        if keys <= self._field_set:
+            result = dict(doc)
+        else:
+            result = {name: value for name, value in doc.items() if name in self._field_set}
+        if len(result) < len(self._field_set):
+            for name in self._field_set - keys:
+                if name in self._defaults:
+                    result[name] = self._defaults[name]()
+
+        for name, prepare in self._nested.items():
+            value = result.get(name)
+            if isinstance(value, dict):
+                result[name] = prepare(value)
+            elif isinstance(value, BaseModel):
+                result[name] = value.model_dump()
+        return result
+
+    def prepare(self, content: Any) -> Any:
+        """
+        Plain data for the encoders: a list of documents if `many`, else one
+        """
+        if self.many:
+            return [self._prepare_one(doc) for doc in content]
+        return self._prepare_one(content)
@@ -0,0 +1,79 @@
+"""Batched enrichment of score rows with user and puzzle info"""
+
+import asyncio
+from typing import Dict, Iterable, List
+
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+
+GUEST_USER = {"username": "Guest", "avatar": None}
+UNKNOWN_PUZZLE = {"title": "Unknown"}
+
+USER_PROJECTION = {"username": 1, "avatar": 1}
+PUZZLE_PROJECTION = {"title": 1, "thumbnail_url": 1}
+
+
+async def fetch_by_ids(
+    collection: AsyncIOMotorCollection,
+    ids: Iterable[str],
+    projection: Dict[str, int]
+) -> Dict[str, dict]:
+    """
+    Resolve many documents by their `id` field with a single `$in` query.
+
+    Returns:
+        Dict mapping id -> projected document (without the id itself)
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    if not unique_ids:
+        return {}
+
+    cursor = collection.find(
+        {"id": {"$in": unique_ids}},
+        {"_id": 0, "id": 1, **projection}
+    )
+    docs = await cursor.to_list(len(unique_ids))
+
+    return {doc.pop("id"): doc for doc in docs}
+
+
+class ScoreEnrichment:
+    """
+    In-memory join tables for one page of scores.
+    Built with at most one query per collection, regardless of page size.
+    """
+
+    def __init__(self, users: Dict[str, dict], puzzles: Dict[str, dict]):
+        self.users = users
+        self.puzzles = puzzles
+
+    def user_for(self, user_id: str) -> dict:
+        if user_id == "guest":
+            return dict(GUEST_USER)
+        return self.users.get(user_id) or dict(GUEST_USER)
+
+    def puzzle_for(self, puzzle_id: str) -> dict:
+        return self.puzzles.get(puzzle_id) or dict(UNKNOWN_PUZZLE)
+
+
+async def enrich_scores(
+    db: AsyncIOMotorDatabase,
+    scores: List[dict],
+    include_users: bool = True,
+    include_puzzles: bool = True
+) -> ScoreEnrichment:
+    """
+    Collect the distinct user and puzzle ids of a page of scores and
+    resolve them with one `$in` query per collection, run concurrently.
+    """
+    async def _empty() -> Dict[str, dict]:
+        return {}
+
+    user_ids = (s["user_id"] for s in scores if s.get("user_id") != "guest")
+    puzzle_ids = (s["puzzle_id"] for s in scores if s.get("puzzle_id"))
+
+    users, puzzles = await asyncio.gather(
+        fetch_by_ids(db.users, user_ids, USER_PROJECTION) if include_users else _empty(),
+        fetch_by_ids(db.puzzles, puzzle_ids, PUZZLE_PROJECTION) if include_puzzles else _empty()
+    )
+
+    return ScoreEnrichment(users, puzzles)
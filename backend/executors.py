@@ -0,0 +1,136 @@
+"""
+Bounded executors for work that must not run on the event loop.
+
+    image_executor   CPU-bound Pillow/NumPy processing (decode, resize, encode)
+    io_executor      blocking SDK calls (Cloudinary uploader)
+
+Both are thread pools: Pillow and NumPy release the GIL for their heavy
+operations, and the SDK calls spend their time waiting on the network.
+Each pool admits at most `max_workers + max_queue` jobs; further callers
+wait for a slot, which keeps memory bounded under upload bursts.
+
+Sizes are configured with IMAGE_EXECUTOR_WORKERS / IMAGE_EXECUTOR_QUEUE and
+IO_EXECUTOR_WORKERS / IO_EXECUTOR_QUEUE.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class BoundedExecutor:
+    """
+    Thread pool with an admission limit and queue-depth counters
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Both created lazily, so the executor can be reused after shutdown
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+        self.waiting = 0      # callers waiting for an admission slot
+        self.queued = 0       # admitted, waiting for a worker thread
+        self.active = 0       # running on a worker thread
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0    # highest waiting + queued seen
+
+    def _track_depth(self):
+        self.max_depth = max(self.max_depth, self.waiting + self.queued)
+
+    def _run_tracked(self, job: Dict, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            job["started"] = True
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+
+        self.waiting += 1
+        self._track_depth()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        job = {"started": False}
+        try:
+            with self._lock:
+                self.queued += 1
+            self._track_depth()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._pool, functools.partial(self._run_tracked, job, fn, *args, **kwargs)
+            )
+            self.completed += 1
+            return result
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                if not job["started"]:
+                    # Cancelled before a worker picked it up
+                    self.queued -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "queued": self.queued,
+            "active": self.active,
+            "queue_depth": self.waiting + self.queued,
+            "max_depth": self.max_depth,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            self._slots = None
+
+
+image_executor = BoundedExecutor(
+    "image",
+    max_workers=int(os.environ.get("IMAGE_EXECUTOR_WORKERS", min(2, os.cpu_count() or 1))),
+    max_queue=int(os.environ.get("IMAGE_EXECUTOR_QUEUE", "8"))
+)
+
+io_executor = BoundedExecutor(
+    "io",
+    max_workers=int(os.environ.get("IO_EXECUTOR_WORKERS", "4")),
+    max_queue=int(os.environ.get("IO_EXECUTOR_QUEUE", "32"))
+)
+
+EXECUTORS = [image_executor, io_executor]
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {executor.name: executor.stats() for executor in EXECUTORS}
+
+
+def shutdown_executors():
+    for executor in EXECUTORS:
+        executor.shutdown()
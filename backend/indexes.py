@@ -0,0 +1,203 @@
+"""
+Index declarations for the puzzle game collections.
+
+`ensure_indexes` runs at startup and creates every declared index
+idempotently. `find_collscans` explains the query shapes used by the routes
+and reports the ones the planner would answer with a collection scan:
+
+    python indexes.py --check      # exit code 1 if any route query COLLSCANs
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "scores": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Leaderboards: per puzzle/difficulty, sorted by score
+        IndexModel(
+            [("puzzle_id", ASCENDING), ("difficulty", ASCENDING), ("score", DESCENDING)],
+            name="puzzle_difficulty_score"
+        ),
+        IndexModel([("difficulty", ASCENDING), ("score", DESCENDING)], name="difficulty_score"),
+        IndexModel([("score", DESCENDING)], name="score"),
+        # Timeframe leaderboards
+        IndexModel([("completed_at", DESCENDING), ("score", DESCENDING)], name="completed_at_score"),
+        # User score history
+        IndexModel(
+            [("user_id", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)],
+            name="user_completed_at_oid"
+        ),
+    ],
+    "puzzles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Listings in keyset order (pagination.PUZZLE_SORT)
+        IndexModel(
+            [("display_order", ASCENDING), ("created_at", DESCENDING), ("_id", ASCENDING)],
+            name="display_order_created_at_oid"
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("display_order", ASCENDING), ("created_at", DESCENDING), ("_id", ASCENDING)],
+            name="status_display_order_oid"
+        ),
+        IndexModel([("status", ASCENDING), ("category", ASCENDING)], name="status_category"),
+        IndexModel([("category", ASCENDING), ("status", ASCENDING)], name="category_status"),
+        IndexModel([("is_featured", ASCENDING), ("status", ASCENDING)], name="featured_status"),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "score_distributions": [
+        IndexModel([("difficulty", ASCENDING), ("puzzle_id", ASCENDING)], name="difficulty_puzzle_unique", unique=True),
+    ],
+    "leaderboard_rollups": [
+        IndexModel(
+            [("period", ASCENDING), ("bucket", ASCENDING), ("puzzle_id", ASCENDING), ("difficulty", ASCENDING)],
+            name="period_bucket_puzzle_difficulty_unique",
+            unique=True
+        ),
+        # Deleted / flagged scores are pulled from every rollup holding them
+        IndexModel([("entries.id", ASCENDING)], name="entries_id"),
+        # Old buckets are removed once expired
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "user_achievements": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+}
+
+# Indexes replaced by a declaration above, dropped by ensure_indexes
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "scores": ["user_completed_at_id"],
+    "puzzles": ["display_order_created_at_id", "status_display_order"],
+}
+
+
+# Representative query shapes issued by the routes: (collection, filter, sort)
+ROUTE_QUERIES = [
+    ("scores", {"is_validated": {"$ne": False}}, [("score", DESCENDING)]),
+    ("scores", {"puzzle_id": "p", "is_validated": {"$ne": False}}, [("score", DESCENDING)]),
+    ("scores", {"difficulty": "easy", "is_validated": {"$ne": False}}, [("score", DESCENDING)]),
+    ("scores", {"puzzle_id": "p", "difficulty": "easy", "is_validated": {"$ne": False}}, [("score", DESCENDING)]),
+    ("scores", {"completed_at": {"$gte": datetime(2000, 1, 1)}, "is_validated": {"$ne": False}}, [("score", DESCENDING)]),
+    ("scores", {"user_id": "u"}, [("completed_at", DESCENDING), ("_id", DESCENDING)]),
+    ("scores", {"id": "s"}, None),
+    ("puzzles", {"id": "p"}, None),
+    ("puzzles", {}, [("display_order", ASCENDING), ("created_at", DESCENDING), ("_id", ASCENDING)]),
+    ("puzzles", {"status": "published"}, [("display_order", ASCENDING), ("created_at", DESCENDING), ("_id", ASCENDING)]),
+    ("puzzles", {"category": "General"}, None),
+    ("puzzles", {"is_featured": True}, None),
+    ("users", {"id": {"$in": ["u"]}}, None),
+    ("user_achievements", {"user_id": "u"}, None),
+    ("score_distributions", {"difficulty": "easy", "puzzle_id": "p"}, None),
+    ("score_distributions", {"difficulty": "easy"}, None),
+    ("leaderboard_rollups", {"period": "day", "bucket": "2000-01-01", "puzzle_id": "*", "difficulty": "*"}, None),
+    ("leaderboard_rollups", {"entries.id": "s"}, None),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """
+    Create all declared indexes and drop the obsolete ones.
+    Existing identical indexes are left alone.
+
+    Returns:
+        Dict with collection name as key and created index names as value
+    """
+    created = {}
+
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. an index with the same name but different options already exists
+            logger.warning(f"Could not create indexes on {collection}: {str(e)}")
+            created[collection] = []
+
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info(f"Dropped obsolete index {collection}.{name}")
+
+    return created
+
+
+def _plan_stages(plan: Dict) -> List[str]:
+    """
+    Flatten the stage names of an explain() plan tree
+    """
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages.extend(_plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+async def find_collscans(db: AsyncIOMotorDatabase) -> List[str]:
+    """
+    Explain every route query shape and list those planned as a COLLSCAN
+    """
+    failures = []
+
+    for collection, query, sort in ROUTE_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+
+        explanation = await cursor.explain()
+        winning_plan = explanation["queryPlanner"]["winningPlan"]
+        # Newer servers nest the classic plan under "queryPlan"
+        winning_plan = winning_plan.get("queryPlan", winning_plan)
+
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            failures.append(f"{collection}.find({query}).sort({sort})")
+
+    return failures
+
+
+async def _check(mongo_url: str, db_name: str) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        db = client[db_name]
+        await ensure_indexes(db)
+        failures = await find_collscans(db)
+    finally:
+        client.close()
+
+    for failure in failures:
+        print(f"COLLSCAN: {failure}")
+    print(f"{len(ROUTE_QUERIES) - len(failures)}/{len(ROUTE_QUERIES)} route queries use an index")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    if "--check" not in sys.argv:
+        print("Usage: python indexes.py --check")
+        sys.exit(2)
+
+    sys.exit(asyncio.run(_check(
+        os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+        os.environ.get("DB_NAME", "puzzle_game_db")
+    )))
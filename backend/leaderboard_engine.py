@@ -0,0 +1,394 @@
+"""
+In-memory materialized top-K leaderboards.
+
+One bounded, sorted board is kept per (puzzle_id, difficulty) combination,
+including the wildcard combinations used by the leaderboard endpoints:
+
+    ("*", "*")               global
+    (puzzle_id, "*")         one puzzle, any difficulty
+    ("*", difficulty)        any puzzle, one difficulty
+    (puzzle_id, difficulty)  one puzzle, one difficulty
+
+Boards are warmed from Mongo at startup, loaded lazily on first read when
+missing (or when deletions left a truncated board too short), and updated
+incrementally by submit_score, delete_score and flag_score. Empty boards
+are only kept for the global key, so unknown puzzle ids cost no memory. State is per process: with several workers each one keeps its
+own copy, which `rebuild` resynchronises with the database.
+"""
+
+import asyncio
+import logging
+import os
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+TOP_K = int(os.environ.get("LEADERBOARD_TOP_K", "100"))
+WARM_CONCURRENCY = 8
+
+# Fields kept per entry (everything the leaderboard endpoints render)
+SCORE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "user_id": 1,
+    "puzzle_id": 1,
+    "score": 1,
+    "completion_time": 1,
+    "moves": 1,
+    "difficulty": 1,
+    "completed_at": 1
+}
+
+# Flagged scores (is_validated=False) never appear on leaderboards
+VISIBLE_FILTER = {"is_validated": {"$ne": False}}
+
+BoardKey = Tuple[str, str]
+
+
+def board_query(puzzle_id: Optional[str], difficulty: Optional[str]) -> Dict:
+    """
+    Mongo filter matching the scores that belong on a leaderboard
+    """
+    query = dict(VISIBLE_FILTER)
+    if puzzle_id:
+        query["puzzle_id"] = puzzle_id
+    if difficulty:
+        query["difficulty"] = difficulty
+    return query
+
+
+def board_key(puzzle_id: Optional[str], difficulty: Optional[str]) -> BoardKey:
+    return (puzzle_id or WILDCARD, difficulty or WILDCARD)
+
+
+def keys_for_score(score: dict) -> List[BoardKey]:
+    """
+    All boards a score belongs to
+    """
+    puzzle_id = score["puzzle_id"]
+    difficulty = score["difficulty"]
+    return [
+        (WILDCARD, WILDCARD),
+        (puzzle_id, WILDCARD),
+        (WILDCARD, difficulty),
+        (puzzle_id, difficulty)
+    ]
+
+
+def score_entry(score: dict) -> dict:
+    """
+    Board entry of a score document
+    """
+    return {field: score[field] for field in SCORE_PROJECTION if field != "_id" and field in score}
+
+
+def buffered_scores(key: BoardKey) -> List[dict]:
+    """
+    Accepted scores of a board still waiting in the write-behind buffer:
+    already added to the in-memory boards but not yet in `scores`
+    """
+    from score_buffer import score_buffer
+
+    if not score_buffer.enabled:
+        return []
+    return [
+        score for score in score_buffer.pending_scores()
+        if score.get("is_validated") is not False and key in keys_for_score(score)
+    ]
+
+
+def _sort_key(entry: dict) -> Tuple[int, str]:
+    # Highest score first, id as a deterministic tie-breaker
+    return (-entry["score"], entry["id"])
+
+
+class TopK:
+    """
+    Bounded array of score entries kept sorted by score (highest first).
+
+    `truncated` records whether lower entries were ever dropped. While it is
+    False the board holds every visible score of its key. Once True,
+    `horizon` is the sort key of the lowest entry known to be exact: every
+    visible score ranked at or above it is on the board. Entries ranked below
+    the horizon are rejected, since scores between them and the horizon may
+    be missing (e.g. after a discard freed a slot).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.truncated = False
+        self.horizon: Optional[Tuple[int, str]] = None
+        self._keys: List[Tuple[int, str]] = []
+        self._entries: Dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, score_id: str) -> bool:
+        return score_id in self._entries
+
+    def truncate(self):
+        """
+        Mark lower entries as dropped: the board is exact down to its last entry
+        """
+        self.truncated = True
+        if self._keys and (self.horizon is None or self._keys[-1] < self.horizon):
+            self.horizon = self._keys[-1]
+        elif not self._keys:
+            # Nothing is known to be exact
+            self.horizon = (float("-inf"), "")
+
+    def add(self, entry: dict) -> bool:
+        """
+        Insert or replace an entry. Returns True if the board changed.
+        """
+        if entry["id"] in self._entries:
+            self.discard(entry["id"])
+
+        key = _sort_key(entry)
+        if self.truncated and key > self.horizon:
+            return False
+        if len(self._keys) >= self.capacity and key >= self._keys[-1]:
+            self.truncate()
+            return False
+
+        insort(self._keys, key)
+        self._entries[entry["id"]] = entry
+
+        if len(self._keys) > self.capacity:
+            _, dropped_id = self._keys.pop()
+            del self._entries[dropped_id]
+            self.truncate()
+
+        return True
+
+    def discard(self, score_id: str) -> bool:
+        """
+        Remove an entry if present. Returns True if the board changed.
+        """
+        entry = self._entries.pop(score_id, None)
+        if entry is None:
+            return False
+
+        key = _sort_key(entry)
+        index = bisect_left(self._keys, key)
+        del self._keys[index]
+        return True
+
+    def can_serve(self, limit: int) -> bool:
+        # Every entry ranks at or above the horizon, so the whole board is exact
+        return limit <= len(self._keys) or not self.truncated
+
+    def top(self, limit: int) -> List[dict]:
+        return [dict(self._entries[score_id]) for _, score_id in self._keys[:limit]]
+
+
+class LeaderboardEngine:
+    """
+    Holds every materialized board and keeps them consistent with `scores`.
+    """
+
+    def __init__(self, capacity: int = TOP_K):
+        self.capacity = capacity
+        self.boards: Dict[BoardKey, TopK] = {}
+        # Boards being (re)loaded from Mongo -> updates received meanwhile
+        self._loading: Dict[BoardKey, List[Tuple[str, object]]] = {}
+        # One load per key: concurrent readers await the same task
+        self._inflight: Dict[BoardKey, asyncio.Task] = {}
+        self.ready = False
+
+    # ---------- loading ----------
+
+    async def _load_board(self, db: AsyncIOMotorDatabase, key: BoardKey) -> Optional[TopK]:
+        """
+        Load a board, or join the load already in progress.
+        Returns None for an empty board that is not kept (see _fetch_board).
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_board(db, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled reader must not cancel the load the others wait for
+        return await asyncio.shield(task)
+
+    async def _fetch_board(self, db: AsyncIOMotorDatabase, key: BoardKey) -> Optional[TopK]:
+        puzzle_id, difficulty = key
+        query = board_query(
+            None if puzzle_id == WILDCARD else puzzle_id,
+            None if difficulty == WILDCARD else difficulty
+        )
+
+        # Fetch one extra row to learn whether the board is truncated
+        self._loading[key] = []
+        # Buffered scores: flushed during the query or not, the board must have them
+        buffered = buffered_scores(key)
+        try:
+            docs = await db.scores.find(query, SCORE_PROJECTION).sort(
+                "score", -1
+            ).limit(self.capacity + 1).to_list(self.capacity + 1)
+        finally:
+            pending = self._loading.pop(key, [])
+
+        board = TopK(self.capacity)
+        for doc in docs[:self.capacity]:
+            board.add(doc)
+        if len(docs) > self.capacity:
+            board.truncate()
+        for score in buffered:
+            # Replaces the entry if the query saw it
+            board.add(score_entry(score))
+
+        # Replay updates that raced with the query
+        for op, value in pending:
+            if op == "add":
+                board.add(value)
+            else:
+                board.discard(value)
+
+        if len(board) == 0 and key != (WILDCARD, WILDCARD):
+            # Unknown puzzle or difficulty: not kept, the first score creates it
+            self.boards.pop(key, None)
+            return None
+
+        self.boards[key] = board
+        return board
+
+    async def warm(self, db: AsyncIOMotorDatabase) -> int:
+        """
+        Load every board from Mongo. Returns the number of boards loaded.
+        """
+        puzzle_ids = await db.scores.distinct("puzzle_id")
+        difficulties = await db.scores.distinct("difficulty")
+
+        keys = {(WILDCARD, WILDCARD)}
+        keys.update((WILDCARD, d) for d in difficulties)
+        keys.update((p, WILDCARD) for p in puzzle_ids)
+        keys.update(
+            (p, d) for p in puzzle_ids for d in difficulties
+        )
+
+        semaphore = asyncio.Semaphore(WARM_CONCURRENCY)
+
+        async def load(key: BoardKey):
+            async with semaphore:
+                await self._load_board(db, key)
+
+        await asyncio.gather(*(load(key) for key in keys))
+
+        self.ready = True
+        logger.info(f"Leaderboard engine warmed: {len(self.boards)} boards")
+        return len(self.boards)
+
+    async def rebuild(self, db: AsyncIOMotorDatabase) -> int:
+        """
+        Drop all boards and reload them from Mongo
+        """
+        self.boards = {}
+        self.ready = False
+        return await self.warm(db)
+
+    # ---------- incremental updates ----------
+
+    def add(self, score: dict):
+        """
+        Record a newly submitted score on every board it belongs to
+        """
+        if score.get("is_validated") is False:
+            return
+
+        entry = score_entry(score)
+        for key in keys_for_score(entry):
+            if key in self._loading:
+                self._loading[key].append(("add", entry))
+            board = self.boards.get(key)
+            if board is not None:
+                board.add(entry)
+            elif self.ready:
+                # Warmed engine and no board yet: this is the first score for the key
+                self.boards[key] = TopK(self.capacity)
+                self.boards[key].add(entry)
+
+    def discard(self, score_id: str):
+        """
+        Remove a deleted or flagged score from every board
+        """
+        for pending in self._loading.values():
+            pending.append(("discard", score_id))
+        for board in self.boards.values():
+            board.discard(score_id)
+
+    # ---------- reads ----------
+
+    async def get_top(
+        self,
+        db: AsyncIOMotorDatabase,
+        puzzle_id: Optional[str],
+        difficulty: Optional[str],
+        limit: int
+    ) -> List[dict]:
+        """
+        Top `limit` scores for a board, served from memory when possible
+        """
+        key = board_key(puzzle_id, difficulty)
+        board = self.boards.get(key)
+
+        if limit <= self.capacity and (board is None or not board.can_serve(limit)):
+            # Missing, or truncated and shortened by discards: (re)load it
+            board = await self._load_board(db, key)
+
+        if board is not None and board.can_serve(limit):
+            return board.top(limit)
+
+        # Deeper than the materialized window: query the database directly
+        return await db.scores.find(
+            board_query(puzzle_id, difficulty), SCORE_PROJECTION
+        ).sort("score", -1).limit(limit).to_list(limit)
+
+    # ---------- consistency ----------
+
+    async def check_consistency(self, db: AsyncIOMotorDatabase) -> Dict:
+        """
+        Compare every board with the equivalent database query.
+        Boards are compared by score sequence since ties may order differently.
+        """
+        mismatches = []
+
+        for key, board in list(self.boards.items()):
+            # Untruncated boards must hold every visible score: fetch one extra
+            window = len(board) if board.truncated else len(board) + 1
+            if window == 0:
+                continue
+
+            puzzle_id, difficulty = key
+            expected = await db.scores.find(
+                board_query(
+                    None if puzzle_id == WILDCARD else puzzle_id,
+                    None if difficulty == WILDCARD else difficulty
+                ),
+                {"_id": 0, "score": 1}
+            ).sort("score", -1).limit(window).to_list(window)
+
+            expected_scores = [doc["score"] for doc in expected]
+            actual_scores = [entry["score"] for entry in board.top(len(board))]
+
+            if expected_scores != actual_scores:
+                mismatches.append({
+                    "puzzle_id": puzzle_id,
+                    "difficulty": difficulty,
+                    "expected": expected_scores[:10],
+                    "actual": actual_scores[:10]
+                })
+
+        return {
+            "consistent": not mismatches,
+            "boards_checked": len(self.boards),
+            "mismatches": mismatches
+        }
+
+
+leaderboard_engine = LeaderboardEngine()
@@ -0,0 +1,250 @@
+"""
+Process metrics in the Prometheus text exposition format (GET /metrics).
+
+    http_request_duration_seconds      per route template, method and status
+    http_requests_in_flight            requests being handled, per method
+    mongodb_command_duration_seconds   every MongoDB command, per collection
+                                       and command (pymongo CommandListener)
+    cloudinary_request_duration_seconds  Cloudinary SDK calls, per operation
+    image_processing_duration_seconds  Pillow work on uploads, per step
+
+Durations exclude the time spent waiting for an executor slot (see
+executors), so a slow upload can be attributed to the queue, the image
+processing or Cloudinary. Metrics are per process: with several workers,
+scrape each of them.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.responses import Response
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [("", _format_labels(self.labelnames, labels), value) for labels, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [counts per bucket (last: +Inf)], sum
+        self._series: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def timed(self, fn: Callable, *labels) -> Callable:
+        """
+        `fn` wrapped to record its duration (for functions run on executors)
+        """
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.time(*labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+
+        result = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                result.append(("_bucket", _format_labels(self.labelnames, labels, le), cumulative))
+            result.append(("_sum", _format_labels(self.labelnames, labels), total))
+            result.append(("_count", _format_labels(self.labelnames, labels), cumulative))
+        return result
+
+
+REGISTRY: List[Metric] = []
+
+HTTP_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled", ("method",))
+MONGO_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("collection", "command", "outcome")
+)
+CLOUDINARY_SECONDS = Histogram(
+    "cloudinary_request_duration_seconds", "Cloudinary SDK call latency", ("operation", "outcome")
+)
+IMAGE_SECONDS = Histogram(
+    "image_processing_duration_seconds", "Pillow processing time of uploads", ("step",)
+)
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def metrics_response() -> Response:
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
+def timed_call(histogram: Histogram, fn: Callable, *labels) -> Callable:
+    """
+    `fn` wrapped to record its duration with an "ok"/"error" outcome label
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            histogram.observe(time.perf_counter() - start, *labels, outcome)
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request by route template
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+            # Set by the router on the shared scope; templates keep the label count bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - start, method, path, str(status["code"]))
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Records the duration of every command sent by the client it is registered on
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, collection, event.command_name, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+mongo_command_timer = MongoCommandTimer()
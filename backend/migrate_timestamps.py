@@ -0,0 +1,117 @@
+"""
+Convert legacy ISO string timestamps to native BSON dates.
+
+Streams every document whose timestamp fields are still strings and rewrites
+them in batches with bulk_write. Safe to re-run: converted documents no longer
+match the `$type: "string"` filter.
+
+    python migrate_timestamps.py [--batch-size 1000] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import os
+from typing import Callable, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from persistence import TIMESTAMP_FIELDS, parse_timestamp
+
+
+async def migrate_collection(
+    db: AsyncIOMotorDatabase,
+    collection: str,
+    fields: list,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    progress: Optional[Callable[[str, int], None]] = None
+) -> int:
+    """
+    Convert the string timestamps of one collection.
+
+    Returns:
+        Number of documents converted (or that would be, with dry_run)
+    """
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+
+    converted = 0
+    batch = []
+
+    async def flush():
+        nonlocal converted
+        if batch and not dry_run:
+            await db[collection].bulk_write(batch, ordered=False)
+        converted += len(batch)
+        batch.clear()
+        if progress:
+            progress(collection, converted)
+
+    async for doc in db[collection].find(query, projection, batch_size=batch_size):
+        update = {}
+        for field in fields:
+            value = doc.get(field)
+            if isinstance(value, str):
+                try:
+                    update[field] = parse_timestamp(value)
+                except ValueError:
+                    # Leave unparseable values for manual inspection
+                    continue
+
+        if update:
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+
+        if len(batch) >= batch_size:
+            await flush()
+
+    await flush()
+    return converted
+
+
+async def migrate_timestamps(
+    db: AsyncIOMotorDatabase,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+    progress: Optional[Callable[[str, int], None]] = None
+) -> Dict[str, int]:
+    """
+    Convert string timestamps in every collection listed in TIMESTAMP_FIELDS
+    """
+    results = {}
+    for collection, fields in TIMESTAMP_FIELDS.items():
+        results[collection] = await migrate_collection(
+            db, collection, fields, batch_size, dry_run, progress
+        )
+    return results
+
+
+async def _main(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        results = await migrate_timestamps(
+            client[os.environ["DB_NAME"]],
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            progress=lambda collection, count: print(f"{collection}: {count} documents")
+        )
+    finally:
+        client.close()
+
+    verb = "would be converted" if args.dry_run else "converted"
+    for collection, count in results.items():
+        print(f"{collection}: {count} documents {verb}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from typing import List, Optional, Dict
 from datetime import datetime
 import uuid
@@ -11,6 +11,16 @@ class UserStats(BaseModel):
     total_play_time: int = 0  # milliseconds
     average_completion_time: int = 0
     favorite_category: Optional[str] = None
+    category_counts: Dict[str, int] = Field(default_factory=dict)  # completions per puzzle category
+    
+    @model_validator(mode="after")
+    def derive_from_counters(self):
+        # The counters are maintained with $inc; derived fields follow them
+        if self.total_puzzles_completed and self.total_play_time:
+            self.average_completion_time = self.total_play_time // self.total_puzzles_completed
+        if self.category_counts:
+            self.favorite_category = min(self.category_counts, key=lambda c: (-self.category_counts[c], c))
+        return self
 
 
 class UserPreferences(BaseModel):
@@ -65,7 +75,14 @@ class PuzzleImage(BaseModel):
 class PuzzleMetadata(BaseModel):
     total_plays: int = 0
     total_completions: int = 0
+    total_completion_time: int = 0  # milliseconds, sum over completions
     average_completion_time: int = 0
+    
+    @model_validator(mode="after")
+    def derive_from_counters(self):
+        if self.total_completions and self.total_completion_time:
+            self.average_completion_time = self.total_completion_time // self.total_completions
+        return self
 
 
 class Puzzle(BaseModel):
@@ -85,6 +102,9 @@ class Puzzle(BaseModel):
     # These are base URLs with transformation parameters for each difficulty
     piece_data: Optional[Dict[str, List[str]]] = None
     
+    # Sprite atlas (fill-cropped master) shared by every difficulty
+    atlas_url: Optional[str] = None
+    
     # Configuration
     difficulty_available: List[str] = Field(default_factory=lambda: ["easy", "medium", "hard", "expert"])
     
@@ -151,3 +171,35 @@ class ScoreCreate(BaseModel):
     completion_time: int
     moves: int
     difficulty: str
+
+
+# ============ BULK IMPORT MODELS ============
+
+class PuzzleImportItem(PuzzleCreate):
+    """One manifest row: the archive entry and the puzzle fields for it"""
+    filename: str
+
+
+class ImportItemStatus(BaseModel):
+    filename: str
+    title: str
+    status: str = "pending"  # "pending" | "done" | "failed"
+    puzzle_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ImportJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"  # "queued" | "running" | "completed" | "completed_with_errors"
+    concurrency: int = 4
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    manifest: List[PuzzleImportItem] = Field(default_factory=list)
+    items: List[ImportItemStatus] = Field(default_factory=list)
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,173 @@
+"""
+Keyset (cursor) pagination.
+
+A cursor is an opaque token holding the sort key values of the last item of
+a page. The next page is fetched with a range filter on those values, so it
+walks the sort index from where the previous page stopped instead of
+skipping over every earlier document.
+
+Every sort ends with `_id`, which is always present and unique, so the
+position of a document is never ambiguous. Sort fields may still be null,
+missing or of a legacy type (e.g. a string `created_at` not yet migrated):
+the range filter follows MongoDB's cross-type sort order, so such
+documents are neither skipped nor repeated.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+SortSpec = List[Tuple[str, int]]
+
+# Puzzle listings: manual order first, newest first within the same order
+PUZZLE_SORT: SortSpec = [("display_order", ASCENDING), ("created_at", DESCENDING), ("_id", ASCENDING)]
+
+# Player score history: most recent first
+SCORE_HISTORY_SORT: SortSpec = [("completed_at", DESCENDING), ("_id", DESCENDING)]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# BSON types sort fields may hold, in MongoDB's cross-type sort order.
+# Null also matches missing fields, which sort as null.
+TYPE_ORDER = ["null", "number", "string", "objectId", "bool", "date"]
+
+
+def _type_of(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _type_filter(bson_type: str) -> Any:
+    return None if bson_type == "null" else {"$type": bson_type}
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    try:
+        if isinstance(value, dict) and "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if isinstance(value, dict) and "$oid" in value:
+            return ObjectId(value["$oid"])
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value
+
+
+def encode_cursor(doc: Dict, sort: SortSpec) -> str:
+    """
+    Build the cursor pointing after `doc`
+    """
+    values = [_encode_value(doc.get(field)) for field, _ in sort]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> List[Any]:
+    """
+    Parse a cursor produced by encode_cursor for the same sort
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return [_decode_value(value) for value in values]
+
+
+def _after(value: Any, direction: int) -> List[Any]:
+    """
+    Conditions on one field matching the values sorted after `value`:
+    greater (or lower, descending) values of the same type, and every type
+    sorted after it. Range operators only match their own type.
+    """
+    rank = TYPE_ORDER.index(_type_of(value))
+    conditions = []
+    if value is not None:
+        conditions.append({"$gt" if direction == ASCENDING else "$lt": value})
+
+    later_types = TYPE_ORDER[rank + 1:] if direction == ASCENDING else TYPE_ORDER[:rank]
+    conditions.extend(_type_filter(bson_type) for bson_type in later_types)
+    return conditions
+
+
+def keyset_filter(sort: SortSpec, values: List[Any]) -> Dict:
+    """
+    Filter matching documents strictly after `values` in `sort` order:
+
+        (f1 > v1) OR (f1 == v1 AND f2 > v2) OR ...
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        equal = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        for condition in _after(values[i], direction):
+            clauses.append({**equal, field: condition})
+
+    return {"$or": clauses}
+
+
+async def fetch_page(
+    collection,
+    query: Dict,
+    projection: Dict,
+    sort: SortSpec,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Fetch one page of `query` in `sort` order.
+    `skip` is only honoured without a cursor, for offset-based callers.
+
+    Returns:
+        (documents, next cursor or None on the last page)
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(sort, decode_cursor(cursor, sort))]}
+        skip = 0
+
+    # Sort fields must come back even if the caller projects them out
+    projection = dict(projection)
+    hide_id = projection.pop("_id", 1) == 0
+    if any(value == 1 for value in projection.values()):
+        projection.update({field: 1 for field, _ in sort})
+
+    docs = await collection.find(query, projection or None).sort(sort).skip(skip).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit > 0:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+
+    if hide_id:
+        for doc in docs:
+            doc.pop("_id", None)
+
+    return docs, next_cursor
@@ -0,0 +1,38 @@
+"""
+MongoDB persistence helpers.
+
+Timestamps are stored as native BSON dates so that range filters and sorts
+on them can use indexes. Documents written by older versions hold ISO
+strings instead; `migrate_timestamps.py` converts them in place.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+# Timestamp fields per collection (used by the migration command)
+TIMESTAMP_FIELDS: Dict[str, List[str]] = {
+    "scores": ["completed_at"],
+    "puzzles": ["created_at", "updated_at"],
+    "users": ["created_at", "last_login_at"],
+    "status_checks": ["timestamp"],
+}
+
+
+def to_document(model: BaseModel) -> Dict[str, Any]:
+    """
+    Serialize a model for MongoDB. Datetimes are kept as datetime objects
+    and encoded by the driver as BSON dates.
+    """
+    return model.model_dump()
+
+
+def parse_timestamp(value: Any) -> Any:
+    """
+    Convert a legacy ISO string timestamp to a datetime.
+    Values that are not strings are returned unchanged.
+    """
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+import re
+
+from piece_slicer import piece_store
+
+router = APIRouter(prefix="/pieces", tags=["pieces"])
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+@router.get("/{digest}")
+async def get_piece(digest: str):
+    """
+    Serve a piece from the local content-addressed store.
+    Content never changes for a digest, so it is cached forever.
+    """
+    if not DIGEST_PATTERN.match(digest):
+        raise HTTPException(status_code=404, detail="Piece not found")
+
+    path = piece_store.object_path(digest)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Piece not found")
+
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
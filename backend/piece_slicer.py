@@ -0,0 +1,225 @@
+"""
+Local piece slicing engine.
+
+Alternative to the per-piece Cloudinary transformation URLs: the image is
+decoded once, fill-cropped to the STANDARD_SIZE x STANDARD_SIZE master and
+every piece of every difficulty in GRID_CONFIG is cut from a NumPy view of
+it in a single pass. Pieces are written to a content-addressed store on disk
+and served by `piece_routes`.
+
+Enabled with PIECE_BACKEND=local. NumPy and Pillow are imported on the
+first slice, so the default backend never loads them.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Optional, Union
+
+from cloudinary_service import GRID_CONFIG, STANDARD_SIZE
+
+PIECE_BACKEND = os.environ.get("PIECE_BACKEND", "cloudinary")  # "cloudinary" | "local"
+PIECE_STORE_DIR = Path(os.environ.get("PIECE_STORE_DIR", Path(__file__).parent / "piece_store"))
+# Prefix for piece URLs, e.g. the public backend origin when served cross-origin
+PIECE_BASE_URL = os.environ.get("PIECE_BASE_URL", "").rstrip("/")
+
+PIECE_FORMAT = "JPEG"
+PIECE_QUALITY = 90
+
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+
+Source = Union[bytes, BinaryIO]
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def source_digest_of(source: Source) -> str:
+    """
+    Digest of an image given as bytes or as a seekable stream (read in chunks)
+    """
+    if isinstance(source, bytes):
+        return sha256_hex(source)
+
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(1024 * 1024), b""):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+class PieceStore:
+    """
+    Content-addressed blob store:
+
+        objects/<digest[:2]>/<digest>     piece and atlas bytes
+        manifests/<source digest>.json    {"atlas": digest, "pieces": {difficulty: [digest, ...]}}
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def manifest_path(self, source_digest: str) -> Path:
+        return self.root / "manifests" / f"{source_digest}.json"
+
+    def _write_atomic(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, data: bytes) -> str:
+        """
+        Store a blob and return its digest. Existing blobs are not rewritten.
+        """
+        digest = sha256_hex(data)
+        path = self.object_path(digest)
+        if not path.exists():
+            self._write_atomic(path, data)
+        return digest
+
+    def get_manifest(self, source_digest: str) -> Optional[Dict]:
+        path = self.manifest_path(source_digest)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def put_manifest(self, source_digest: str, manifest: Dict):
+        self._write_atomic(self.manifest_path(source_digest), json.dumps(manifest).encode())
+
+
+def render_master(source: Source) -> "Image.Image":
+    """
+    Decode an image and fill-crop it to the standard square master,
+    like the Cloudinary `crop: fill` step of the piece URLs.
+    JPEGs are decoded at the smallest DCT scale still covering the master.
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    img.draft("RGB", (STANDARD_SIZE, STANDARD_SIZE))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    return ImageOps.fit(img, (STANDARD_SIZE, STANDARD_SIZE), Image.Resampling.LANCZOS)
+
+
+def grid_view(master: "np.ndarray", rows: int, cols: int) -> "np.ndarray":
+    """
+    View of the master as a (rows, cols, piece_height, piece_width, channels) array.
+    No pixels are copied.
+    """
+    piece_height = STANDARD_SIZE // rows
+    piece_width = STANDARD_SIZE // cols
+    channels = master.shape[2]
+
+    return master.reshape(rows, piece_height, cols, piece_width, channels).swapaxes(1, 2)
+
+
+def encode_piece(tile: "np.ndarray") -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(tile)).save(output, format=PIECE_FORMAT, quality=PIECE_QUALITY)
+    return output.getvalue()
+
+
+def encode_atlas(master: "Image.Image") -> bytes:
+    """
+    Sprite atlas shared by every difficulty: the pieces tile the master
+    exactly, so the master itself is the atlas and only the rectangles
+    (cloudinary_service.atlas_layout) differ per difficulty.
+    """
+    output = io.BytesIO()
+    master.save(output, format=PIECE_FORMAT, quality=PIECE_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def slice_all_difficulties(master: "Image.Image") -> Dict[str, List[bytes]]:
+    """
+    Cut every piece for every difficulty from one master image.
+
+    Returns:
+        Dict with difficulty as key and encoded pieces (row-major) as value
+    """
+    import numpy as np
+
+    pixels = np.asarray(master)
+    pieces = {}
+
+    for difficulty, config in GRID_CONFIG.items():
+        rows, cols = config["rows"], config["cols"]
+        tiles = grid_view(pixels, rows, cols)
+        pieces[difficulty] = [encode_piece(tiles[row, col]) for row in range(rows) for col in range(cols)]
+
+    return pieces
+
+
+def slice_to_store(source: Source, store: Optional[PieceStore] = None) -> Dict:
+    """
+    Slice an image into the store, skipping the work if it was sliced before.
+
+    Returns:
+        Manifest with the atlas digest and the piece digests per difficulty
+    """
+    store = store or piece_store
+    source_digest = source_digest_of(source)
+
+    manifest = store.get_manifest(source_digest)
+    if manifest is not None:
+        return manifest
+
+    master = render_master(source)
+    pieces = slice_all_difficulties(master)
+    manifest = {
+        "atlas": store.put(encode_atlas(master)),
+        "pieces": {
+            difficulty: [store.put(piece) for piece in encoded]
+            for difficulty, encoded in pieces.items()
+        }
+    }
+    store.put_manifest(source_digest, manifest)
+
+    return manifest
+
+
+def piece_url(digest: str) -> str:
+    return f"{PIECE_BASE_URL}/api/pieces/{digest}"
+
+
+def generate_local_pieces(source: Source) -> Dict:
+    """
+    Local counterpart of cloudinary_service.generate_all_difficulty_pieces
+
+    Returns:
+        Dict with "atlas" (atlas URL) and "pieces" (difficulty -> piece URLs)
+    """
+    manifest = slice_to_store(source)
+    return {
+        "atlas": piece_url(manifest["atlas"]),
+        "pieces": {
+            difficulty: [piece_url(digest) for digest in digests]
+            for difficulty, digests in manifest["pieces"].items()
+        }
+    }
+
+
+piece_store = PieceStore(PIECE_STORE_DIR)
@@ -0,0 +1,73 @@
+"""Build Puzzle entries from an uploaded image (shared by single and bulk creation)"""
+
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from models import Puzzle, PuzzleCreate, PuzzleImage
+from persistence import to_document
+from cloudinary_service import (
+    generate_thumbnail_url,
+    generate_all_difficulty_pieces,
+    generate_atlas_url
+)
+from piece_slicer import PIECE_BACKEND, generate_local_pieces
+from executors import image_executor
+from metrics import IMAGE_SECONDS
+
+
+async def build_puzzle(
+    upload_result: Dict,
+    source: BinaryIO,
+    fields: PuzzleCreate,
+    puzzle_id: Optional[str] = None
+) -> Tuple[Puzzle, Dict]:
+    """
+    Create the Puzzle for an image already uploaded to Cloudinary.
+    `source` is the original image stream, only read when slicing locally.
+    `puzzle_id` overrides the random id (bulk imports use deterministic ids).
+
+    Returns:
+        (puzzle model, MongoDB document to insert)
+    """
+    public_id = upload_result["cloudinary_public_id"]
+
+    # Generate thumbnail URL
+    thumbnail = generate_thumbnail_url(public_id)
+
+    # Generate puzzle pieces for all difficulties
+    if PIECE_BACKEND == "local":
+        # Slice locally from the source stream into the piece store
+        source.seek(0)
+        local_pieces = await image_executor.run(IMAGE_SECONDS.timed(generate_local_pieces, "slice"), source)
+        piece_data = local_pieces["pieces"]
+        atlas_url = local_pieces["atlas"]
+    else:
+        piece_data = generate_all_difficulty_pieces(
+            public_id,
+            upload_result["width"],
+            upload_result["height"]
+        )
+        atlas_url = generate_atlas_url(public_id)
+
+    # Create puzzle object
+    puzzle = Puzzle(
+        **fields.model_dump(),
+        original_image=PuzzleImage(
+            cloudinary_public_id=public_id,
+            url=upload_result["url"],
+            width=upload_result["width"],
+            height=upload_result["height"],
+            format=upload_result["format"]
+        ),
+        thumbnail_url=thumbnail,
+        piece_data=piece_data,
+        atlas_url=atlas_url,
+        **({"id": puzzle_id} if puzzle_id else {})
+    )
+
+    # Cloudinary piece URLs are derived on demand from the public id,
+    # so only locally sliced pieces need to be stored.
+    puzzle_dict = to_document(puzzle)
+    if PIECE_BACKEND != "local":
+        del puzzle_dict["piece_data"]
+
+    return puzzle, puzzle_dict
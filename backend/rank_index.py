@@ -0,0 +1,269 @@
+"""
+In-memory order statistics for exact score ranks.
+
+For each leaderboard key (see leaderboard_engine) a Fenwick tree counts the
+visible scores per score value. Scores are integers in a small fixed range
+(0 .. BASE_SCORE * the highest difficulty multiplier), so the rank of any
+value is `1 + number of higher scores`, answered with one prefix sum in
+O(log max_score) and updated in O(log max_score) per submission. The rare
+scores outside the range are kept in a sorted overflow list.
+
+Boards are loaded lazily: the first lookup of a board starts loading it in
+the background and is answered with indexed count_documents meanwhile.
+A load counts the scores per value with a `$group` aggregation, except the
+ones completed in the last RANK_LOAD_WINDOW, which are fetched with their
+ids: updates racing with the load (and write-behind scores not yet stored)
+concern recent scores, and are applied unless the load already saw them.
+When one concerns an older score, whether the aggregation counted it is
+unknown, and the board is not kept (the next lookup loads it again).
+Loaded boards are updated by submit_score, delete_score and flag_score,
+and evicted least recently used beyond RANK_INDEX_BOARDS. Each board holds
+an int32 tree of MAX_SCORE + 1 slots (about 120 KB), so the default of 64
+boards stays under 8 MB. Like the leaderboard engine, state is per process.
+"""
+
+import asyncio
+import logging
+import os
+from bisect import bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from leaderboard_engine import WILDCARD, BoardKey, board_key, board_query, buffered_scores, keys_for_score
+from utils.scoring import BASE_SCORE, DIFFICULTY_MULTIPLIERS
+
+logger = logging.getLogger(__name__)
+
+MAX_SCORE = int(BASE_SCORE * max(DIFFICULTY_MULTIPLIERS.values()))
+RANK_INDEX_BOARDS = int(os.environ.get("RANK_INDEX_BOARDS", "64"))
+RANK_LOAD_WINDOW = timedelta(seconds=float(os.environ.get("RANK_LOAD_WINDOW", "120")))
+
+
+class FenwickTree:
+    """
+    Binary indexed tree of counts over the values 0 .. size - 1
+    """
+
+    def __init__(self, counts: np.ndarray):
+        size = len(counts)
+        prefix = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(counts, out=prefix[1:])
+        index = np.arange(1, size + 1)
+        # tree[i] holds the counts of the (i & -i) values ending at value i - 1
+        self.tree = np.zeros(size + 1, dtype=np.int32)
+        self.tree[1:] = prefix[index] - prefix[index - (index & -index)]
+        self.size = size
+
+    def add(self, value: int, delta: int):
+        i = value + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def count_le(self, value: int) -> int:
+        """
+        Number of counted values <= value
+        """
+        i = min(value, self.size - 1) + 1
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return int(total)
+
+
+class ScoreCounts:
+    """
+    Multiset of the scores on one leaderboard
+    """
+
+    def __init__(self, scores: np.ndarray, counts: Optional[np.ndarray] = None):
+        """
+        Args:
+            scores: Score values
+            counts: Occurrences of each value (None: once each)
+        """
+        scores = np.maximum(scores.astype(np.int64), 0)
+        counts = np.ones(len(scores), dtype=np.int64) if counts is None else counts.astype(np.int64)
+        in_range = scores <= MAX_SCORE
+        per_value = np.bincount(scores[in_range], weights=counts[in_range], minlength=MAX_SCORE + 1)
+        self.tree = FenwickTree(per_value.astype(np.int64))
+        self.overflow: List[int] = sorted(np.repeat(scores[~in_range], counts[~in_range]).tolist())
+        self.total = int(counts.sum())
+
+    def add(self, score: int, delta: int = 1):
+        score = max(score, 0)
+        if score > MAX_SCORE:
+            if delta > 0:
+                insort(self.overflow, score)
+            elif score in self.overflow:
+                self.overflow.remove(score)
+        else:
+            self.tree.add(score, delta)
+        self.total += delta
+
+    def count_greater(self, score: int) -> int:
+        higher_overflow = len(self.overflow) - bisect_right(self.overflow, score)
+        if score >= MAX_SCORE:
+            return higher_overflow
+        in_range = self.total - len(self.overflow)
+        return in_range - self.tree.count_le(max(score, -1)) + higher_overflow
+
+
+def _older(score: dict, cutoff: datetime) -> bool:
+    """
+    Whether a score was completed before `cutoff` (or when is unknown)
+    """
+    completed_at = score.get("completed_at")
+    if not isinstance(completed_at, datetime):
+        return True
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return completed_at < cutoff
+
+
+class RankIndex:
+    """
+    Score counts per leaderboard key, loaded on demand
+    """
+
+    def __init__(self, max_boards: int = RANK_INDEX_BOARDS):
+        self.max_boards = max_boards
+        self.boards: "OrderedDict[BoardKey, ScoreCounts]" = OrderedDict()
+        # Boards being loaded -> (op, score document) received meanwhile
+        self._loading: Dict[BoardKey, List[Tuple[str, dict]]] = {}
+        # One load per key: concurrent lookups share the same task
+        self._inflight: Dict[BoardKey, asyncio.Task] = {}
+        # Bumped by clear(): loads started before it are discarded
+        self._generation = 0
+
+    def _load_board(self, db: AsyncIOMotorDatabase, key: BoardKey) -> asyncio.Task:
+        """
+        Start loading a board, or return the load already in progress
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_board(db, key, self._generation))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._load_done(key, done))
+        return task
+
+    def _load_done(self, key: BoardKey, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Rank index: loading {key} failed: {str(task.exception())}")
+
+    async def _fetch_board(self, db: AsyncIOMotorDatabase, key: BoardKey, generation: int) -> ScoreCounts:
+        puzzle_id, difficulty = key
+        query = board_query(
+            None if puzzle_id == WILDCARD else puzzle_id,
+            None if difficulty == WILDCARD else difficulty
+        )
+
+        self._loading[key] = []
+        updates = [("add", score) for score in buffered_scores(key)]
+        cutoff = datetime.utcnow() - RANK_LOAD_WINDOW
+        try:
+            pipeline = [
+                {"$match": {**query, "completed_at": {"$not": {"$gte": cutoff}}}},
+                {"$group": {"_id": "$score", "count": {"$sum": 1}}}
+            ]
+            rows = [row async for row in db.scores.aggregate(pipeline, allowDiskUse=True)]
+            recent = await db.scores.find(
+                {**query, "completed_at": {"$gte": cutoff}}, {"_id": 0, "id": 1, "score": 1}
+            ).to_list(None)
+        finally:
+            updates += self._loading.pop(key, [])
+
+        board = ScoreCounts(
+            np.array([row["_id"] for row in rows] + [doc["score"] for doc in recent], dtype=np.int64),
+            np.array([row["count"] for row in rows] + [1] * len(recent), dtype=np.int64)
+        )
+
+        # Apply the updates the load did not see
+        counted = {doc["id"] for doc in recent}
+        exact = True
+        for op, score in updates:
+            if op == "add" and score["id"] not in counted:
+                counted.add(score["id"])
+                board.add(score["score"], 1)
+                exact = exact and not _older(score, cutoff)
+            elif op == "discard" and score["id"] in counted:
+                counted.discard(score["id"])
+                board.add(score["score"], -1)
+            elif op == "discard":
+                exact = exact and not _older(score, cutoff)
+
+        if not exact:
+            logger.info(f"Rank index: {key} changed during its load, not kept")
+            return board
+        if generation != self._generation:
+            # Cleared while loading (rescoring): the next lookup loads it again
+            return board
+
+        self.boards[key] = board
+        while len(self.boards) > self.max_boards:
+            self.boards.popitem(last=False)
+        return board
+
+    def _update(self, op: str, score: dict):
+        for key in keys_for_score(score):
+            if key in self._loading:
+                self._loading[key].append((op, score))
+            board = self.boards.get(key)
+            if board is not None:
+                board.add(score["score"], 1 if op == "add" else -1)
+
+    def add(self, score: dict):
+        """
+        Count a newly submitted score
+        """
+        if score.get("is_validated") is False:
+            return
+        self._update("add", score)
+
+    def discard(self, score: dict):
+        """
+        Stop counting a deleted or flagged score (the document before the change)
+        """
+        if score.get("is_validated") is False:
+            return
+        self._update("discard", score)
+
+    def clear(self):
+        self.boards.clear()
+        self._generation += 1
+
+    async def rank(
+        self,
+        db: AsyncIOMotorDatabase,
+        score: int,
+        puzzle_id: Optional[str] = None,
+        difficulty: Optional[str] = None
+    ) -> Tuple[int, int]:
+        """
+        Returns:
+            (rank of `score` = 1 + number of higher scores, number of scores)
+        """
+        key = board_key(puzzle_id, difficulty)
+        board = self.boards.get(key)
+        if board is None:
+            # Cold board: load it in the background, count with the indexes meanwhile
+            self._load_board(db, key)
+            if buffered_scores(key):
+                from score_buffer import score_buffer
+
+                await score_buffer.flush()
+            query = board_query(puzzle_id, difficulty)
+            higher = await db.scores.count_documents({**query, "score": {"$gt": score}})
+            return higher + 1, await db.scores.count_documents(query)
+
+        self.boards.move_to_end(key)
+        return board.count_greater(score) + 1, board.total
+
+
+rank_index = RankIndex()
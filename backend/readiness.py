@@ -0,0 +1,215 @@
+"""
+Readiness checks for load balancers (GET /api/ready).
+
+The instance reports itself degraded (503) when one of these exceeds its
+threshold:
+
+    MongoDB ping round trip          READY_MAX_PING_MS (default 500)
+    connection checkout wait (p95)   READY_MAX_POOL_WAIT_MS (default 250)
+    event-loop lag                   READY_MAX_LOOP_LAG_MS (default 200)
+    executor queue depth             the executor's max_queue (saturated)
+
+Pool statistics come from a pymongo ConnectionPoolListener registered on
+the Motor client. Event-loop lag is sampled by a background task that
+sleeps READY_LAG_INTERVAL seconds and measures how late it wakes up.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import monitoring
+
+from executors import executor_stats
+
+logger = logging.getLogger(__name__)
+
+READY_MAX_PING_MS = float(os.environ.get("READY_MAX_PING_MS", "500"))
+READY_MAX_POOL_WAIT_MS = float(os.environ.get("READY_MAX_POOL_WAIT_MS", "250"))
+READY_MAX_LOOP_LAG_MS = float(os.environ.get("READY_MAX_LOOP_LAG_MS", "200"))
+READY_LAG_INTERVAL = float(os.environ.get("READY_LAG_INTERVAL", "0.5"))
+# Percentiles cover the samples of the last READY_WINDOW seconds
+READY_WINDOW = float(os.environ.get("READY_WINDOW", "60"))
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Connection checkout counters and wait times of the client's pools
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # pymongo checks connections out on the calling thread
+        self._started: Dict[int, float] = {}
+        self.waits = deque(maxlen=4096)  # (time, seconds)
+
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.max_wait = 0.0
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._started[threading.get_ident()] = time.perf_counter()
+
+    def _checkout_done(self) -> Optional[float]:
+        start = self._started.pop(threading.get_ident(), None)
+        if start is None:
+            return None
+        now = time.perf_counter()
+        wait = now - start
+        self.waits.append((now, wait))
+        self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._checkout_done()
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._checkout_done()
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> Dict:
+        import numpy as np
+
+        since = time.perf_counter() - READY_WINDOW
+        with self._lock:
+            waits = np.array([wait for at, wait in self.waits if at >= since], dtype=np.float64) * 1000
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": len(self._started),
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_p50_ms": round(float(np.percentile(waits, 50)), 3) if len(waits) else 0.0,
+                "wait_p95_ms": round(float(np.percentile(waits, 95)), 3) if len(waits) else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3)
+            }
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the event loop runs a timer
+    """
+
+    def __init__(self, interval: float = READY_LAG_INTERVAL):
+        self.interval = interval
+        self.lags = deque(maxlen=max(1, int(READY_WINDOW / interval)))  # seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        import numpy as np
+
+        lags = np.array(self.lags, dtype=np.float64) * 1000
+        return {
+            "last_ms": round(float(lags[-1]), 3) if len(lags) else 0.0,
+            "p95_ms": round(float(np.percentile(lags, 95)), 3) if len(lags) else 0.0,
+            "max_ms": round(float(lags.max()), 3) if len(lags) else 0.0
+        }
+
+
+pool_stats = PoolStats()
+loop_lag = LoopLagMonitor()
+
+
+async def ping_latency(db: AsyncIOMotorDatabase, timeout: float) -> Optional[float]:
+    """
+    Round trip of a MongoDB ping in milliseconds (None if it failed or timed out)
+    """
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+    except Exception as e:
+        logger.warning(f"Readiness ping failed: {str(e)}")
+        return None
+    return (time.perf_counter() - start) * 1000
+
+
+async def check_readiness(db: AsyncIOMotorDatabase) -> Dict:
+    """
+    Returns:
+        Report with "ready" and the failed checks in "degraded"
+    """
+    # Give up well past the threshold, so a hung server reports quickly
+    ping_ms = await ping_latency(db, timeout=2 * READY_MAX_PING_MS / 1000)
+    pool = pool_stats.stats()
+    lag = loop_lag.stats()
+    executors = executor_stats()
+
+    degraded = []
+    if ping_ms is None:
+        degraded.append("mongo_unreachable")
+    elif ping_ms > READY_MAX_PING_MS:
+        degraded.append("mongo_slow")
+    if pool["wait_p95_ms"] > READY_MAX_POOL_WAIT_MS:
+        degraded.append("pool_wait")
+    if lag["p95_ms"] > READY_MAX_LOOP_LAG_MS:
+        degraded.append("event_loop_lag")
+    for name, stats in executors.items():
+        if stats["queue_depth"] >= stats["max_queue"]:
+            degraded.append(f"executor_{name}_saturated")
+
+    return {
+        "ready": not degraded,
+        "degraded": degraded,
+        "mongo": {"ping_ms": None if ping_ms is None else round(ping_ms, 3)},
+        "pool": pool,
+        "event_loop_lag": lag,
+        "executors": {
+            name: {key: stats[key] for key in ("queue_depth", "max_queue", "active", "max_workers")}
+            for name, stats in executors.items()
+        }
+    }
@@ -0,0 +1,211 @@
+"""
+Recompute stored scores after a change to the scoring formula.
+
+Scores are streamed from MongoDB in chunks, recomputed with the vectorized
+calculate_game_scores and written back with one unordered bulk_write per
+chunk. Only scores whose value changed are updated. When some did, the
+leaderboard rollups are invalidated and the score distributions rebuilt
+(the admin job also rebuilds the in-memory leaderboards and rank index).
+
+Run from the admin API (POST /api/scores/admin/rescore) or directly:
+
+    python rescoring.py [--chunk-size 10000] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from utils.scoring import calculate_game_scores
+
+logger = logging.getLogger(__name__)
+
+RESCORE_CHUNK_SIZE = int(os.environ.get("RESCORE_CHUNK_SIZE", "10000"))
+RESCORE_PROJECTION = {"_id": 1, "difficulty": 1, "completion_time": 1, "moves": 1, "score": 1}
+
+
+def rescore_chunk(docs: List[Dict]) -> List[UpdateOne]:
+    """
+    Updates for the documents of one chunk whose stored score is out of date
+    """
+    difficulties = [doc.get("difficulty", "") for doc in docs]
+    times = np.fromiter((doc.get("completion_time", 0) for doc in docs), dtype=np.int64, count=len(docs))
+    moves = np.fromiter((doc.get("moves", 0) for doc in docs), dtype=np.int64, count=len(docs))
+    stored = np.fromiter((doc.get("score", -1) for doc in docs), dtype=np.int64, count=len(docs))
+
+    scores = calculate_game_scores(difficulties, times, moves)
+    changed = np.flatnonzero(scores != stored)
+
+    return [
+        UpdateOne({"_id": docs[i]["_id"]}, {"$set": {"score": int(scores[i])}})
+        for i in changed
+    ]
+
+
+async def rescore_scores(
+    db: AsyncIOMotorDatabase,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    dry_run: bool = False,
+    progress: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    Recompute every stored score.
+
+    Args:
+        chunk_size: Documents recomputed and written per batch
+        dry_run: Count changes without writing them
+        progress: Called with the running totals after every chunk
+
+    Returns:
+        Totals: total, processed, updated, elapsed seconds
+    """
+    started = time.monotonic()
+    totals = {
+        "total": await db.scores.estimated_document_count(),
+        "processed": 0,
+        "updated": 0,
+        "elapsed": 0.0
+    }
+
+    async def write(docs: List[Dict]):
+        updates = rescore_chunk(docs)
+        if updates and not dry_run:
+            await db.scores.bulk_write(updates, ordered=False)
+
+        totals["processed"] += len(docs)
+        totals["updated"] += len(updates)
+        totals["elapsed"] = round(time.monotonic() - started, 3)
+        if progress:
+            progress(dict(totals))
+
+    chunk = []
+    async for doc in db.scores.find({}, RESCORE_PROJECTION, batch_size=chunk_size):
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            await write(chunk)
+            chunk = []
+    if chunk:
+        await write(chunk)
+
+    totals["elapsed"] = round(time.monotonic() - started, 3)
+    return totals
+
+
+class RescoreJob:
+    """
+    The rescoring run of this process, with its progress
+    """
+
+    def __init__(self):
+        self.status = "idle"  # idle | running | completed | failed
+        self.dry_run = False
+        self.progress: Dict = {}
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, db: AsyncIOMotorDatabase, chunk_size: int = RESCORE_CHUNK_SIZE, dry_run: bool = False) -> bool:
+        """
+        Run a rescoring in the background. Returns False if one is already running.
+        """
+        if self.running:
+            return False
+
+        self.status = "running"
+        self.dry_run = dry_run
+        self.progress = {}
+        self.error = None
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+
+        async def run():
+            from distributions import rebuild_distributions
+            from leaderboard_engine import leaderboard_engine
+            from rank_index import rank_index
+            from rollups import invalidate_all_rollups
+
+            try:
+                self.progress = await rescore_scores(
+                    db, chunk_size, dry_run, progress=lambda totals: setattr(self, "progress", totals)
+                )
+                if not dry_run and self.progress["updated"]:
+                    # Rankings may have changed
+                    await leaderboard_engine.rebuild(db)
+                    rank_index.clear()
+                    await invalidate_all_rollups(db)
+                    # The score histograms too
+                    await rebuild_distributions(db, chunk_size)
+                self.status = "completed"
+                logger.info(f"Rescoring: {self.progress['updated']}/{self.progress['processed']} scores changed")
+            except Exception as e:
+                self.status = "failed"
+                self.error = str(e)
+                logger.error(f"Rescoring failed: {str(e)}")
+            finally:
+                self.finished_at = datetime.utcnow()
+
+        self._task = asyncio.create_task(run())
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "status": self.status,
+            "dry_run": self.dry_run,
+            "progress": self.progress,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+rescore_job = RescoreJob()
+
+
+async def _main(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    try:
+        totals = await rescore_scores(
+            client[os.environ["DB_NAME"]],
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+            progress=lambda t: print(f"{t['processed']}/{t['total']} processed, {t['updated']} changed")
+        )
+        if not args.dry_run and totals["updated"]:
+            from distributions import rebuild_distributions
+            from rollups import invalidate_all_rollups
+
+            # Running servers rebuild their in-memory leaderboards on restart
+            await invalidate_all_rollups(client[os.environ["DB_NAME"]])
+            await rebuild_distributions(client[os.environ["DB_NAME"]], args.chunk_size)
+    finally:
+        client.close()
+
+    verb = "would be updated" if args.dry_run else "updated"
+    print(f"{totals['updated']} of {totals['processed']} scores {verb} in {totals['elapsed']}s")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pathlib import Path
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Recompute stored scores with the current scoring formula")
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,201 @@
+"""
+Response cache with ETags for the puzzle read endpoints.
+
+Serialized responses are cached per request (path + query string) and
+tagged with the version they were built from: the catalog version for
+listings, the puzzle's own version for single-puzzle responses. Admin
+writes bump these versions (`invalidate`), which makes the affected
+entries stale immediately.
+
+Bodies are encoded once per media type (see encoders): the cache key
+includes the negotiated Accept type.
+
+Every response carries an ETag (hash of the body) and Cache-Control. A
+request whose If-None-Match matches a current cached entry gets a 304
+without touching the database.
+
+Versions are shared between workers through the `cache_versions` document:
+invalidations `$inc` it and every worker re-reads it every
+RESPONSE_CACHE_SYNC seconds. Entries also expire after RESPONSE_CACHE_TTL
+seconds, which bounds the staleness of counters that change without an
+admin edit (puzzle play statistics).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from encoders import TrustedAdapter, negotiate
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SYNC = float(os.environ.get("RESPONSE_CACHE_SYNC", "5"))
+# Browsers revalidate on every use by default (cheap 304s)
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get("RESPONSE_CACHE_MAX_AGE", "0"))
+
+VERSIONS_ID = "puzzles"
+
+# (content, extra headers)
+Built = Tuple[Any, Dict[str, str]]
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as for GET requests
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+class CacheEntry:
+    def __init__(self, version: Tuple, body: bytes, headers: Dict[str, str]):
+        self.version = version
+        self.body = body
+        self.headers = headers
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """
+    Versioned LRU cache of serialized responses
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.catalog_version = 0
+        self.puzzle_versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    # ---------- versions ----------
+
+    def _version(self, puzzle_id: Optional[str]) -> Tuple:
+        if puzzle_id is None:
+            return ("catalog", self.catalog_version)
+        return ("puzzle", self.puzzle_versions.get(puzzle_id, 0))
+
+    def _adopt(self, doc: Optional[Dict]):
+        # Versions only grow: never go back to a value read before an invalidation
+        if doc:
+            self.catalog_version = max(self.catalog_version, doc.get("catalog", 0))
+            for puzzle_id, version in doc.get("puzzles", {}).items():
+                self.puzzle_versions[puzzle_id] = max(self.puzzle_versions.get(puzzle_id, 0), version)
+
+    async def invalidate(self, db: AsyncIOMotorDatabase, puzzle_id: Optional[str] = None):
+        """
+        Bump the catalog version, and the version of `puzzle_id` if given
+        """
+        inc = {"catalog": 1}
+        if puzzle_id:
+            inc[f"puzzles.{puzzle_id}"] = 1
+
+        doc = await db.cache_versions.find_one_and_update(
+            {"_id": VERSIONS_ID},
+            {"$inc": inc},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._adopt(doc)
+
+    async def sync(self, db: AsyncIOMotorDatabase):
+        self._adopt(await db.cache_versions.find_one({"_id": VERSIONS_ID}))
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(RESPONSE_CACHE_SYNC)
+            try:
+                await self.sync(db)
+            except Exception as e:
+                logger.warning(f"Response cache version sync failed: {str(e)}")
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        await self.sync(db)
+        self._task = asyncio.create_task(self._run(db))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ---------- responses ----------
+
+    def _cache_headers(self, etag: str) -> Dict[str, str]:
+        cache_control = f"public, max-age={RESPONSE_CACHE_MAX_AGE}" if RESPONSE_CACHE_MAX_AGE else "public, no-cache"
+        return {"ETag": etag, "Cache-Control": cache_control}
+
+    async def respond(
+        self,
+        request: Request,
+        build: Callable[[], Awaitable[Built]],
+        adapter: Optional[TrustedAdapter] = None,
+        puzzle_id: Optional[str] = None
+    ) -> Response:
+        """
+        Serve the request from the cache, or build, serialize and cache it.
+
+        Args:
+            build: Loads the content; returns (content, extra headers)
+            adapter: Shapes the content like the route's response model (None: already plain data)
+            puzzle_id: Puzzle the response depends on (None: the catalog)
+        """
+        media_type, encode = negotiate(request)
+        key = media_type + " " + str(request.url.path) + "?" + str(request.url.query)
+        version = self._version(puzzle_id)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version and time.monotonic() - entry.created < self.ttl:
+            self._entries.move_to_end(key)
+            if _matches(request.headers.get("if-none-match"), entry.etag):
+                self.not_modified += 1
+                return Response(status_code=304, headers={**entry.headers, **self._cache_headers(entry.etag)})
+            self.hits += 1
+        else:
+            self.misses += 1
+            content, headers = await build()
+            # Database output is trusted: shaped like the response model, not re-validated
+            if adapter is not None:
+                content = adapter.prepare(content)
+            entry = CacheEntry(version, encode(content), {**headers, "Vary": "Accept"})
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            if _matches(request.headers.get("if-none-match"), entry.etag):
+                return Response(status_code=304, headers={**entry.headers, **self._cache_headers(entry.etag)})
+
+        return Response(
+            content=entry.body,
+            media_type=media_type,
+            headers={**entry.headers, **self._cache_headers(entry.etag)}
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "catalog_version": self.catalog_version,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,219 @@
+"""
+Pre-aggregated leaderboards per calendar bucket.
+
+Timeframe leaderboards (daily, weekly, monthly) are served from the
+`leaderboard_rollups` collection: one document per (period, bucket, puzzle,
+difficulty) holding the bucket's top ROLLUP_TOP_K entries, with the same
+wildcard keys as the in-memory boards (see leaderboard_engine). Buckets are
+calendar periods in UTC: the day, the ISO week (from Monday) and the month.
+
+Each stored score is pushed into its 12 rollups (3 periods x 4 keys) with
+`$push` + `$sort` + `$slice`, which keeps every document sorted and bounded
+in one atomic update. A rollup is marked incomplete when one of its entries
+is deleted or flagged, and incomplete or missing rollups are rebuilt from
+`scores` on the next read. Every push and invalidation increments the
+rollup's `version`; a rebuild is only stored if the version it started
+from is unchanged, so it never overwrites a concurrent push or
+invalidation (the rollup stays incomplete and the next read rebuilds it).
+Old buckets expire through a TTL index on `expires_at`.
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from leaderboard_engine import SCORE_PROJECTION, WILDCARD, board_key, board_query, keys_for_score
+
+ROLLUP_TOP_K = int(os.environ.get("ROLLUP_TOP_K", "100"))
+
+# Leaderboard timeframe -> rollup period
+TIMEFRAME_PERIODS = {"daily": "day", "weekly": "week", "monthly": "month"}
+
+# How long a bucket is kept after it ends
+RETENTION = {
+    "day": timedelta(days=7),
+    "week": timedelta(weeks=5),
+    "month": timedelta(days=366),
+}
+
+ENTRY_FIELDS = [field for field in SCORE_PROJECTION if field != "_id"]
+ENTRY_SORT = {"score": -1, "id": 1}
+
+
+def bucket_range(period: str, moment: datetime) -> Tuple[datetime, datetime]:
+    """
+    Start (inclusive) and end (exclusive) of the bucket containing `moment`
+    """
+    day = datetime(moment.year, moment.month, moment.day)
+    if period == "day":
+        return day, day + timedelta(days=1)
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(weeks=1)
+    start = datetime(moment.year, moment.month, 1)
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def bucket_name(period: str, moment: datetime) -> str:
+    if period == "day":
+        return moment.strftime("%Y-%m-%d")
+    if period == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return moment.strftime("%Y-%m")
+
+
+def _rollup_filter(period: str, bucket: str, key: Tuple[str, str]) -> Dict:
+    return {"period": period, "bucket": bucket, "puzzle_id": key[0], "difficulty": key[1]}
+
+
+def _entry(score: Dict) -> Dict:
+    return {field: score[field] for field in ENTRY_FIELDS if field in score}
+
+
+async def record_rollups(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    """
+    Push stored scores into the rollups of their buckets
+    (one update per rollup, whatever the number of scores)
+    """
+    pushes: Dict[Tuple, List[Dict]] = defaultdict(list)
+    expires: Dict[Tuple, datetime] = {}
+    for score in scores:
+        if score.get("is_validated") is False:
+            continue
+        for period in TIMEFRAME_PERIODS.values():
+            bucket = bucket_name(period, score["completed_at"])
+            _, end = bucket_range(period, score["completed_at"])
+            for key in keys_for_score(score):
+                pushes[(period, bucket, key)].append(_entry(score))
+                expires[(period, bucket, key)] = end + RETENTION[period]
+
+    updates = [
+        UpdateOne(
+            _rollup_filter(period, bucket, key),
+            {
+                "$push": {"entries": {"$each": entries, "$sort": ENTRY_SORT, "$slice": ROLLUP_TOP_K}},
+                "$inc": {"version": 1},
+                "$setOnInsert": {"complete": False, "expires_at": expires[(period, bucket, key)]}
+            },
+            upsert=True
+        )
+        for (period, bucket, key), entries in pushes.items()
+    ]
+
+    if updates:
+        await db.leaderboard_rollups.bulk_write(updates, ordered=False)
+
+
+async def invalidate_rollups(db: AsyncIOMotorDatabase, score_id: str):
+    """
+    Remove a deleted or flagged score; its rollups are rebuilt on next read
+    """
+    await db.leaderboard_rollups.update_many(
+        {"entries.id": score_id},
+        {"$pull": {"entries": {"id": score_id}}, "$set": {"complete": False}, "$inc": {"version": 1}}
+    )
+
+
+async def invalidate_all_rollups(db: AsyncIOMotorDatabase):
+    """
+    Rebuild every rollup on its next read (after rescoring)
+    """
+    await db.leaderboard_rollups.update_many({"complete": True}, {"$set": {"complete": False}, "$inc": {"version": 1}})
+
+
+def timeframe_query(puzzle_id: Optional[str], difficulty: Optional[str], timeframe: str) -> Dict:
+    """
+    Leaderboard filter restricted to the current bucket of a timeframe
+    (daily, weekly, monthly; anything else is all-time)
+    """
+    query = board_query(puzzle_id, difficulty)
+
+    period = TIMEFRAME_PERIODS.get(timeframe)
+    if period:
+        start, end = bucket_range(period, datetime.utcnow())
+        query["completed_at"] = {"$gte": start, "$lt": end}
+
+    return query
+
+
+async def _rebuild_rollup(
+    db: AsyncIOMotorDatabase,
+    period: str,
+    key: Tuple[str, str],
+    now: datetime,
+    version: Optional[int]
+) -> List[Dict]:
+    """
+    Recompute a rollup from `scores`. It is stored only if its version is
+    still `version` (None: missing rollup or field), read before the query.
+    """
+    puzzle_id, difficulty = key
+    start, end = bucket_range(period, now)
+    query = board_query(
+        None if puzzle_id == WILDCARD else puzzle_id,
+        None if difficulty == WILDCARD else difficulty
+    )
+    query["completed_at"] = {"$gte": start, "$lt": end}
+
+    entries = await db.scores.find(query, SCORE_PROJECTION).sort(
+        [("score", -1), ("id", 1)]
+    ).limit(ROLLUP_TOP_K).to_list(ROLLUP_TOP_K)
+
+    try:
+        await db.leaderboard_rollups.update_one(
+            {**_rollup_filter(period, bucket_name(period, now), key), "version": version},
+            {"$set": {
+                "entries": entries,
+                "complete": True,
+                "expires_at": end + RETENTION[period],
+                # Numeric for the next $inc (an upsert would store the matched null)
+                "version": version or 0
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Changed since `version` was read: the upsert collided with the rollup
+        pass
+    return entries
+
+
+async def get_rollup_top(
+    db: AsyncIOMotorDatabase,
+    timeframe: str,
+    puzzle_id: Optional[str],
+    difficulty: Optional[str],
+    limit: int
+) -> List[Dict]:
+    """
+    Top `limit` scores of the current bucket of a timeframe, from its rollup
+    """
+    period = TIMEFRAME_PERIODS[timeframe]
+    if limit > ROLLUP_TOP_K:
+        # Deeper than the rollup keeps: query the bucket directly
+        return await db.scores.find(
+            timeframe_query(puzzle_id, difficulty, timeframe), SCORE_PROJECTION
+        ).sort("score", -1).limit(limit).to_list(limit)
+
+    now = datetime.utcnow()
+    key = board_key(puzzle_id, difficulty)
+    rollup = await db.leaderboard_rollups.find_one(
+        _rollup_filter(period, bucket_name(period, now), key),
+        {"_id": 0, "entries": 1, "complete": 1, "version": 1}
+    )
+
+    if rollup is None or not rollup.get("complete"):
+        entries = await _rebuild_rollup(db, period, key, now, rollup.get("version") if rollup else None)
+    else:
+        entries = rollup["entries"]
+
+    # A push racing with a rebuild can leave a duplicate entry
+    seen = set()
+    unique = [entry for entry in entries if not (entry["id"] in seen or seen.add(entry["id"]))]
+    return unique[:limit]
@@ -0,0 +1,333 @@
+"""
+Write-behind buffering for score submissions.
+
+When SCORE_WRITE_BEHIND is enabled, submit_score hands accepted scores to
+`score_buffer` instead of writing them itself. The buffer flushes them with
+one insert_many plus coalesced `$inc` updates of the puzzle and player
+aggregates, score distributions and leaderboard rollups, and one `$bit`
+achievement update per user, whenever SCORE_BUFFER_SIZE scores are waiting
+or every SCORE_BUFFER_INTERVAL seconds.
+
+Durability: every accepted score is first appended to a local journal
+segment (JSON lines). Segments are deleted only after their scores are
+written; segments left behind by a crash are replayed at startup. Each
+process writes its own segments (scores-<owner>-<time>.jsonl) and holds an
+flock on <owner>.lock while it runs, so a starting worker only replays the
+segments of processes that are gone, never those of a live sibling.
+
+Replays and retries are idempotent: scores.id is unique, and every score
+is inserted with the follow-up writes it still needs (`pending_writes`).
+Each step removes itself from the scores it was applied to, so a retry
+after a failed step applies exactly the steps still missing. Only a crash
+between a step and its removal can apply that step twice.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+
+from aggregates import apply_score_aggregates
+from rollups import record_rollups
+
+logger = logging.getLogger(__name__)
+
+SCORE_WRITE_BEHIND = os.environ.get("SCORE_WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+SCORE_BUFFER_SIZE = int(os.environ.get("SCORE_BUFFER_SIZE", "100"))
+SCORE_BUFFER_INTERVAL = float(os.environ.get("SCORE_BUFFER_INTERVAL", "1.0"))
+SCORE_JOURNAL_DIR = Path(os.environ.get("SCORE_JOURNAL_DIR", Path(__file__).parent / "score_journal"))
+SCORE_JOURNAL_FSYNC = os.environ.get("SCORE_JOURNAL_FSYNC", "").lower() in ("1", "true", "yes")
+
+
+async def _record_distributions(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    from distributions import record_distributions
+
+    await record_distributions(db, scores)
+
+
+async def _record_achievements(db: AsyncIOMotorDatabase, scores: List[Dict]):
+    from achievements import record_score_achievements
+
+    await record_score_achievements(db, scores)
+
+
+# Follow-up writes of stored scores, in order: (name, writer)
+FOLLOW_UP_WRITES = [
+    ("aggregates", apply_score_aggregates),
+    ("distributions", _record_distributions),
+    ("rollups", record_rollups),
+    ("achievements", _record_achievements),
+]
+PENDING_FIELD = "pending_writes"
+
+
+async def write_scores(db: AsyncIOMotorDatabase, scores: List[Dict]) -> int:
+    """
+    Insert scores and apply their follow-up writes (aggregates, distributions,
+    rollups, achievements). Scores already present (same id) are not inserted again, but
+    the follow-up writes they still lack are applied.
+
+    Returns:
+        Number of scores inserted
+    """
+    steps = [name for name, _ in FOLLOW_UP_WRITES]
+    documents = [{**score, PENDING_FIELD: steps} for score in scores]
+    inserted = documents
+    try:
+        await db.scores.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        duplicates = {error["index"] for error in errors}
+        inserted = [doc for index, doc in enumerate(documents) if index not in duplicates]
+
+        # Stored by an earlier attempt: resume the steps that attempt did not finish
+        duplicate_ids = [documents[index]["id"] for index in duplicates]
+        unfinished = await db.scores.find(
+            {"id": {"$in": duplicate_ids}, PENDING_FIELD: {"$exists": True, "$ne": []}}, {"_id": 0}
+        ).to_list(None)
+        documents = inserted + unfinished
+
+    for name, write in FOLLOW_UP_WRITES:
+        batch = [doc for doc in documents if name in doc.get(PENDING_FIELD, ())]
+        if not batch:
+            continue
+        await write(db, batch)
+        await db.scores.update_many(
+            {"id": {"$in": [doc["id"] for doc in batch]}}, {"$pull": {PENDING_FIELD: name}}
+        )
+
+    await db.scores.update_many(
+        {"id": {"$in": [doc["id"] for doc in documents]}, PENDING_FIELD: []}, {"$unset": {PENDING_FIELD: ""}}
+    )
+    return len(inserted)
+
+
+class ScoreWriteBuffer:
+    """
+    Buffers score documents and writes them to Mongo in batches
+    """
+
+    def __init__(
+        self,
+        journal_dir: Path,
+        max_size: int = SCORE_BUFFER_SIZE,
+        max_delay: float = SCORE_BUFFER_INTERVAL,
+        enabled: bool = SCORE_WRITE_BEHIND
+    ):
+        self.journal_dir = Path(journal_dir)
+        # Segments of this process are named after it (see replay)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._owner_lock = None
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.enabled = enabled
+        self.db: Optional[AsyncIOMotorDatabase] = None
+
+        self._pending: List[Dict] = []
+        # Scores of the flush in progress
+        self._writing: List[Dict] = []
+        # Journal segments holding scores not yet written (failed flushes)
+        self._pending_segments: List[Path] = []
+        self._segment: Optional[Path] = None
+        self._journal = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.flush_failures = 0
+
+    # ---------- journal ----------
+
+    def _journal_write(self, score: Dict):
+        if self._journal is None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._segment = self.journal_dir / f"scores-{self.owner}-{time.time_ns()}.jsonl"
+            self._journal = open(self._segment, "a", encoding="utf-8")
+
+        self._journal.write(json_util.dumps(score) + "\n")
+        self._journal.flush()
+        if SCORE_JOURNAL_FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def _close_segment(self) -> Optional[Path]:
+        segment = self._segment
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = None
+        self._segment = None
+        return segment
+
+    def _lock_owner(self, owner: str):
+        """
+        Open and lock an owner's lock file without blocking.
+        Returns the open file, or None while the owner holds it.
+        """
+        path = self.journal_dir / f"{owner}.lock"
+        while True:
+            lock = open(path, "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return None
+            # A replay may have removed the file between open and flock: lock the new one
+            try:
+                if os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    return lock
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def _orphaned_segments(self) -> List[Tuple[IO, List[Path]]]:
+        """
+        Lock files and segments of the owners that are gone, locked by this process
+        """
+        owners: Dict[str, List[Path]] = {}
+        for segment in sorted(self.journal_dir.glob("scores-*.jsonl")):
+            # scores-<owner>-<time>.jsonl; segments of older versions have no owner
+            owner = segment.stem[len("scores-"):].rpartition("-")[0] or "legacy"
+            if owner != self.owner:
+                owners.setdefault(owner, []).append(segment)
+        for lock_path in self.journal_dir.glob("*.lock"):
+            if lock_path.stem != self.owner:
+                owners.setdefault(lock_path.stem, [])
+
+        orphaned = []
+        for owner, segments in owners.items():
+            lock = self._lock_owner(owner)
+            if lock is None:
+                continue
+            # Segments written after the owner's last flush, re-read under the lock
+            segments = [segment for segment in segments if segment.exists()]
+            orphaned.append((lock, segments))
+        return orphaned
+
+    async def replay(self) -> int:
+        """
+        Write the scores of journal segments left behind by processes that are gone
+        """
+        if not self.journal_dir.exists():
+            return 0
+
+        replayed = 0
+        for lock, segments in self._orphaned_segments():
+            try:
+                for segment in segments:
+                    scores = []
+                    for line in segment.read_text(encoding="utf-8").splitlines():
+                        try:
+                            scores.append(json_util.loads(line))
+                        except ValueError:
+                            # Torn last line from a crash mid-write
+                            logger.warning(f"Skipping corrupt journal line in {segment.name}")
+                    if scores:
+                        replayed += await write_scores(self.db, scores)
+                    segment.unlink()
+                Path(lock.name).unlink(missing_ok=True)
+            finally:
+                lock.close()
+
+        if replayed:
+            logger.info(f"Replayed {replayed} buffered scores from the journal")
+        return replayed
+
+    # ---------- buffering ----------
+
+    async def add(self, score: Dict):
+        """
+        Accept a score. It is journaled immediately and written on the next flush.
+        """
+        self._journal_write(score)
+        self._pending.append(score)
+
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+
+    def pending_scores(self) -> List[Dict]:
+        """
+        Accepted scores not yet written, or being written (on the in-memory
+        boards already)
+        """
+        return self._writing + self._pending
+
+    async def flush(self) -> int:
+        """
+        Write every pending score. On failure the scores stay pending
+        (and journaled) and are retried on the next flush.
+        """
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            scores, self._pending = self._pending, []
+            segments = self._pending_segments + [s for s in [self._close_segment()] if s]
+            self._pending_segments = []
+
+            self._writing = scores
+            try:
+                written = await write_scores(self.db, scores)
+            except Exception as e:
+                self.flush_failures += 1
+                logger.error(f"Score flush failed, {len(scores)} scores kept for retry: {str(e)}")
+                self._pending = scores + self._pending
+                self._pending_segments = segments
+                return 0
+            finally:
+                self._writing = []
+
+            for segment in segments:
+                segment.unlink(missing_ok=True)
+
+            self.flushed += written
+            return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.max_delay)
+            await self.flush()
+
+    # ---------- lifecycle ----------
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        # New owner per start: segments of an earlier start are replayed like any other
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # Held until close: tells other workers this process' segments are live
+        self._owner_lock = self._lock_owner(self.owner)
+        await self.replay()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Anything not written here stays in the journal for the next start
+        await self.flush()
+        self._close_segment()
+        if self._owner_lock is not None:
+            if not self._pending_segments:
+                Path(self._owner_lock.name).unlink(missing_ok=True)
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "flush_failures": self.flush_failures
+        }
+
+
+score_buffer = ScoreWriteBuffer(SCORE_JOURNAL_DIR)
@@ -1,12 +1,34 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pymongo import ReturnDocument
 from typing import List, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from models import Score, ScoreCreate
+from persistence import to_document
+from pagination import fetch_page, SCORE_HISTORY_SORT, NEXT_CURSOR_HEADER
+from enrichment import enrich_scores
+from leaderboard_engine import leaderboard_engine, SCORE_PROJECTION
+from score_buffer import score_buffer
+from aggregates import apply_score_aggregates, reconcile_aggregates
+from rollups import (
+    TIMEFRAME_PERIODS,
+    get_rollup_top,
+    invalidate_all_rollups,
+    invalidate_rollups,
+    record_rollups,
+    timeframe_query
+)
+from encoders import TrustedAdapter, encoded_response
 
 router = APIRouter(prefix="/scores", tags=["scores"])
 
+# The NumPy-backed modules (achievements, distributions, rank_index,
+# rescoring) are imported by the handlers that use them, not at startup
+
+# Serializer of score history pages (trusted database output)
+SCORE_LIST_ADAPTER = TrustedAdapter(Score, many=True)
+
 
 # Dependency to get database
 async def get_db():
@@ -26,7 +48,10 @@ async def submit_score(
     """
     try:
         # Calculate score based on difficulty, time, and moves
-        from utils.scoring import calculate_game_score
+        from utils.scoring import calculate_game_score, achievement_evaluator
+        from achievements import record_achievements
+        from distributions import record_distributions
+        from rank_index import rank_index
         
         calculated_score = calculate_game_score(
             score_data.difficulty,
@@ -44,19 +69,29 @@ async def submit_score(
             score=calculated_score
         )
         
-        # Save to MongoDB
-        score_dict = score.model_dump()
-        score_dict["completed_at"] = score_dict["completed_at"].isoformat()
+        score_dict = to_document(score)
         
-        await db.scores.insert_one(score_dict)
+        if score_buffer.enabled:
+            # Write-behind: journaled now, written to MongoDB in the next batch
+            await score_buffer.add(score_dict)
+        else:
+            # Save to MongoDB
+            await db.scores.insert_one(score_dict)
+            
+            # Update puzzle and player stats
+            await apply_score_aggregates(db, [score_dict])
+            await record_distributions(db, [score_dict])
+            await record_rollups(db, [score_dict])
+            
+            # Merge the achievements earned by this score into the user's bitset
+            await record_achievements(
+                db,
+                score.user_id,
+                achievement_evaluator.evaluate(score.difficulty, score.completion_time, score.moves, score.score)
+            )
         
-        # Update puzzle stats
-        await db.puzzles.update_one(
-            {"id": score_data.puzzle_id},
-            {
-                "$inc": {"metadata.total_completions": 1}
-            }
-        )
+        leaderboard_engine.add(score_dict)
+        rank_index.add(score_dict)
         
         return score
     
@@ -66,6 +101,7 @@ async def submit_score(
 
 @router.get("/leaderboard", response_model=List[dict])
 async def get_leaderboard(
+    request: Request,
     puzzle_id: Optional[str] = None,
     difficulty: Optional[str] = None,
     timeframe: Optional[str] = "all-time",  # daily, weekly, monthly, all-time
@@ -75,51 +111,29 @@ async def get_leaderboard(
     """
     Get leaderboard with optional filters.
     """
-    query = {}
-    
-    # Filter by puzzle
-    if puzzle_id:
-        query["puzzle_id"] = puzzle_id
-    
-    # Filter by difficulty
-    if difficulty:
-        query["difficulty"] = difficulty
-    
-    # Filter by timeframe
-    if timeframe != "all-time":
-        now = datetime.utcnow()
-        if timeframe == "daily":
-            query["completed_at"] = {"$gte": (now - timedelta(days=1)).isoformat()}
-        elif timeframe == "weekly":
-            query["completed_at"] = {"$gte": (now - timedelta(weeks=1)).isoformat()}
-        elif timeframe == "monthly":
-            query["completed_at"] = {"$gte": (now - timedelta(days=30)).isoformat()}
+    if timeframe == "all-time":
+        # Served from the in-memory top-K boards
+        scores = await leaderboard_engine.get_top(db, puzzle_id, difficulty, limit)
+    elif timeframe in TIMEFRAME_PERIODS:
+        # Current day / week / month, from its pre-aggregated rollup
+        scores = await get_rollup_top(db, timeframe, puzzle_id, difficulty, limit)
+    else:
+        query = timeframe_query(puzzle_id, difficulty, timeframe)
+        
+        # Get scores sorted by score (highest first)
+        scores = await db.scores.find(query, SCORE_PROJECTION).sort("score", -1).limit(limit).to_list(limit)
     
-    # Get scores sorted by score (highest first)
-    scores = await db.scores.find(query, {"_id": 0}).sort("score", -1).limit(limit).to_list(limit)
+    # Resolve users and puzzles for the whole page in one query each
+    lookup = await enrich_scores(db, scores)
     
     # Add rank and user info
     leaderboard = []
     for idx, score in enumerate(scores):
-        # Convert ISO string back to datetime if needed
-        if isinstance(score.get("completed_at"), str):
-            score["completed_at"] = datetime.fromisoformat(score["completed_at"])
-        
-        # Get user info (if not guest)
-        user_info = {"username": "Guest", "avatar": None}
-        if score["user_id"] != "guest":
-            user = await db.users.find_one({"id": score["user_id"]}, {"_id": 0, "username": 1, "avatar": 1})
-            if user:
-                user_info = user
-        
-        # Get puzzle info
-        puzzle = await db.puzzles.find_one({"id": score["puzzle_id"]}, {"_id": 0, "title": 1, "thumbnail_url": 1})
-        
         leaderboard.append({
             "rank": idx + 1,
             "score_id": score["id"],
-            "user": user_info,
-            "puzzle": puzzle or {"title": "Unknown"},
+            "user": lookup.user_for(score["user_id"]),
+            "puzzle": lookup.puzzle_for(score["puzzle_id"]),
             "score": score["score"],
             "completion_time": score["completion_time"],
             "moves": score["moves"],
@@ -127,31 +141,138 @@ async def get_leaderboard(
             "completed_at": score["completed_at"].isoformat() if isinstance(score["completed_at"], datetime) else score["completed_at"]
         })
     
-    return leaderboard
+    return encoded_response(request, leaderboard)
+
+
+@router.get("/rank")
+async def get_rank(
+    score_id: Optional[str] = None,
+    score: Optional[int] = None,
+    puzzle_id: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    timeframe: Optional[str] = "all-time",  # daily, weekly, monthly, all-time
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Exact leaderboard rank of a stored score (`score_id`) or of a score value,
+    within the optional puzzle, difficulty and timeframe filters.
+    Rank is 1 + the number of higher scores, so equal scores share a rank.
+    """
+    from rank_index import rank_index
+    
+    if score_id:
+        if score_buffer.enabled:
+            await score_buffer.flush()
+        
+        stored = await db.scores.find_one({"id": score_id}, {"_id": 0, "score": 1})
+        if not stored:
+            raise HTTPException(status_code=404, detail="Score not found")
+        score = stored["score"]
+    
+    if score is None:
+        raise HTTPException(status_code=400, detail="score_id or score is required")
+    
+    if timeframe == "all-time":
+        # Order statistics kept in memory
+        rank, total = await rank_index.rank(db, score, puzzle_id, difficulty)
+    else:
+        # Calendar buckets (UTC day, ISO week, month): counted with the score indexes
+        query = timeframe_query(puzzle_id, difficulty, timeframe)
+        rank = await db.scores.count_documents({**query, "score": {"$gt": score}}) + 1
+        total = await db.scores.count_documents(query)
+    
+    return {
+        "score": score,
+        "rank": rank,
+        "total": total,
+        "puzzle_id": puzzle_id,
+        "difficulty": difficulty,
+        "timeframe": timeframe
+    }
+
+
+@router.get("/percentile")
+async def get_percentile(
+    difficulty: Optional[str] = None,
+    puzzle_id: Optional[str] = None,
+    score_id: Optional[str] = None,
+    completion_time: Optional[int] = None,
+    moves: Optional[int] = None,
+    score: Optional[int] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Compare a result with every result of a puzzle and difficulty
+    ("you beat X% of players"), with the distribution histograms.
+    Pass either `score_id` or the values to compare. Without puzzle_id,
+    compares with every puzzle at this difficulty.
+    """
+    from distributions import load_distribution
+    
+    values = {"completion_time": completion_time, "moves": moves, "score": score}
+    
+    if score_id:
+        if score_buffer.enabled:
+            await score_buffer.flush()
+        
+        stored = await db.scores.find_one({"id": score_id}, SCORE_PROJECTION)
+        if not stored:
+            raise HTTPException(status_code=404, detail="Score not found")
+        
+        puzzle_id = stored["puzzle_id"]
+        difficulty = stored["difficulty"]
+        values = {metric: stored[metric] for metric in values}
+    
+    if not difficulty:
+        raise HTTPException(status_code=400, detail="difficulty or score_id is required")
+    
+    distribution = await load_distribution(db, difficulty, puzzle_id)
+    
+    return {
+        "puzzle_id": puzzle_id,
+        "difficulty": difficulty,
+        "count": distribution.count,
+        "metrics": distribution.standing(values)
+    }
 
 
 @router.get("/user/{user_id}", response_model=List[Score])
 async def get_user_scores(
     user_id: str,
+    request: Request,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     """
-    Get all scores for a specific user.
+    Get all scores for a specific user, most recent first.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
     """
-    scores = await db.scores.find({"user_id": user_id}, {"_id": 0}).sort("completed_at", -1).limit(limit).to_list(limit)
+    scores, next_cursor = await fetch_page(
+        db.scores, {"user_id": user_id}, {"_id": 0}, SCORE_HISTORY_SORT, limit, cursor=cursor
+    )
     
-    # Convert ISO strings back to datetime
-    for score in scores:
-        if isinstance(score.get("completed_at"), str):
-            score["completed_at"] = datetime.fromisoformat(score["completed_at"])
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return encoded_response(request, SCORE_LIST_ADAPTER.prepare(scores), headers=headers)
+
+
+@router.get("/user/{user_id}/achievements")
+async def get_achievements(
+    user_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Get the achievements earned by a user and their total points.
+    """
+    from achievements import get_user_achievements
     
-    return scores
+    return await get_user_achievements(db, user_id)
 
 
 @router.get("/puzzle/{puzzle_id}", response_model=List[dict])
 async def get_puzzle_leaderboard(
     puzzle_id: str,
+    request: Request,
     difficulty: Optional[str] = None,
     limit: int = 10,
     db: AsyncIOMotorDatabase = Depends(get_db)
@@ -159,32 +280,23 @@ async def get_puzzle_leaderboard(
     """
     Get top scores for a specific puzzle.
     """
-    query = {"puzzle_id": puzzle_id}
-    
-    if difficulty:
-        query["difficulty"] = difficulty
+    scores = await leaderboard_engine.get_top(db, puzzle_id, difficulty, limit)
     
-    scores = await db.scores.find(query, {"_id": 0}).sort("score", -1).limit(limit).to_list(limit)
+    # Resolve users for the whole page in one query
+    lookup = await enrich_scores(db, scores, include_puzzles=False)
     
     leaderboard = []
     for idx, score in enumerate(scores):
-        # Get user info
-        user_info = {"username": "Guest", "avatar": None}
-        if score["user_id"] != "guest":
-            user = await db.users.find_one({"id": score["user_id"]}, {"_id": 0, "username": 1, "avatar": 1})
-            if user:
-                user_info = user
-        
         leaderboard.append({
             "rank": idx + 1,
-            "user": user_info,
+            "user": lookup.user_for(score["user_id"]),
             "score": score["score"],
             "completion_time": score["completion_time"],
             "moves": score["moves"],
             "difficulty": score["difficulty"]
         })
     
-    return leaderboard
+    return encoded_response(request, leaderboard)
 
 
 # Admin routes for score management
@@ -196,11 +308,21 @@ async def delete_score(
     """
     Admin: Delete a score (for fraudulent entries)
     """
-    result = await db.scores.delete_one({"id": score_id})
+    from rank_index import rank_index
+    
+    if score_buffer.enabled:
+        # The score may still be waiting in the write-behind buffer
+        await score_buffer.flush()
+    
+    deleted = await db.scores.find_one_and_delete({"id": score_id}, projection=SCORE_PROJECTION | {"is_validated": 1})
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Score not found")
     
+    leaderboard_engine.discard(score_id)
+    rank_index.discard(deleted)
+    await invalidate_rollups(db, score_id)
+    
     return {"success": True, "message": "Score deleted"}
 
 
@@ -213,12 +335,139 @@ async def flag_score(
     """
     Admin: Flag a score as suspicious
     """
-    result = await db.scores.update_one(
+    from rank_index import rank_index
+    
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    previous = await db.scores.find_one_and_update(
         {"id": score_id},
-        {"$set": {"is_validated": False, "flag_reason": reason}}
+        {"$set": {"is_validated": False, "flag_reason": reason}},
+        projection=SCORE_PROJECTION | {"is_validated": 1},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.modified_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Score not found")
     
+    # Flagged scores are hidden from leaderboards
+    leaderboard_engine.discard(score_id)
+    rank_index.discard(previous)
+    await invalidate_rollups(db, score_id)
+    
     return {"success": True, "message": "Score flagged"}
+
+
+@router.get("/admin/leaderboards/consistency")
+async def check_leaderboards(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Compare the in-memory leaderboards with the database
+    """
+    return await leaderboard_engine.check_consistency(db)
+
+
+@router.post("/admin/leaderboards/rebuild")
+async def rebuild_leaderboards(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Reload every in-memory leaderboard from the database
+    (timeframe rollups are rebuilt on their next read)
+    """
+    from rank_index import rank_index
+    
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    boards = await leaderboard_engine.rebuild(db)
+    rank_index.clear()
+    await invalidate_all_rollups(db)
+    return {"success": True, "boards": boards}
+
+
+@router.post("/admin/rescore", status_code=202)
+async def start_rescore(
+    dry_run: bool = False,
+    chunk_size: Optional[int] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Recompute every stored score with the current scoring formula.
+    Runs in the background; poll GET /scores/admin/rescore for progress.
+    chunk_size defaults to RESCORE_CHUNK_SIZE.
+    """
+    from rescoring import rescore_job, RESCORE_CHUNK_SIZE
+    
+    if chunk_size is None:
+        chunk_size = RESCORE_CHUNK_SIZE
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive")
+    
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    if not rescore_job.start(db, chunk_size=chunk_size, dry_run=dry_run):
+        raise HTTPException(status_code=409, detail="Rescoring already running")
+    
+    return rescore_job.stats()
+
+
+@router.get("/admin/rescore")
+async def get_rescore_status():
+    """
+    Admin: Progress of the current or last rescoring run
+    """
+    from rescoring import rescore_job
+    
+    return rescore_job.stats()
+
+
+@router.post("/admin/achievements/backfill")
+async def backfill_user_achievements(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Merge the achievements of every stored score into the user bitsets
+    (after adding achievement rules, or for scores submitted before achievements
+    were tracked)
+    """
+    from achievements import backfill_achievements
+    
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    totals = await backfill_achievements(db)
+    return {"success": True, **totals}
+
+
+@router.post("/admin/aggregates/reconcile")
+async def reconcile_stats(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Recompute puzzle metadata and player stats from all stored scores
+    (corrects counters after flagged or deleted scores)
+    """
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    totals = await reconcile_aggregates(db)
+    return {"success": True, **totals}
+
+
+@router.post("/admin/distributions/rebuild")
+async def rebuild_score_distributions(
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """
+    Admin: Recompute every score distribution from the visible scores
+    """
+    from distributions import rebuild_distributions
+    
+    if score_buffer.enabled:
+        await score_buffer.flush()
+    
+    distributions = await rebuild_distributions(db)
+    return {"success": True, "distributions": distributions}
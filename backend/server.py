@@ -1,8 +1,11 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import importlib
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -10,13 +13,18 @@ from typing import List
 import uuid
 from datetime import datetime, timezone
 
+from persistence import to_document
+from metrics import MetricsMiddleware, metrics_response, mongo_command_timer
+from readiness import check_readiness, loop_lag, pool_stats
+
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection (Motor connects on first use; warm_up() does it at startup)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Every command is timed for /metrics; pool events feed /api/ready
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_command_timer, pool_stats])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -47,25 +55,25 @@ async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     
-    # Convert to dict and serialize datetime to ISO string for MongoDB
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    
-    _ = await db.status_checks.insert_one(doc)
+    # Timestamps are stored as native BSON dates
+    _ = await db.status_checks.insert_one(to_document(status_obj))
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
     # Exclude MongoDB's _id field from the query results
     status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    
-    # Convert ISO string timestamps back to datetime objects
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    
     return status_checks
 
+@api_router.get("/ready")
+async def readiness():
+    """
+    Readiness for load balancers: 503 while MongoDB, the connection pool,
+    the event loop or an executor is over its threshold
+    """
+    report = await check_readiness(db)
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
 
 # Import and include admin routes
 from admin_routes import router as admin_router
@@ -75,15 +83,27 @@ api_router.include_router(admin_router)
 from score_routes import router as score_router
 api_router.include_router(score_router)
 
+# Import and include locally sliced piece delivery
+from piece_routes import router as piece_router
+api_router.include_router(piece_router)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Prometheus metrics (outside /api, where scrapers expect them)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics_response()
+
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Configure logging
@@ -93,6 +113,97 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Run the startup warm-up in the background, so the instance serves requests
+# as soon as it has started (everything it loads is otherwise loaded on first use)
+BACKGROUND_WARMUP = os.environ.get("BACKGROUND_WARMUP", "").lower() in ("1", "true", "yes")
+# Modules kept out of the import of this module (see tests/test_import_time.py)
+PRELOAD_MODULES = ["distributions", "rank_index", "achievements", "rescoring", "piece_slicer", "cloudinary_service"]
+
+warm_up_task = None
+
+async def create_indexes():
+    # First round trip: opens the connection pool
+    from indexes import ensure_indexes
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"Index creation failed: {str(e)}")
+
+async def warm_up(indexes: bool = True):
+    """
+    Connect to MongoDB and load what the first requests would otherwise wait for
+    """
+    from leaderboard_engine import leaderboard_engine
+    from response_cache import response_cache
+    
+    if indexes:
+        await create_indexes()
+    
+    try:
+        await leaderboard_engine.warm(db)
+    except Exception as e:
+        # Boards are loaded lazily on first read if warm-up fails
+        logger.warning(f"Leaderboard warm-up failed: {str(e)}")
+    
+    try:
+        await response_cache.start(db)
+    except Exception as e:
+        logger.warning(f"Response cache version sync failed: {str(e)}")
+    
+    try:
+        for name in PRELOAD_MODULES:
+            await asyncio.to_thread(importlib.import_module, name)
+        from cloudinary_service import cloudinary_sdk
+        cloudinary_sdk()
+    except Exception as e:
+        # They are imported by the first request that needs them
+        logger.warning(f"Module preload failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_up():
+    global warm_up_task
+    from score_buffer import score_buffer
+    if score_buffer.enabled:
+        # Replays scores journaled but not written before the last shutdown.
+        # The replay relies on the unique score id index, and the leaderboards
+        # are loaded afterwards so that they include the replayed scores.
+        await create_indexes()
+        await score_buffer.start(db)
+    
+    if BACKGROUND_WARMUP:
+        warm_up_task = asyncio.create_task(warm_up(indexes=not score_buffer.enabled))
+    else:
+        await warm_up(indexes=not score_buffer.enabled)
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag.start()
+
+@app.on_event("shutdown")
+async def stop_warm_up():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_loop_lag_monitor():
+    loop_lag.stop()
+
+@app.on_event("shutdown")
+async def stop_response_cache():
+    from response_cache import response_cache
+    response_cache.stop()
+
+@app.on_event("shutdown")
+async def flush_score_buffer():
+    from score_buffer import score_buffer
+    if score_buffer.enabled:
+        await score_buffer.close()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+@app.on_event("shutdown")
+async def shutdown_executor_pools():
+    from executors import shutdown_executors
+    shutdown_executors()
@@ -1,5 +1,22 @@
 """Scoring utilities for puzzle game"""
 
+import operator
+
+import numpy as np
+
+# Difficulty multipliers
+DIFFICULTY_MULTIPLIERS = {
+    "beginner": 0.5,
+    "easy": 1.0,
+    "medium": 1.5,
+    "hard": 2.0,
+    "expert": 2.5,
+    "master": 3.0,
+}
+
+BASE_SCORE = 10000
+
+
 def calculate_game_score(difficulty: str, completion_time_ms: int, moves: int) -> int:
     """
     Calculate score based on difficulty, time, and moves.
@@ -14,18 +31,8 @@ def calculate_game_score(difficulty: str, completion_time_ms: int, moves: int) -
     Returns:
         Final score (minimum 0)
     """
-    # Difficulty multipliers
-    multipliers = {
-        "beginner": 0.5,
-        "easy": 1.0,
-        "medium": 1.5,
-        "hard": 2.0,
-        "expert": 2.5,
-        "master": 3.0,
-    }
-    
-    base_score = 10000
-    multiplier = multipliers.get(difficulty, 1.0)
+    base_score = BASE_SCORE
+    multiplier = DIFFICULTY_MULTIPLIERS.get(difficulty, 1.0)
     
     # Time penalty (2 points per second)
     time_seconds = completion_time_ms / 1000
@@ -40,44 +47,144 @@ def calculate_game_score(difficulty: str, completion_time_ms: int, moves: int) -
     return max(0, final_score)
 
 
-def get_achievement_for_score(difficulty: str, completion_time_ms: int, moves: int, score: int) -> list:
+def calculate_game_scores(difficulties, completion_times_ms, moves) -> np.ndarray:
     """
-    Check which achievements were earned for this score.
+    Vectorized calculate_game_score over arrays of equal length.
+    
+    Performs the same float64 operations and truncations as the scalar
+    function, so results are identical element by element.
     
     Returns:
-        List of achievement IDs earned
+        int64 array of final scores (minimum 0)
     """
-    achievements = []
+    difficulties = np.asarray(difficulties, dtype=object)
+    times = np.asarray(completion_times_ms, dtype=np.int64)
+    moves = np.asarray(moves, dtype=np.int64)
     
-    time_seconds = completion_time_ms / 1000
+    if difficulties.size == 0:
+        return np.zeros(0, dtype=np.int64)
     
-    # Speed achievements
-    if time_seconds < 30:
-        achievements.append("speed_demon")
-    elif time_seconds < 60:
-        achievements.append("quick_solver")
+    # Map each distinct difficulty once, then broadcast back
+    unique, inverse = np.unique(difficulties.astype(str), return_inverse=True)
+    multipliers = np.array([DIFFICULTY_MULTIPLIERS.get(d, 1.0) for d in unique])[inverse]
     
-    # Efficiency achievements
-    if difficulty == "easy" and moves <= 9:
-        achievements.append("perfect_easy")
-    elif difficulty == "medium" and moves <= 16:
-        achievements.append("perfect_medium")
-    elif difficulty == "hard" and moves <= 25:
-        achievements.append("perfect_hard")
+    time_penalty = np.trunc((times / 1000) * 2)
+    move_penalty = moves * 10
     
-    # Difficulty achievements
-    if difficulty == "expert":
-        achievements.append("expert_solver")
-    elif difficulty == "master":
-        achievements.append("master_solver")
+    final_scores = np.trunc((BASE_SCORE * multipliers) - time_penalty - move_penalty)
     
+    return np.maximum(0, final_scores).astype(np.int64)
+
+
+# Achievement rules: (achievement id, conditions). A score earns an
+# achievement when all of its (field, operator, value) conditions hold.
+# Fields: difficulty, time_seconds, moves, score.
+# The position of a rule is its bit in the stored per-user achievement
+# bitsets, so rules may only be appended, never reordered or removed.
+ACHIEVEMENT_RULES = [
+    # Speed achievements
+    ("speed_demon", [("time_seconds", "<", 30)]),
+    ("quick_solver", [("time_seconds", ">=", 30), ("time_seconds", "<", 60)]),
+    # Efficiency achievements
+    ("perfect_easy", [("difficulty", "==", "easy"), ("moves", "<=", 9)]),
+    ("perfect_medium", [("difficulty", "==", "medium"), ("moves", "<=", 16)]),
+    ("perfect_hard", [("difficulty", "==", "hard"), ("moves", "<=", 25)]),
+    # Difficulty achievements
+    ("expert_solver", [("difficulty", "==", "expert")]),
+    ("master_solver", [("difficulty", "==", "master")]),
     # Score achievements
-    if score >= 10000:
-        achievements.append("high_scorer")
-    if score >= 15000:
-        achievements.append("score_master")
+    ("high_scorer", [("score", ">=", 10000)]),
+    ("score_master", [("score", ">=", 15000)]),
+]
+
+RULE_FIELDS = ("difficulty", "time_seconds", "moves", "score")
+
+RULE_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+}
+
+
+class AchievementEvaluator:
+    """
+    Achievement rules compiled into bitmask evaluators.
+    
+    `evaluate` is a generated function testing every rule with plain
+    comparisons; `evaluate_batch` applies the same rules to whole arrays.
+    """
+    
+    def __init__(self, rules: list):
+        self.ids = [achievement_id for achievement_id, _ in rules]
+        self.bits = {achievement_id: 1 << i for i, achievement_id in enumerate(self.ids)}
+        self._rules = []
+        
+        lines = ["def evaluate(difficulty, time_seconds, moves, score):", "    mask = 0"]
+        for i, (achievement_id, conditions) in enumerate(rules):
+            for field, op, value in conditions:
+                if field not in RULE_FIELDS or op not in RULE_OPERATORS:
+                    raise ValueError(f"Invalid condition in achievement rule '{achievement_id}'")
+            self._rules.append((1 << i, [(field, RULE_OPERATORS[op], value) for field, op, value in conditions]))
+            test = " and ".join(f"{field} {op} {value!r}" for field, op, value in conditions)
+            lines.append(f"    if {test}:")
+            lines.append(f"        mask |= {1 << i}")
+        lines.append("    return mask")
+        
+        namespace = {}
+        exec(compile("\n".join(lines), "<achievement rules>", "exec"), namespace)
+        self._evaluate = namespace["evaluate"]
+    
+    def evaluate(self, difficulty: str, completion_time_ms: int, moves: int, score: int) -> int:
+        """
+        Bitmask of the achievements earned by one score
+        """
+        return self._evaluate(difficulty, completion_time_ms / 1000, moves, score)
+    
+    def evaluate_batch(self, difficulties, completion_times_ms, moves, scores) -> np.ndarray:
+        """
+        Bitmasks of the achievements earned by arrays of scores.
+        
+        Returns:
+            uint64 array of bitmasks
+        """
+        columns = {
+            "difficulty": np.asarray(difficulties, dtype=str),
+            "time_seconds": np.asarray(completion_times_ms, dtype=np.int64) / 1000,
+            "moves": np.asarray(moves, dtype=np.int64),
+            "score": np.asarray(scores, dtype=np.int64),
+        }
+        
+        masks = np.zeros(len(columns["moves"]), dtype=np.uint64)
+        for bit, conditions in self._rules:
+            earned = np.ones(len(masks), dtype=bool)
+            for field, compare, value in conditions:
+                earned &= compare(columns[field], value)
+            masks[earned] |= np.uint64(bit)
+        
+        return masks
     
-    return achievements
+    def ids_for(self, mask: int) -> list:
+        """
+        Achievement IDs set in a bitmask, in rule order
+        """
+        return [achievement_id for i, achievement_id in enumerate(self.ids) if mask >> i & 1]
+
+
+achievement_evaluator = AchievementEvaluator(ACHIEVEMENT_RULES)
+
+
+def get_achievement_for_score(difficulty: str, completion_time_ms: int, moves: int, score: int) -> list:
+    """
+    Check which achievements were earned for this score.
+    
+    Returns:
+        List of achievement IDs earned
+    """
+    return achievement_evaluator.ids_for(
+        achievement_evaluator.evaluate(difficulty, completion_time_ms, moves, score)
+    )
 
 
 # Achievement definitions
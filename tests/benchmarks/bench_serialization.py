@@ -0,0 +1,119 @@
+"""
+CPU cost of serializing a 50-puzzle page, per path:
+
+- response_model: what FastAPI does for `response_model=List[Puzzle]`
+  (validation into models, jsonable_encoder, json.dumps)
+- TypeAdapter: validation and serialization in pydantic-core
+- trusted: TrustedAdapter + orjson, used by the read endpoints
+
+Run from the repository root:
+
+    python -m tests.benchmarks.bench_serialization [--pieces] [--repeat N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from encoders import TrustedAdapter, encode_json  # noqa: E402
+from models import Puzzle  # noqa: E402
+
+PAGE_SIZE = 50
+GRID_PIECES = {"easy": 9, "medium": 36, "hard": 64, "expert": 100}
+
+
+def make_page(include_pieces: bool = False) -> List[dict]:
+    """
+    Puzzle documents as MongoDB returns them (projection {"_id": 0})
+    """
+    created = datetime(2024, 1, 1)
+    page = []
+    for i in range(PAGE_SIZE):
+        public_id = f"mavi-puzzles/puzzle_{i}"
+        doc = {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "title": f"Puzzle {i}",
+            "description": "A puzzle from the benchmark catalog",
+            "category": ["Nature", "Cities", "Art"][i % 3],
+            "tags": ["benchmark", f"tag{i % 7}"],
+            "original_image": {
+                "cloudinary_public_id": public_id,
+                "url": f"https://res.cloudinary.com/demo/image/upload/{public_id}.jpg",
+                "width": 1920,
+                "height": 1280,
+                "format": "jpg"
+            },
+            "thumbnail_url": f"https://res.cloudinary.com/demo/image/upload/c_fill,w_300/{public_id}.jpg",
+            "atlas_url": f"https://res.cloudinary.com/demo/image/upload/c_fill,w_1260/{public_id}.jpg",
+            "difficulty_available": ["easy", "medium", "hard", "expert"],
+            "metadata": {"total_plays": 10 * i, "total_completions": 5 * i, "total_completion_time": 600000 * i},
+            "status": "published",
+            "is_featured": i % 10 == 0,
+            "display_order": i,
+            "created_at": created + timedelta(minutes=i),
+            "updated_at": created + timedelta(minutes=i, seconds=30),
+            "created_by": "admin"
+        }
+        if include_pieces:
+            doc["piece_data"] = {
+                difficulty: [f"https://res.cloudinary.com/demo/image/upload/c_crop,x_{n}/{public_id}" for n in range(count)]
+                for difficulty, count in GRID_PIECES.items()
+            }
+        page.append(doc)
+    return page
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Serialization benchmark (50-puzzle pages)")
+    parser.add_argument("--pieces", action="store_true", help="Include piece_data in every puzzle")
+    parser.add_argument("--repeat", type=int, default=200, help="Pages serialized per measurement")
+    options = parser.parse_args(args)
+
+    page = make_page(options.pieces)
+    response_field = create_response_field(name="Response_get_all_puzzles", type_=List[Puzzle])
+    validated = TypeAdapter(List[Puzzle])
+    trusted = TrustedAdapter(Puzzle, many=True)
+    loop = asyncio.new_event_loop()
+
+    async def response_model_body():
+        content = await serialize_response(field=response_field, response_content=page, is_coroutine=True)
+        return JSONResponse(content).body
+
+    paths = {
+        "response_model": lambda: loop.run_until_complete(response_model_body()),
+        "TypeAdapter": lambda: validated.dump_json(validated.validate_python(page)),
+        "trusted (TrustedAdapter + orjson)": lambda: encode_json(trusted.prepare(page)),
+    }
+
+    bodies = [json.loads(run()) for run in paths.values()]
+    assert all(body == bodies[0] for body in bodies), "Paths produce different bodies"
+
+    print(f"{PAGE_SIZE}-puzzle page, piece_data: {options.pieces}, body: {len(paths['TypeAdapter']())} bytes")
+    timings = {}
+    for name, run in paths.items():
+        # CPU time, best of 5 to reduce noise
+        per_page = min(timeit.repeat(run, timer=time.process_time, number=options.repeat, repeat=5)) / options.repeat
+        timings[name] = per_page
+        print(f"  {name:<36} {per_page * 1e6:9.1f} us/page")
+
+    fast = timings["trusted (TrustedAdapter + orjson)"]
+    for name in ("response_model", "TypeAdapter"):
+        saved = timings[name] - fast
+        print(f"  CPU saved per request vs {name}: {saved * 1e6:.1f} us ({timings[name] / fast:.1f}x)")
+    loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Micro-benchmarks of the backend hot paths, run with pytest. They are
+opt-in (see tests/conftest.py, which declares the options):
+
+    python -m pytest tests --benchmark -q                      # measure and report
+    python -m pytest tests --benchmark -q --bench-compare      # fail on regressions
+    python -m pytest tests --benchmark -q --bench-save         # update the baseline
+
+The `benchmark` fixture follows pytest-benchmark's calling convention
+(`benchmark(fn, *args, **kwargs)` returns fn's result): the function is
+calibrated to rounds of at least MIN_ROUND_TIME, run for --bench-max-time
+seconds, and the best round's time per call (the least disturbed by
+other load) is kept.
+
+Absolute timings depend on the machine and its load, so each result is
+divided by the time of a fixed pure-Python workload measured in the same
+run (`reference_workload`, timed right before and after each benchmark so
+that both see the same machine state), and these ratios are what
+baseline.json stores and --bench-compare checks.
+"""
+
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+MIN_ROUND_TIME = 0.005  # seconds
+MIN_ROUNDS = 3
+REFERENCE_MAX_TIME = 0.05  # seconds, per benchmark
+
+RESULTS: Dict[str, Dict] = {}
+REFERENCE: Dict = {}
+
+
+def reference_workload() -> int:
+    """
+    Fixed interpreter-bound work: the unit the benchmarks are expressed in
+    """
+    counts: Dict[int, int] = {}
+    for i in range(2000):
+        key = i * 7919 % 97
+        counts[key] = counts.get(key, 0) + 1
+    return len(sorted(str(value) for value in counts.values()))
+
+
+class Benchmark:
+    """
+    Times a function like pytest-benchmark's fixture
+    """
+
+    def __init__(self, name: str, max_time: float):
+        self.name = name
+        self.max_time = max_time
+        self.stats: Dict = {}
+
+    def _round(self, fn: Callable, args, kwargs, iterations: int) -> float:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(*args, **kwargs)
+        return time.perf_counter() - start
+
+    def measure(self, fn: Callable, *args, **kwargs) -> Dict:
+        """
+        Timings of fn, already called once (warm-up)
+        """
+
+        iterations = 1
+        while self._round(fn, args, kwargs, iterations) < MIN_ROUND_TIME:
+            iterations *= 10
+
+        per_call: List[float] = []
+        deadline = time.perf_counter() + self.max_time
+        while len(per_call) < MIN_ROUNDS or time.perf_counter() < deadline:
+            per_call.append(self._round(fn, args, kwargs, iterations) / iterations)
+
+        return {
+            "median": statistics.median(per_call),
+            "min": min(per_call),
+            "mean": statistics.fmean(per_call),
+            "rounds": len(per_call),
+            "iterations": iterations
+        }
+
+    def __call__(self, fn: Callable, *args, **kwargs):
+        result = fn(*args, **kwargs)  # warm-up, and the value returned to the test
+        reference = Benchmark("reference", REFERENCE_MAX_TIME)
+        reference_workload()
+        before = reference.measure(reference_workload)["min"]
+        self.stats = self.measure(fn, *args, **kwargs)
+        after = reference.measure(reference_workload)["min"]
+
+        self.stats["reference"] = min(before, after)
+        self.stats["ratio"] = self.stats["min"] / self.stats["reference"]
+        RESULTS[self.name] = self.stats
+        REFERENCE["min"] = min(REFERENCE.get("min", self.stats["reference"]), self.stats["reference"])
+        return result
+
+
+@pytest.fixture
+def benchmark(request):
+    return Benchmark(request.node.name, request.config.getoption("--bench-max-time"))
+
+
+def _load_baseline() -> Dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not RESULTS:
+        return
+    config = session.config
+    baseline = _load_baseline()
+    tolerance = config.getoption("--bench-tolerance")
+
+    rows, regressions = [], []
+    for name, stats in sorted(RESULTS.items()):
+        previous = baseline.get(name, {}).get("ratio")
+        change = (stats["ratio"] - previous) / previous if previous else None
+        if change is not None and change > tolerance:
+            regressions.append(name)
+        rows.append((name, stats, change))
+    config._bench_report = (rows, regressions)
+
+    if config.getoption("--bench-compare") and regressions:
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+    if config.getoption("--bench-save"):
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({
+                "machine": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "processor": platform.machine(),
+                    "cpu_count": os.cpu_count()
+                },
+                "reference": REFERENCE,
+                "benchmarks": {name: RESULTS[name] for name in sorted(RESULTS)}
+            }, f, indent=2)
+            f.write("\n")
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    report = getattr(config, "_bench_report", None)
+    if report is None:
+        return
+    rows, regressions = report
+
+    terminalreporter.section("benchmarks (best round, per call; x reference workload)")
+    terminalreporter.write_line(f"{'reference_workload':<50} {_format_time(REFERENCE['min']):>12}")
+    for name, stats, change in rows:
+        delta = "   (no baseline)" if change is None else f"{change * 100:+8.1f}% vs baseline"
+        marker = "  REGRESSION" if name in regressions else ""
+        terminalreporter.write_line(
+            f"{name:<50} {_format_time(stats['min']):>12} {stats['ratio']:>12.4g}x {delta}{marker}"
+        )
+    if config.getoption("--bench-save"):
+        terminalreporter.write_line(f"baseline saved to {BASELINE_PATH}")
@@ -0,0 +1,113 @@
+"""
+Cloudinary URL building and upload image processing.
+
+Piece URLs are memoized per (public_id, difficulty); the cold benchmarks
+clear the cache first, which is what every new upload pays (139 URLs over
+the six difficulties).
+"""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from cloudinary_service import (
+    GRID_CONFIG,
+    _cached_piece_urls,
+    compress_image,
+    configure_cloudinary,
+    generate_all_difficulty_pieces,
+    generate_atlas_url,
+    generate_puzzle_pieces,
+    generate_thumbnail_url,
+    inspect_image
+)
+
+PUBLIC_ID = "mavi-puzzles/benchmark_image"
+
+# Generated images: (name, format, size, mode)
+CORPUS = [
+    ("photo_jpeg_4800x3200", "JPEG", (4800, 3200), "RGB"),
+    ("photo_jpeg_3000x2000", "JPEG", (3000, 2000), "RGB"),
+    ("scan_png_rgba_4200x2800", "PNG", (4200, 2800), "RGBA"),
+    ("drawing_gif_2000x1500", "GIF", (2000, 1500), "P"),
+]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def cloudinary_config():
+    os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "demo")
+    configure_cloudinary()
+
+
+def _make_image(fmt: str, size, mode: str) -> io.BytesIO:
+    # Smooth gradients plus noise: photo-like, so encoders do real work
+    width, height = size
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    rgb = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == "RGBA":
+        image = rgb.convert("RGBA")
+        image.putalpha(gradient)
+    elif mode == "P":
+        image = rgb.convert("P", palette=Image.Palette.ADAPTIVE)
+    else:
+        image = rgb
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **({"quality": 95} if fmt == "JPEG" else {}))
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return {name: _make_image(fmt, size, mode) for name, fmt, size, mode in CORPUS}
+
+
+def test_generate_thumbnail_url(benchmark):
+    assert benchmark(generate_thumbnail_url, PUBLIC_ID).startswith("https://")
+
+
+def test_generate_atlas_url(benchmark):
+    assert benchmark(generate_atlas_url, PUBLIC_ID).startswith("https://")
+
+
+def test_generate_puzzle_pieces_cold(benchmark):
+    def cold():
+        _cached_piece_urls.cache_clear()
+        return generate_puzzle_pieces(PUBLIC_ID, 1920, 1280, "master")
+
+    assert len(benchmark(cold)) == GRID_CONFIG["master"]["rows"] * GRID_CONFIG["master"]["cols"]
+
+
+def test_generate_puzzle_pieces_cached(benchmark):
+    assert len(benchmark(generate_puzzle_pieces, PUBLIC_ID, 1920, 1280, "master")) > 0
+
+
+def test_generate_all_difficulty_pieces_cold(benchmark):
+    def cold():
+        _cached_piece_urls.cache_clear()
+        return generate_all_difficulty_pieces(PUBLIC_ID, 1920, 1280)
+
+    pieces = benchmark(cold)
+    assert sum(len(urls) for urls in pieces.values()) == sum(c["rows"] * c["cols"] for c in GRID_CONFIG.values())
+
+
+@pytest.mark.parametrize("name", [entry[0] for entry in CORPUS])
+def test_inspect_image(benchmark, corpus, name):
+    assert benchmark(inspect_image, corpus[name])["width"] > 0
+
+
+@pytest.mark.parametrize("name", [entry[0] for entry in CORPUS])
+def test_compress_image(benchmark, corpus, name):
+    source = corpus[name]
+
+    def compress():
+        source.seek(0)
+        output = compress_image(source)
+        size = output.seek(0, io.SEEK_END)
+        output.close()
+        return size
+
+    assert benchmark(compress) > 0
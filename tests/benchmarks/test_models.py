@@ -0,0 +1,63 @@
+"""
+Serialization of Puzzle and Score: the validated Pydantic paths and the
+trusted path used by the read endpoints (see encoders).
+"""
+
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from encoders import TrustedAdapter, encode_json
+from models import Puzzle, Score
+from persistence import to_document
+from tests.benchmarks.bench_serialization import make_page
+
+SCORE_PAGE = 100
+
+
+@pytest.fixture(scope="module")
+def puzzle_page():
+    return make_page()
+
+
+@pytest.fixture(scope="module")
+def score_page():
+    return [
+        to_document(Score(user_id=f"user{i}", puzzle_id="puzzle", completion_time=60_000 + i, moves=40, difficulty="medium", score=1500))
+        for i in range(SCORE_PAGE)
+    ]
+
+
+def test_puzzle_model_validate(benchmark, puzzle_page):
+    benchmark(Puzzle.model_validate, puzzle_page[0])
+
+
+def test_puzzle_model_dump_json(benchmark, puzzle_page):
+    puzzle = Puzzle.model_validate(puzzle_page[0])
+    benchmark(puzzle.model_dump_json)
+
+
+def test_puzzle_to_document(benchmark, puzzle_page):
+    puzzle = Puzzle.model_validate(puzzle_page[0])
+    benchmark(to_document, puzzle)
+
+
+def test_puzzle_page_type_adapter(benchmark, puzzle_page):
+    adapter = TypeAdapter(List[Puzzle])
+    benchmark(lambda: adapter.dump_json(adapter.validate_python(puzzle_page)))
+
+
+def test_puzzle_page_trusted(benchmark, puzzle_page):
+    adapter = TrustedAdapter(Puzzle, many=True)
+    benchmark(lambda: encode_json(adapter.prepare(puzzle_page)))
+
+
+def test_score_page_type_adapter(benchmark, score_page):
+    adapter = TypeAdapter(List[Score])
+    benchmark(lambda: adapter.dump_json(adapter.validate_python(score_page)))
+
+
+def test_score_page_trusted(benchmark, score_page):
+    adapter = TrustedAdapter(Score, many=True)
+    benchmark(lambda: encode_json(adapter.prepare(score_page)))
@@ -0,0 +1,41 @@
+"""
+Scoring and achievement evaluation, per score and for a 10k-score batch
+(rescoring and backfills).
+"""
+
+import numpy as np
+import pytest
+
+from utils.scoring import achievement_evaluator, calculate_game_score, calculate_game_scores, get_achievement_for_score
+
+BATCH_SIZE = 10000
+
+
+@pytest.fixture(scope="module")
+def batch():
+    rng = np.random.default_rng(0)
+    difficulties = rng.choice(np.array(["easy", "medium", "hard", "expert"], dtype=object), BATCH_SIZE)
+    times = rng.integers(20_000, 2_000_000, BATCH_SIZE)
+    moves = rng.integers(10, 400, BATCH_SIZE)
+    return difficulties, times, moves, calculate_game_scores(difficulties, times, moves)
+
+
+def test_calculate_game_score(benchmark):
+    assert benchmark(calculate_game_score, "hard", 245_000, 87) > 0
+
+
+def test_calculate_game_scores_batch(benchmark, batch):
+    difficulties, times, moves, _ = batch
+    assert len(benchmark(calculate_game_scores, difficulties, times, moves)) == BATCH_SIZE
+
+
+def test_achievement_evaluate(benchmark):
+    benchmark(achievement_evaluator.evaluate, "expert", 95_000, 60, 2400)
+
+
+def test_achievement_evaluate_batch(benchmark, batch):
+    assert len(benchmark(achievement_evaluator.evaluate_batch, *batch)) == BATCH_SIZE
+
+
+def test_get_achievement_for_score(benchmark):
+    assert isinstance(benchmark(get_achievement_for_score, "easy", 30_000, 12, 900), list)
@@ -0,0 +1,55 @@
+"""
+Shared fixtures of the backend tests.
+
+Tests run against mongomock-motor (an in-memory MongoDB with Motor's API),
+so no server is needed:
+
+    python -m pytest tests -q
+
+Coroutine tests are marked `pytest.mark.anyio` and run on asyncio.
+
+The micro-benchmarks (tests/benchmarks) are slow and only collected with
+`--benchmark` (or when tests/benchmarks is given explicitly); their
+options are declared here so they are known whatever the paths given.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "puzzle_test")
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(__file__), "benchmarks")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench", "micro-benchmarks")
+    group.addoption("--benchmark", action="store_true", help="Run the micro-benchmarks (tests/benchmarks)")
+    group.addoption("--bench-compare", action="store_true", help="Fail when a benchmark regresses against the baseline")
+    group.addoption("--bench-save", action="store_true", help="Store the results as the new baseline")
+    group.addoption("--bench-tolerance", type=float, default=0.5, help="Allowed slowdown (0.5: 50%%)")
+    group.addoption("--bench-max-time", type=float, default=0.3, help="Seconds spent measuring each benchmark")
+
+
+def pytest_ignore_collect(collection_path, config):
+    if str(collection_path) == BENCHMARKS_DIR and not config.getoption("--benchmark"):
+        return True
+    return None
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    from mongomock_motor import AsyncMongoMockClient
+
+    return AsyncMongoMockClient()["puzzle_test"]
@@ -0,0 +1,19 @@
+"""
+Load tests for the score and leaderboard APIs.
+
+    python -m tests.load.seed --scores 200000          # seed a local mongod
+    python -m tests.load.runner --scenario school_burst --output before.json
+    python -m tests.load.compare before.json after.json
+
+See the module docstrings for the options.
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "backend"))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MONGO_URL = "mongodb://localhost:27017"
+DEFAULT_DB_NAME = "puzzle_loadtest"
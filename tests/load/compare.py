@@ -0,0 +1,80 @@
+"""
+Compare two load-test reports (baseline first).
+
+    python -m tests.load.compare before.json after.json [--threshold 10]
+
+Prints the change of throughput and latency percentiles per operation and
+exits with status 1 when an operation got slower (p95) or slower to serve
+(throughput) by more than --threshold percent.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+# Higher is better for throughput, lower for latencies
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> List[str]:
+    """
+    Print the comparison
+
+    Returns:
+        Regressions over the threshold
+    """
+    for key in ("scenario", "mode", "users", "volumes"):
+        if before["meta"].get(key) != after["meta"].get(key):
+            print(f"warning: {key} differs ({before['meta'].get(key)} vs {after['meta'].get(key)})")
+
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    print(f"{'operation':<22}" + "".join(f"{metric:>30}" for metric in METRICS))
+
+    regressions = []
+    operations = {**before["operations"], "total": before["totals"]}
+    for name, old in operations.items():
+        new = after["totals"] if name == "total" else after["operations"].get(name)
+        if new is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            change = _change(old.get(metric), new.get(metric))
+            cell = f"{old.get(metric, '-')} -> {new.get(metric, '-')}"
+            if change is not None:
+                cell += f" ({change:+.1f}%)"
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                if metric in ("throughput_rps", "p95_ms") and worse > threshold:
+                    regressions.append(f"{name} {metric} {change:+.1f}%")
+            cells.append(f"{cell:>30}")
+        print(f"{name:<22}" + "".join(cells))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare two load-test reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="Allowed regression in percent")
+    options = parser.parse_args(args)
+
+    with open(options.before) as f:
+        before = json.load(f)
+    with open(options.after) as f:
+        after = json.load(f)
+
+    regressions = compare(before, after, options.threshold)
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
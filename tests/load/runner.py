@@ -0,0 +1,270 @@
+"""
+Drive a workload against the API and write a JSON report.
+
+    python -m tests.load.runner --scenario school_burst [--users 50]
+        [--duration 30] [--warmup 5] [--mode inprocess|uvicorn|url]
+        [--url http://127.0.0.1:8001] [--workers 1] [--reseed]
+        [--output report.json]
+
+Modes:
+    inprocess  server:app through httpx's ASGI transport, in this process
+               (measures the application without the HTTP server)
+    uvicorn    starts `uvicorn server:app` against the load-test database
+    url        an already running server at --url
+
+Submissions change the database, so pass --reseed (or run tests.load.seed)
+before each run whose report is to be compared with another. Requests made
+during the warm-up are not recorded.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from tests.load import BACKEND_DIR, DEFAULT_DB_NAME, DEFAULT_MONGO_URL
+from tests.load.seed import load_manifest, seed
+from tests.load.workloads import SCENARIOS, WorkloadState
+
+# Server settings recorded in the report (they change the numbers)
+CONFIG_PREFIXES = ("SCORE_", "LEADERBOARD_", "RESPONSE_CACHE_", "ROLLUP_", "RANK_INDEX_", "IO_EXECUTOR_", "IMAGE_EXECUTOR_")
+
+
+class Recorder:
+    """
+    Latencies and outcomes per operation
+    """
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.recording = False
+
+    def record(self, name: str, seconds: float, status: Optional[int]):
+        if not self.recording:
+            return
+        self.latencies[name].append(seconds)
+        self.statuses[name][str(status) if status else "exception"] += 1
+        if status is None or status >= 500:
+            self.errors[name] += 1
+
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict:
+    values = np.array(latencies, dtype=np.float64) * 1000
+    if not len(values):
+        return {"count": 0, "errors": errors, "throughput_rps": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / duration, 2),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+async def virtual_user(
+    client: httpx.AsyncClient,
+    state: WorkloadState,
+    scenario: str,
+    recorder: Recorder,
+    deadline: float
+):
+    names, weights, operations = zip(*SCENARIOS[scenario])
+    while time.perf_counter() < deadline:
+        index = state.rng.choices(range(len(names)), weights)[0]
+        start = time.perf_counter()
+        status = None
+        try:
+            response = await operations[index](client, state)
+            status = response.status_code
+        except httpx.HTTPError:
+            pass
+        recorder.record(names[index], time.perf_counter() - start, status)
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    manifest: Dict,
+    scenario: str,
+    users: int,
+    duration: float,
+    warmup: float,
+    seed_value: int
+) -> Dict:
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + warmup + duration
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    # Every virtual user has its own generator: same seed, same request sequence
+    tasks = [
+        virtual_user(client, WorkloadState(manifest, random.Random(seed_value * 1000 + i)), scenario, recorder, deadline)
+        for i in range(users)
+    ]
+    await asyncio.gather(start_recording(), *tasks)
+    measured = time.perf_counter() - started - warmup
+
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    return {
+        "totals": summarize(all_latencies, sum(recorder.errors.values()), measured),
+        "operations": {
+            name: {**summarize(values, recorder.errors[name], measured), "statuses": dict(recorder.statuses[name])}
+            for name, values in sorted(recorder.latencies.items())
+        },
+        "measured_seconds": round(measured, 3)
+    }
+
+
+@asynccontextmanager
+async def inprocess_client(mongo_url: str, db_name: str):
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["DB_NAME"] = db_name
+    import server
+
+    # Runs the app's startup and shutdown handlers
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            yield client
+
+
+@asynccontextmanager
+async def uvicorn_client(mongo_url: str, db_name: str, port: int, workers: int):
+    env = {**os.environ, "MONGO_URL": mongo_url, "DB_NAME": db_name}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        async with url_client(url) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/api/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if process.poll() is not None:
+                    raise SystemExit("uvicorn exited during startup")
+                await asyncio.sleep(0.2)
+            else:
+                raise SystemExit("uvicorn did not start within 20s")
+            yield client
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@asynccontextmanager
+async def url_client(url: str):
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        yield client
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=BACKEND_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(options) -> Dict:
+    mongo_url = os.environ.get("MONGO_URL", DEFAULT_MONGO_URL)
+    manifest = await load_manifest(mongo_url, options.db)
+    if options.reseed:
+        volumes = manifest["volumes"]
+        manifest = await seed(
+            mongo_url, options.db, volumes["puzzles"], volumes["users"], volumes["scores"], volumes["days"],
+            manifest["seed"], progress=lambda message: None
+        )
+
+    if options.mode == "inprocess":
+        client_context = inprocess_client(mongo_url, options.db)
+    elif options.mode == "uvicorn":
+        client_context = uvicorn_client(mongo_url, options.db, options.port, options.workers)
+    else:
+        client_context = url_client(options.url)
+
+    async with client_context as client:
+        results = await drive(client, manifest, options.scenario, options.users, options.duration, options.warmup, options.seed)
+
+    return {
+        "meta": {
+            "scenario": options.scenario,
+            "mode": options.mode,
+            "users": options.users,
+            "duration": options.duration,
+            "warmup": options.warmup,
+            "seed": options.seed,
+            "workers": options.workers if options.mode == "uvicorn" else None,
+            "commit": git_commit(),
+            "volumes": manifest["volumes"],
+            "python": platform.python_version(),
+            "config": {key: value for key, value in sorted(os.environ.items()) if key.startswith(CONFIG_PREFIXES)},
+            "started_at": datetime.utcnow().isoformat()
+        },
+        **results
+    }
+
+
+def print_report(report: Dict):
+    meta, totals = report["meta"], report["totals"]
+    print(f"{meta['scenario']} ({meta['mode']}, {meta['users']} users, {report['measured_seconds']}s)")
+    print(f"{'operation':<22}{'count':>8}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in [*report["operations"].items(), ("total", totals)]:
+        print(
+            f"{name:<22}{stats['count']:>8}{stats['errors']:>8}{stats['throughput_rps']:>10}"
+            f"{stats.get('p50_ms', '-'):>10}{stats.get('p95_ms', '-'):>10}{stats.get('p99_ms', '-'):>10}"
+        )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Load-test the score and leaderboard APIs")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before measuring")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "url"], default="inprocess")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the uvicorn mode")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the request sequences")
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--reseed", action="store_true", help="Restore the seeded data before the run")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    options = parser.parse_args(args)
+
+    report = asyncio.run(run(options))
+    print_report(report)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
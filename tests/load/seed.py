@@ -0,0 +1,242 @@
+"""
+Seed a local mongod with synthetic puzzles, users and scores.
+
+The data is generated from a fixed random seed, so the same options always
+produce the same database. The target database is dropped first; to avoid
+accidents, only a database created by this script (or an empty one) is
+dropped.
+
+    python -m tests.load.seed [--puzzles 50] [--users 2000] [--scores 200000]
+                              [--days 60] [--seed 42] [--db puzzle_loadtest]
+
+MONGO_URL defaults to mongodb://localhost:27017.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from tests.load import DEFAULT_DB_NAME, DEFAULT_MONGO_URL
+
+from models import Puzzle, PuzzleImage, User  # noqa: E402
+from persistence import to_document  # noqa: E402
+from utils.scoring import calculate_game_scores  # noqa: E402
+
+MANIFEST_COLLECTION = "_loadtest"
+CATEGORIES = ["Nature", "Cities", "Art", "History", "Animals", "Space"]
+DIFFICULTIES = ["easy", "medium", "hard", "expert"]
+DIFFICULTY_WEIGHTS = [0.35, 0.35, 0.2, 0.1]
+# Median completion time (ms) and moves per difficulty
+MEDIAN_TIME = {"easy": 90_000, "medium": 240_000, "hard": 600_000, "expert": 1_200_000}
+MEDIAN_MOVES = {"easy": 20, "medium": 70, "hard": 150, "expert": 280}
+GUEST_FRACTION = 0.1
+CHUNK_SIZE = 10000
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def make_puzzles(count: int, rng: random.Random, now: datetime) -> List[Dict]:
+    puzzles = []
+    for i in range(count):
+        public_id = f"mavi-puzzles/loadtest_{i}"
+        puzzle = Puzzle(
+            id=_uuid(rng),
+            title=f"Load test puzzle {i}",
+            category=CATEGORIES[i % len(CATEGORIES)],
+            tags=["loadtest"],
+            original_image=PuzzleImage(
+                cloudinary_public_id=public_id,
+                url=f"https://res.cloudinary.com/demo/image/upload/{public_id}.jpg",
+                width=1920,
+                height=1280,
+                format="jpg"
+            ),
+            thumbnail_url=f"https://res.cloudinary.com/demo/image/upload/c_fill,w_300/{public_id}.jpg",
+            is_featured=i % 10 == 0,
+            display_order=i,
+            created_at=now - timedelta(days=365),
+            updated_at=now - timedelta(days=365)
+        )
+        document = to_document(puzzle)
+        # Cloudinary piece URLs are derived on demand (see puzzle_builder)
+        del document["piece_data"]
+        puzzles.append(document)
+    return puzzles
+
+
+def make_users(count: int, rng: random.Random, now: datetime) -> List[Dict]:
+    return [
+        to_document(User(
+            id=_uuid(rng),
+            email=f"player{i}@loadtest.local",
+            username=f"player{i}",
+            created_at=now - timedelta(days=365)
+        ))
+        for i in range(count)
+    ]
+
+
+def score_chunks(
+    count: int,
+    puzzle_ids: List[str],
+    user_ids: List[str],
+    days: int,
+    seed: int,
+    now: datetime
+):
+    """
+    Synthetic scores in chunks of CHUNK_SIZE documents
+    """
+    rng = np.random.default_rng(seed)
+    id_rng = random.Random(seed)
+    puzzle_ids = np.array(puzzle_ids, dtype=object)
+    # A few players play much more than the others
+    user_weights = 1.0 / np.arange(1, len(user_ids) + 1) ** 0.8
+    user_weights /= user_weights.sum()
+    user_ids = np.array(user_ids, dtype=object)
+
+    for start in range(0, count, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, count - start)
+        difficulties = rng.choice(np.array(DIFFICULTIES, dtype=object), size=size, p=DIFFICULTY_WEIGHTS)
+        median_time = np.array([MEDIAN_TIME[d] for d in difficulties], dtype=np.float64)
+        median_moves = np.array([MEDIAN_MOVES[d] for d in difficulties], dtype=np.float64)
+        times = np.maximum(5000, median_time * rng.lognormal(0, 0.5, size)).astype(np.int64)
+        moves = np.maximum(4, median_moves * rng.lognormal(0, 0.3, size)).astype(np.int64)
+        scores = calculate_game_scores(difficulties, times, moves)
+
+        users = rng.choice(user_ids, size=size, p=user_weights)
+        users[rng.random(size) < GUEST_FRACTION] = "guest"
+        puzzles = rng.choice(puzzle_ids, size=size)
+        ages = rng.random(size) * days * 86400
+
+        yield [
+            {
+                "id": _uuid(id_rng),
+                "user_id": users[i],
+                "puzzle_id": puzzles[i],
+                "completion_time": int(times[i]),
+                "moves": int(moves[i]),
+                "difficulty": difficulties[i],
+                "score": int(scores[i]),
+                "is_validated": True,
+                "completed_at": now - timedelta(seconds=float(ages[i]))
+            }
+            for i in range(size)
+        ]
+
+
+async def seed(
+    mongo_url: str,
+    db_name: str,
+    puzzles: int,
+    users: int,
+    scores: int,
+    days: int,
+    seed_value: int,
+    progress=print
+) -> Dict:
+    """
+    Returns:
+        The manifest stored in the database (ids and volumes), used by the runner
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from achievements import backfill_achievements
+    from aggregates import reconcile_aggregates
+    from distributions import rebuild_distributions
+    from indexes import ensure_indexes
+
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        db = client[db_name]
+        existing = await db.list_collection_names()
+        if existing and MANIFEST_COLLECTION not in existing:
+            raise SystemExit(f"Refusing to drop '{db_name}': it was not created by the load-test seeder")
+        await client.drop_database(db_name)
+
+        rng = random.Random(seed_value)
+        # Whole seconds, so reruns produce identical documents
+        now = datetime.utcnow().replace(microsecond=0)
+
+        puzzle_docs = make_puzzles(puzzles, rng, now)
+        user_docs = make_users(users, rng, now)
+        await db.puzzles.insert_many(puzzle_docs)
+        await db.users.insert_many(user_docs)
+        progress(f"puzzles: {len(puzzle_docs)}, users: {len(user_docs)}")
+
+        await ensure_indexes(db)
+
+        puzzle_ids = [doc["id"] for doc in puzzle_docs]
+        user_ids = [doc["id"] for doc in user_docs]
+        written = 0
+        started = time.perf_counter()
+        for chunk in score_chunks(scores, puzzle_ids, user_ids, days, seed_value, now):
+            await db.scores.insert_many(chunk, ordered=False)
+            written += len(chunk)
+            progress(f"scores: {written}/{scores}")
+        progress(f"scores written in {time.perf_counter() - started:.1f}s")
+
+        # Derived collections, as if every score had been submitted
+        await reconcile_aggregates(db)
+        await rebuild_distributions(db)
+        await backfill_achievements(db)
+
+        manifest = {
+            "_id": "manifest",
+            "seed": seed_value,
+            "volumes": {"puzzles": puzzles, "users": users, "scores": scores, "days": days},
+            "puzzle_ids": puzzle_ids,
+            "user_ids": user_ids,
+            "seeded_at": now
+        }
+        await db[MANIFEST_COLLECTION].insert_one(manifest)
+        return manifest
+    finally:
+        client.close()
+
+
+async def load_manifest(mongo_url: str, db_name: str) -> Dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        manifest = await client[db_name][MANIFEST_COLLECTION].find_one({"_id": "manifest"})
+    finally:
+        client.close()
+    if manifest is None:
+        raise SystemExit(f"'{db_name}' has not been seeded: run python -m tests.load.seed first")
+    return manifest
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Seed a load-test database")
+    parser.add_argument("--puzzles", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--scores", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=60, help="Scores are spread over the last N days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    options = parser.parse_args(args)
+
+    asyncio.run(seed(
+        os.environ.get("MONGO_URL", DEFAULT_MONGO_URL),
+        options.db,
+        options.puzzles,
+        options.users,
+        options.scores,
+        options.days,
+        options.seed
+    ))
+
+
+if __name__ == "__main__":
+    main()
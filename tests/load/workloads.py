@@ -0,0 +1,142 @@
+"""
+Request mixes driven by the load-test runner.
+
+A scenario is a weighted list of operations; every virtual user picks its
+next operation at random with these weights. Operation names are the keys
+of the report, so keep them stable between commits.
+
+    school_burst   a school group finishing the same few puzzles together:
+                   mostly submissions, plus rank lookups and the puzzle's
+                   leaderboard (contention on the same boards)
+    kiosk_polling  kiosks in the museum refreshing leaderboards and the
+                   puzzle catalog, with occasional submissions
+    mixed          a bit of everything
+"""
+
+import random
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+
+from tests.load.seed import DIFFICULTIES, MEDIAN_MOVES, MEDIAN_TIME
+
+# School groups play a handful of puzzles at one difficulty
+SCHOOL_PUZZLES = 3
+SCHOOL_DIFFICULTY = "medium"
+
+
+class WorkloadState:
+    """
+    Seeded ids and the per-user random generator operations draw from
+    """
+
+    def __init__(self, manifest: Dict, rng: random.Random):
+        self.puzzle_ids: List[str] = manifest["puzzle_ids"]
+        self.user_ids: List[str] = manifest["user_ids"]
+        self.rng = rng
+
+    def puzzle(self, school: bool = False) -> str:
+        if school:
+            return self.rng.choice(self.puzzle_ids[:SCHOOL_PUZZLES])
+        return self.rng.choice(self.puzzle_ids)
+
+    def difficulty(self) -> str:
+        return self.rng.choice(DIFFICULTIES)
+
+    def result(self, difficulty: str) -> Dict:
+        return {
+            "completion_time": int(MEDIAN_TIME[difficulty] * self.rng.lognormvariate(0, 0.5)),
+            "moves": max(4, int(MEDIAN_MOVES[difficulty] * self.rng.lognormvariate(0, 0.3)))
+        }
+
+
+Operation = Callable[[httpx.AsyncClient, WorkloadState], Awaitable[httpx.Response]]
+
+
+async def submit_score(client: httpx.AsyncClient, state: WorkloadState, school: bool = False) -> httpx.Response:
+    difficulty = SCHOOL_DIFFICULTY if school else state.difficulty()
+    return await client.post(
+        "/api/scores",
+        params={"user_id": state.rng.choice(state.user_ids)},
+        json={"puzzle_id": state.puzzle(school), "difficulty": difficulty, **state.result(difficulty)}
+    )
+
+
+async def school_submit(client, state):
+    return await submit_score(client, state, school=True)
+
+
+async def school_rank(client, state):
+    score = state.rng.randint(500, 2500)
+    return await client.get(
+        "/api/scores/rank",
+        params={"score": score, "puzzle_id": state.puzzle(school=True), "difficulty": SCHOOL_DIFFICULTY}
+    )
+
+
+async def school_puzzle_leaderboard(client, state):
+    return await client.get(
+        f"/api/scores/puzzle/{state.puzzle(school=True)}", params={"difficulty": SCHOOL_DIFFICULTY}
+    )
+
+
+async def leaderboard(client, state, timeframe: str = "all-time"):
+    params = {"timeframe": timeframe, "limit": 20}
+    if state.rng.random() < 0.5:
+        params["puzzle_id"] = state.puzzle()
+    return await client.get("/api/scores/leaderboard", params=params)
+
+
+async def leaderboard_daily(client, state):
+    return await leaderboard(client, state, "daily")
+
+
+async def leaderboard_weekly(client, state):
+    return await leaderboard(client, state, "weekly")
+
+
+async def puzzle_leaderboard(client, state):
+    return await client.get(f"/api/scores/puzzle/{state.puzzle()}")
+
+
+async def puzzle_list(client, state):
+    return await client.get("/api/admin/puzzles", params={"status": "published", "limit": 50})
+
+
+async def percentile(client, state):
+    difficulty = state.difficulty()
+    return await client.get(
+        "/api/scores/percentile",
+        params={"difficulty": difficulty, "puzzle_id": state.puzzle(), **state.result(difficulty)}
+    )
+
+
+async def user_history(client, state):
+    return await client.get(f"/api/scores/user/{state.rng.choice(state.user_ids)}")
+
+
+SCENARIOS: Dict[str, List[Tuple[str, float, Operation]]] = {
+    "school_burst": [
+        ("submit_score", 0.6, school_submit),
+        ("rank", 0.15, school_rank),
+        ("puzzle_leaderboard", 0.15, school_puzzle_leaderboard),
+        ("leaderboard", 0.1, leaderboard),
+    ],
+    "kiosk_polling": [
+        ("leaderboard", 0.35, leaderboard),
+        ("leaderboard_daily", 0.15, leaderboard_daily),
+        ("leaderboard_weekly", 0.1, leaderboard_weekly),
+        ("puzzle_leaderboard", 0.2, puzzle_leaderboard),
+        ("puzzle_list", 0.15, puzzle_list),
+        ("submit_score", 0.05, submit_score),
+    ],
+    "mixed": [
+        ("submit_score", 0.25, submit_score),
+        ("leaderboard", 0.2, leaderboard),
+        ("leaderboard_daily", 0.1, leaderboard_daily),
+        ("puzzle_leaderboard", 0.1, puzzle_leaderboard),
+        ("puzzle_list", 0.1, puzzle_list),
+        ("percentile", 0.1, percentile),
+        ("user_history", 0.15, user_history),
+    ],
+}
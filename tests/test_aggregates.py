@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import pytest
+
+from aggregates import apply_score_aggregates, puzzle_categories, reconcile_aggregates
+
+pytestmark = pytest.mark.anyio
+
+
+def score(score_id: str, user_id: str = "u1", puzzle_id: str = "p1", completion_time: int = 1000, **fields) -> dict:
+    return {
+        "id": score_id,
+        "user_id": user_id,
+        "puzzle_id": puzzle_id,
+        "difficulty": "easy",
+        "score": 100,
+        "completion_time": completion_time,
+        "moves": 10,
+        "completed_at": datetime(2026, 1, 5),
+        **fields
+    }
+
+
+async def submit(db, *scores: dict):
+    await db.scores.insert_many([dict(s) for s in scores])
+    await apply_score_aggregates(db, list(scores))
+
+
+async def counters(db):
+    puzzle = await db.puzzles.find_one({"id": "p1"})
+    user = await db.users.find_one({"id": "u1"})
+    return puzzle["metadata"], user["stats"]
+
+
+@pytest.fixture
+async def catalog(db):
+    puzzle_categories._entries.clear()
+    await db.puzzles.insert_one({"id": "p1", "category": "Nature", "metadata": {}})
+    await db.users.insert_one({"id": "u1", "stats": {}})
+
+
+async def test_categories_are_looked_up_once(db, catalog):
+    await submit(db, score("a"))
+    await db.puzzles.update_one({"id": "p1"}, {"$set": {"category": "City"}})
+    await submit(db, score("b"))
+    assert (await counters(db))[1]["category_counts"] == {"Nature": 2}
+
+    # Edits drop the cached category
+    puzzle_categories.forget("p1")
+    await submit(db, score("c"))
+    assert (await counters(db))[1]["category_counts"] == {"Nature": 2, "City": 1}
+
+
+async def test_reconcile_excludes_flagged_scores_everywhere(db, catalog):
+    await submit(db, score("a", completion_time=1000), score("b", completion_time=3000))
+    await db.scores.update_one({"id": "b"}, {"$set": {"is_validated": False}})
+
+    await reconcile_aggregates(db)
+
+    metadata, stats = await counters(db)
+    assert (metadata["total_plays"], metadata["total_completions"], metadata["total_completion_time"]) == (1, 1, 1000)
+    assert (stats["total_puzzles_completed"], stats["total_play_time"]) == (1, 1000)
+    assert stats["category_counts"] == {"Nature": 1}
+
+    # Counted the same way as a fresh submission of the remaining score
+    await db.scores.delete_many({})
+    await db.puzzles.update_one({"id": "p1"}, {"$set": {"metadata": {}}})
+    await submit(db, score("a", completion_time=1000))
+    fresh = (await counters(db))[0]
+    assert (fresh["total_plays"], fresh["total_completions"]) == (1, 1)
+
+
+class RacingDatabase:
+    """
+    Database where a score is submitted right after each scan of the scores
+    by the first reconcile pass (too late for the scan to count it)
+    """
+
+    def __init__(self, db, *late: dict):
+        self.db = db
+        self.late = list(late)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    @property
+    def scores(self):
+        return RacingScores(self)
+
+
+class RacingScores:
+    def __init__(self, racing: RacingDatabase):
+        self.racing = racing
+        self.collection = racing.db.scores
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def aggregate(self, pipeline, **kwargs):
+        rows = [row async for row in self.collection.aggregate(pipeline, **kwargs)]
+        if self.racing.late:
+            await submit(self.racing.db, self.racing.late.pop(0))
+        for row in rows:
+            yield row
+
+
+async def test_reconcile_keeps_concurrent_submissions(db, catalog):
+    await submit(db, score("a", completion_time=1000))
+    await db.puzzles.update_one({"id": "p1"}, {"$set": {"metadata.total_plays": 7}})
+
+    await reconcile_aggregates(RacingDatabase(db, score("b", completion_time=2000), score("c", completion_time=4000)))
+
+    metadata, stats = await counters(db)
+    assert (metadata["total_plays"], metadata["total_completion_time"]) == (3, 7000)
+    assert (stats["total_puzzles_completed"], stats["total_play_time"]) == (3, 7000)
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+from cloudinary.utils import build_eager
+
+from cloudinary_service import ATLAS_TRANSFORMATION, configure_cloudinary, generate_atlas_url
+
+
+@pytest.fixture(scope="module", autouse=True)
+def cloudinary_config():
+    os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "demo")
+    configure_cloudinary()
+
+
+def test_eager_atlas_matches_the_atlas_url():
+    # The upload pre-renders exactly the derived asset the atlas URL requests
+    eager = build_eager([{"transformation": ATLAS_TRANSFORMATION}])
+    url = generate_atlas_url("mavi-puzzles/abc")
+
+    assert url.endswith(f"/image/upload/{eager}/v1/mavi-puzzles/abc")
+    assert "q_auto:best" in eager
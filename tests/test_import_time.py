@@ -0,0 +1,84 @@
+"""
+Startup budget of the backend, from `python -X importtime -c "import server"`.
+
+    python -m pytest tests/test_import_time.py -q
+
+Fails when a module kept out of startup (NumPy, Pillow, the Cloudinary
+SDK: imported on first use) is imported by `server`, or when importing
+`server` takes longer than IMPORT_BUDGET_MS (median of IMPORT_RUNS fresh
+interpreters). The failure lists the slowest imports.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+IMPORT_RUNS = int(os.environ.get("IMPORT_RUNS", "3"))
+LAZY_PACKAGES = ["numpy", "PIL", "cloudinary"]
+
+
+def profile_import() -> List[Tuple[str, int, int]]:
+    """
+    Returns:
+        (module, self us, cumulative us) of every import, in importtime order
+    """
+    env = {**os.environ, "MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "import_time"}
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        pytest.fail(f"import server failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def slowest(imports: List[Tuple[str, int, int]], count: int = 15) -> str:
+    rows = sorted(imports, key=lambda row: row[1], reverse=True)[:count]
+    return "\n".join(f"{self_us / 1000:8.1f} ms  {name}" for name, self_us, _ in rows)
+
+
+@pytest.fixture(scope="module")
+def profiles() -> List[List[Tuple[str, int, int]]]:
+    return [profile_import() for _ in range(IMPORT_RUNS)]
+
+
+def test_heavy_modules_are_imported_lazily(profiles):
+    imported: Dict[str, List[str]] = {}
+    for name, _, _ in profiles[0]:
+        package = name.split(".")[0]
+        if package in LAZY_PACKAGES:
+            imported.setdefault(package, []).append(name)
+
+    assert not imported, f"Imported at startup: {sorted(imported)}\n{slowest(profiles[0])}"
+
+
+def test_import_within_budget(profiles):
+    totals = []
+    for imports in profiles:
+        server = [cumulative for name, _, cumulative in imports if name == "server"]
+        assert server, "server missing from the -X importtime output"
+        totals.append(server[-1] / 1000)
+
+    total_ms = statistics.median(totals)
+    assert total_ms <= IMPORT_BUDGET_MS, (
+        f"import server: {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms), slowest imports:\n"
+        f"{slowest(profiles[0])}"
+    )
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from leaderboard_engine import WILDCARD, LeaderboardEngine, TopK
+
+pytestmark = pytest.mark.anyio
+
+
+def entry(score_id: str, score: int, puzzle_id: str = "p1", difficulty: str = "easy") -> dict:
+    return {
+        "id": score_id,
+        "user_id": "u1",
+        "puzzle_id": puzzle_id,
+        "difficulty": difficulty,
+        "score": score,
+        "completion_time": 1000,
+        "moves": 10
+    }
+
+
+async def insert(db, *entries: dict):
+    await db.scores.insert_many([dict(e) for e in entries])
+
+
+def scores(rows) -> list:
+    return [row["score"] for row in rows]
+
+
+def test_topk_keeps_the_highest_scores():
+    board = TopK(3)
+    for i, score in enumerate([50, 90, 70, 10, 80]):
+        board.add(entry(f"s{i}", score))
+
+    assert scores(board.top(3)) == [90, 80, 70]
+    assert board.truncated
+    assert board.can_serve(3)
+    assert not board.can_serve(4)
+
+
+def test_topk_rejects_entries_below_the_horizon_after_a_discard():
+    board = TopK(2)
+    for i, score in enumerate([100, 90, 80]):
+        board.add(entry(f"s{i}", score))
+
+    board.discard("s1")
+    # 80 was dropped: a lower score must not take the freed slot
+    assert not board.add(entry("s3", 50))
+    assert scores(board.top(2)) == [100]
+    assert not board.can_serve(2)
+
+    # Scores above the horizon are still exact
+    assert board.add(entry("s4", 95))
+    assert scores(board.top(2)) == [100, 95]
+
+
+async def test_discard_on_a_truncated_board_is_served_from_the_database(db):
+    await insert(db, entry("a", 100), entry("b", 90), entry("c", 80))
+    engine = LeaderboardEngine(capacity=2)
+    await engine.warm(db)
+
+    await db.scores.delete_one({"id": "b"})
+    engine.discard("b")
+    await insert(db, entry("d", 50))
+    engine.add(entry("d", 50))
+
+    assert scores(await engine.get_top(db, None, None, 2)) == [100, 80]
+    # The board was reloaded and serves from memory again
+    assert engine.boards[(WILDCARD, WILDCARD)].can_serve(2)
+    assert scores(engine.boards[(WILDCARD, WILDCARD)].top(2)) == [100, 80]
+
+
+async def test_untruncated_board_serves_short_leaderboards(db):
+    await insert(db, entry("a", 100), entry("b", 90))
+    engine = LeaderboardEngine(capacity=5)
+    await engine.warm(db)
+
+    engine.add(entry("c", 95))
+    engine.discard("a")
+
+    assert scores(await engine.get_top(db, "p1", None, 5)) == [95, 90]
+
+
+async def test_rebuild_matches_the_database(db):
+    await insert(db, *(entry(f"s{i}", i * 10, puzzle_id=f"p{i % 3}") for i in range(20)))
+    engine = LeaderboardEngine(capacity=4)
+    await engine.warm(db)
+
+    await db.scores.update_one({"id": "s19"}, {"$set": {"is_validated": False}})
+    await engine.rebuild(db)
+
+    assert scores(await engine.get_top(db, None, None, 4)) == [180, 170, 160, 150]
+    assert (await engine.check_consistency(db))["consistent"]
+
+
+class GatedDatabase:
+    """
+    Database whose score queries wait for `release`, counting them
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.release = asyncio.Event()
+        self.queries = 0
+
+    @property
+    def scores(self):
+        return self
+
+    def find(self, *args, **kwargs):
+        self.queries += 1
+        return GatedCursor(self, self.db.scores.find(*args, **kwargs))
+
+
+class GatedCursor:
+    def __init__(self, gate: GatedDatabase, cursor):
+        self.gate = gate
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def limit(self, count: int):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length: int):
+        await self.gate.release.wait()
+        return await self.cursor.to_list(length)
+
+
+async def test_concurrent_loads_share_one_query_and_replay_once(db):
+    await insert(db, entry("a", 100), entry("b", 90))
+    engine = LeaderboardEngine(capacity=5)
+    engine.ready = True
+    gated = GatedDatabase(db)
+
+    readers = [asyncio.ensure_future(engine.get_top(gated, "p1", "easy", 5)) for _ in range(2)]
+    await asyncio.sleep(0)
+    # Submitted and discarded while both readers wait for the load
+    await insert(db, entry("c", 95))
+    engine.add(entry("c", 95))
+    engine.discard("b")
+    await db.scores.delete_one({"id": "b"})
+    gated.release.set()
+
+    results = await asyncio.gather(*readers)
+
+    assert gated.queries == 1
+    assert [scores(rows) for rows in results] == [[100, 95]] * 2
+    assert scores(engine.boards[("p1", "easy")].top(5)) == [100, 95]
+
+
+async def test_unknown_puzzles_do_not_create_boards(db):
+    await insert(db, entry("a", 100))
+    engine = LeaderboardEngine(capacity=5)
+    await engine.warm(db)
+    boards = set(engine.boards)
+
+    assert await engine.get_top(db, "unknown", None, 5) == []
+    assert await engine.get_top(db, "unknown", "easy", 5) == []
+    assert set(engine.boards) == boards
+
+    # The first score of a new puzzle creates its boards
+    engine.add(entry("b", 80, puzzle_id="p2"))
+    assert scores(await engine.get_top(db, "p2", None, 5)) == [80]
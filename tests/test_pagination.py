@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ASCENDING
+
+from pagination import PUZZLE_SORT, SCORE_HISTORY_SORT, decode_cursor, encode_cursor, fetch_page
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1)
+
+
+async def walk(collection, query, projection, sort, limit):
+    """
+    Every page of a listing, following the cursors
+    """
+    pages, cursor = [], None
+    while True:
+        docs, cursor = await fetch_page(collection, query, projection, sort, limit, cursor=cursor)
+        pages.append(docs)
+        if cursor is None:
+            return pages
+
+
+async def test_cursor_walks_every_score_once_in_order(db):
+    # Many equal timestamps: the _id tiebreak orders them
+    await db.scores.insert_many([
+        {"id": f"s{i}", "user_id": "u1", "score": i, "completed_at": START + timedelta(minutes=i // 4)}
+        for i in range(23)
+    ])
+    await db.scores.insert_one({"id": "other", "user_id": "u2", "completed_at": START})
+
+    pages = await walk(db.scores, {"user_id": "u1"}, {"_id": 0}, SCORE_HISTORY_SORT, 5)
+    ids = [doc["id"] for page in pages for doc in page]
+    expected = await db.scores.find({"user_id": "u1"}).sort(SCORE_HISTORY_SORT).to_list(None)
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    assert ids == [doc["id"] for doc in expected]
+    assert all("_id" not in doc for page in pages for doc in page)
+
+
+async def test_cursor_handles_null_missing_and_legacy_sort_values(db):
+    await db.puzzles.insert_many([
+        {"id": "dated", "display_order": 0, "created_at": START},
+        {"id": "newer", "display_order": 0, "created_at": START + timedelta(days=1)},
+        {"id": "legacy", "display_order": 0, "created_at": "2023-05-01T00:00:00"},
+        {"id": "legacy_2", "display_order": 0, "created_at": "2023-06-01T00:00:00"},
+        {"id": "null_date", "display_order": 0, "created_at": None},
+        {"id": "no_date", "display_order": 0},
+        {"id": "no_order", "created_at": START},
+        {"id": "null_order", "display_order": None, "created_at": START},
+        {"id": "later", "display_order": 1, "created_at": START},
+    ])
+
+    for limit in (1, 2, 4):
+        pages = await walk(db.puzzles, {}, {"_id": 0}, PUZZLE_SORT, limit)
+        ids = [doc["id"] for page in pages for doc in page]
+
+        assert sorted(ids) == sorted(["dated", "newer", "legacy", "legacy_2", "null_date", "no_date",
+                                      "no_order", "null_order", "later"])
+        # MongoDB order: null display_order first, then dates before strings before nulls (descending)
+        assert ids.index("newer") < ids.index("dated") < ids.index("legacy_2") < ids.index("legacy")
+        assert ids.index("legacy") < ids.index("no_date") and ids.index("legacy") < ids.index("null_date")
+        assert ids.index("no_order") < ids.index("dated") and ids.index("null_order") < ids.index("dated")
+        assert ids[-1] == "later"
+
+
+def test_cursor_round_trips_sort_values():
+    doc = {"display_order": 3, "created_at": START, "_id": ObjectId()}
+
+    assert decode_cursor(encode_cursor(doc, PUZZLE_SORT), PUZZLE_SORT) == [3, START, doc["_id"]]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bnVsbA", "W1td", "W3siJG9pZCI6ICJ4In0sMSwyXQ"])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, [("a", ASCENDING), ("b", ASCENDING), ("c", ASCENDING)])
+    assert error.value.status_code == 400
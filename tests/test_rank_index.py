@@ -0,0 +1,110 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from leaderboard_engine import board_query
+from rank_index import MAX_SCORE, RankIndex, ScoreCounts
+
+pytestmark = pytest.mark.anyio
+
+
+def score(score_id: str, value: int, puzzle_id: str = "p1", difficulty: str = "easy", **fields) -> dict:
+    return {"id": score_id, "user_id": "u1", "puzzle_id": puzzle_id, "difficulty": difficulty, "score": value, **fields}
+
+
+async def expected_rank(db, value: int, puzzle_id=None, difficulty=None):
+    query = board_query(puzzle_id, difficulty)
+    return (
+        await db.scores.count_documents({**query, "score": {"$gt": value}}) + 1,
+        await db.scores.count_documents(query)
+    )
+
+
+async def warm(index: RankIndex, db, puzzle_id=None, difficulty=None):
+    await index.rank(db, 0, puzzle_id, difficulty)
+    await asyncio.gather(*index._inflight.values())
+
+
+def test_score_counts_match_a_sorted_list():
+    rng = random.Random(17)
+    values = [rng.choice([rng.randint(0, MAX_SCORE), rng.randint(MAX_SCORE, MAX_SCORE + 50)]) for _ in range(2000)]
+    counts = ScoreCounts(np.array(values))
+    for value in values[:300]:
+        counts.add(value, -1)
+    remaining = sorted(values[300:])
+
+    for probe in [-1, 0, 1, MAX_SCORE - 1, MAX_SCORE, MAX_SCORE + 1, MAX_SCORE + 60] + remaining[::50]:
+        assert counts.count_greater(probe) == sum(1 for value in remaining if value > probe)
+
+
+async def test_ranks_match_count_documents(db):
+    rng = random.Random(7)
+    docs = [
+        score(f"s{i}", rng.randint(0, 3000), puzzle_id=rng.choice(["p1", "p2"]), difficulty=rng.choice(["easy", "hard"]))
+        for i in range(400)
+    ]
+    docs[0]["is_validated"] = False
+    await db.scores.insert_many([dict(doc) for doc in docs])
+    index = RankIndex()
+    filters = [(None, None), ("p1", None), (None, "hard"), ("p2", "easy")]
+    for puzzle_id, difficulty in filters:
+        await warm(index, db, puzzle_id, difficulty)
+
+    # Kept in sync with submissions, deletions and flags
+    submitted = score("new", 1500, puzzle_id="p2", difficulty="easy")
+    await db.scores.insert_one(dict(submitted))
+    index.add(submitted)
+    for removed in docs[1:4]:
+        await db.scores.delete_one({"id": removed["id"]})
+        index.discard(removed)
+
+    for puzzle_id, difficulty in filters:
+        for value in [0, 1500, 2999, 3000, rng.randint(0, 3000)]:
+            assert await index.rank(db, value, puzzle_id, difficulty) == await expected_rank(db, value, puzzle_id, difficulty)
+
+
+class CountingDatabase:
+    def __init__(self, db):
+        self.db = db
+        self.loads = 0
+
+    @property
+    def scores(self):
+        return self
+
+    def aggregate(self, *args, **kwargs):
+        self.loads += 1
+        return self.db.scores.aggregate(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return self.db.scores.find(*args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self.db.scores.count_documents(*args, **kwargs)
+
+
+async def test_cold_lookups_count_with_the_indexes_and_share_one_load(db):
+    await db.scores.insert_many([score("a", 100), score("b", 90), score("c", 80)])
+    index = RankIndex()
+    counting = CountingDatabase(db)
+
+    # Answered before the board is loaded
+    results = await asyncio.gather(*(index.rank(counting, 85, "p1") for _ in range(3)))
+    assert results == [(3, 3)] * 3
+    await asyncio.gather(*index._inflight.values())
+
+    assert counting.loads == 1
+    assert ("p1", "*") in index.boards
+    assert await index.rank(counting, 85, "p1") == (3, 3)
+
+
+async def test_clear_discards_loads_in_progress(db):
+    await db.scores.insert_one(score("a", 100))
+    index = RankIndex()
+    await index.rank(db, 0)
+    index.clear()
+    await asyncio.gather(*index._inflight.values())
+
+    assert not index.boards
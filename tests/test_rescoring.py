@@ -0,0 +1,36 @@
+import pytest
+
+from distributions import ScoreDistribution, load_distribution, record_distributions
+from rescoring import RescoreJob
+from utils.scoring import calculate_game_score
+
+pytestmark = pytest.mark.anyio
+
+
+def score(score_id: str, stored: int, moves: int) -> dict:
+    return {
+        "id": score_id,
+        "user_id": "u1",
+        "puzzle_id": "p1",
+        "difficulty": "easy",
+        "score": stored,
+        "completion_time": 60_000,
+        "moves": moves
+    }
+
+
+async def test_rescore_rebuilds_the_distributions(db):
+    scores = [score("a", 1, 10), score("b", 2, 20)]
+    await db.scores.insert_many([dict(s) for s in scores])
+    await record_distributions(db, scores)
+
+    job = RescoreJob()
+    assert job.start(db)
+    await job._task
+    assert job.status == "completed" and job.progress["updated"] == 2
+
+    distribution = await load_distribution(db, "easy", "p1")
+    expected = ScoreDistribution(2)
+    expected.sketches["score"].add([calculate_game_score("easy", 60_000, moves) for moves in (10, 20)])
+    assert distribution.count == 2
+    assert distribution.sketches["score"].histogram() == expected.sketches["score"].histogram()
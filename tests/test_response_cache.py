@@ -0,0 +1,64 @@
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from response_cache import ResponseCache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def app(db):
+    app = FastAPI()
+    app.state.cache = ResponseCache()
+    app.state.builds = 0
+
+    @app.get("/puzzles/{puzzle_id}")
+    async def get_puzzle(puzzle_id: str, request: Request):
+        async def build():
+            app.state.builds += 1
+            return await db.puzzles.find_one({"id": puzzle_id}, {"_id": 0}), {}
+
+        return await app.state.cache.respond(request, build, puzzle_id=puzzle_id)
+
+    return app
+
+
+@pytest.fixture
+async def client(app, db):
+    await db.puzzles.insert_one({"id": "p1", "title": "Lake"})
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_matching_etag_gets_a_304_without_a_rebuild(app, client):
+    first = await client.get("/puzzles/p1")
+    assert first.status_code == 200
+    assert first.json() == {"id": "p1", "title": "Lake"}
+    etag = first.headers["etag"]
+
+    revalidated = await client.get("/puzzles/p1", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+    # Weak and listed validators match too
+    weak = await client.get("/puzzles/p1", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert weak.status_code == 304
+    assert app.state.builds == 1
+    assert app.state.cache.not_modified == 2
+
+    stale = await client.get("/puzzles/p1", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.headers["etag"] == etag
+
+
+async def test_invalidation_changes_the_etag(app, client, db):
+    etag = (await client.get("/puzzles/p1")).headers["etag"]
+
+    await db.puzzles.update_one({"id": "p1"}, {"$set": {"title": "River"}})
+    await app.state.cache.invalidate(db, "p1")
+
+    changed = await client.get("/puzzles/p1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "River"
+    assert changed.headers["etag"] != etag
+    assert app.state.builds == 2
@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+
+from indexes import INDEXES
+from rollups import get_rollup_top, invalidate_rollups, record_rollups
+
+pytestmark = pytest.mark.anyio
+
+
+def score(score_id: str, value: int) -> dict:
+    return {
+        "id": score_id,
+        "user_id": "u1",
+        "puzzle_id": "p1",
+        "difficulty": "easy",
+        "score": value,
+        "completion_time": 1000,
+        "moves": 10,
+        "completed_at": datetime.utcnow()
+    }
+
+
+async def submit(db, *scores: dict):
+    await db.scores.insert_many([dict(s) for s in scores])
+    await record_rollups(db, list(scores))
+
+
+@pytest.fixture
+async def rollups(db):
+    await db.leaderboard_rollups.create_indexes(INDEXES["leaderboard_rollups"][:1])
+
+
+class RacingDatabase:
+    """
+    Database where `late` is submitted right after the next rebuild query
+    """
+
+    def __init__(self, db, late: dict):
+        self.db = db
+        self.late = late
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    @property
+    def scores(self):
+        return RacingScores(self)
+
+
+class RacingScores:
+    def __init__(self, racing: RacingDatabase):
+        self.racing = racing
+        self.cursor = None
+
+    def find(self, *args, **kwargs):
+        self.cursor = self.racing.db.scores.find(*args, **kwargs)
+        return self
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def limit(self, count: int):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length):
+        docs = await self.cursor.to_list(length)
+        if self.racing.late:
+            late, self.racing.late = self.racing.late, None
+            await submit(self.racing.db, late)
+        return docs
+
+
+def ids(entries) -> list:
+    return [entry["id"] for entry in entries]
+
+
+@pytest.mark.parametrize("existing", [False, True])
+async def test_rebuild_does_not_overwrite_a_concurrent_push(db, rollups, existing):
+    await submit(db, score("a", 100))
+    if existing:
+        await submit(db, score("b", 90))
+        await db.scores.delete_one({"id": "b"})
+        await invalidate_rollups(db, "b")
+    else:
+        await db.leaderboard_rollups.delete_many({})
+
+    # The racing rebuild misses "c" and must not store its result
+    assert ids(await get_rollup_top(RacingDatabase(db, score("c", 95)), "daily", None, None, 10)) == ["a"]
+
+    assert ids(await get_rollup_top(db, "daily", None, None, 10)) == ["a", "c"]
+    rollup = await db.leaderboard_rollups.find_one({"period": "day", "puzzle_id": "*", "difficulty": "*"})
+    assert rollup["complete"] and ids(rollup["entries"]) == ["a", "c"]
+
+    # Rebuilt rollups still take pushes and invalidations
+    await submit(db, score("d", 80))
+    await db.scores.delete_one({"id": "a"})
+    await invalidate_rollups(db, "a")
+    assert ids(await get_rollup_top(db, "daily", None, None, 10)) == ["c", "d"]
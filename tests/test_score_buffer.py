@@ -0,0 +1,126 @@
+import fcntl
+from datetime import datetime, timezone
+
+import pytest
+from bson import json_util
+
+import score_buffer
+from score_buffer import PENDING_FIELD, ScoreWriteBuffer, write_scores
+
+pytestmark = pytest.mark.anyio
+
+
+def score(score_id: str, puzzle_id: str = "p1", user_id: str = "guest", **fields) -> dict:
+    return {
+        "id": score_id,
+        "user_id": user_id,
+        "puzzle_id": puzzle_id,
+        "difficulty": "easy",
+        "score": 100,
+        "completion_time": 1000,
+        "moves": 10,
+        **fields,
+        "completed_at": datetime(2026, 1, 5, tzinfo=timezone.utc)
+    }
+
+
+async def plays(db, puzzle_id: str = "p1") -> int:
+    puzzle = await db.puzzles.find_one({"id": puzzle_id})
+    return puzzle["metadata"]["total_plays"]
+
+
+async def test_retry_applies_only_the_missing_follow_up_writes(db, monkeypatch):
+    await db.scores.create_index("id", unique=True)
+    await db.puzzles.insert_one({"id": "p1", "metadata": {}})
+    writes = list(score_buffer.FOLLOW_UP_WRITES)
+
+    async def failing(db, scores):
+        raise RuntimeError("rollups unavailable")
+
+    monkeypatch.setattr(
+        score_buffer, "FOLLOW_UP_WRITES", [(name, failing if name == "rollups" else write) for name, write in writes]
+    )
+    with pytest.raises(RuntimeError):
+        await write_scores(db, [score("a"), score("b")])
+
+    stored = await db.scores.find({}, {"_id": 0}).to_list(None)
+    assert [doc[PENDING_FIELD] for doc in stored] == [["rollups", "achievements"]] * 2
+    assert await plays(db) == 2
+
+    # The retry inserts nothing, counts nothing twice and finishes the rollups
+    monkeypatch.setattr(score_buffer, "FOLLOW_UP_WRITES", writes)
+    assert await write_scores(db, [score("a"), score("b"), score("c")]) == 1
+
+    assert await plays(db) == 3
+    assert await db.scores.count_documents({PENDING_FIELD: {"$exists": True}}) == 0
+    assert await db.leaderboard_rollups.count_documents({}) > 0
+
+
+async def test_achievements_are_merged_once_per_user(db, monkeypatch):
+    import achievements
+    from utils.scoring import achievement_evaluator
+
+    # mongomock has no $bit: record the mask each user update would OR in
+    monkeypatch.setattr(achievements, "_bit_update", lambda mask: {"$set": {"bits": mask}})
+    await db.puzzles.insert_one({"id": "p1", "metadata": {}})
+    await write_scores(db, [
+        score("a", user_id="u1", completion_time=20_000),
+        score("b", user_id="u1", moves=5),
+        score("c", user_id="u2", difficulty="master", completion_time=90_000),
+        score("d", difficulty="master")
+    ])
+
+    bits = {doc["user_id"]: doc["bits"] for doc in await db.user_achievements.find().to_list(None)}
+    assert bits == {
+        "u1": achievement_evaluator.bits["speed_demon"] | achievement_evaluator.bits["perfect_easy"],
+        "u2": achievement_evaluator.bits["master_solver"]
+    }
+
+
+def journal(path, *scores: dict):
+    path.write_text("".join(json_util.dumps(s) + "\n" for s in scores), encoding="utf-8")
+
+
+async def test_replay_skips_segments_of_live_workers(db, tmp_path):
+    await db.puzzles.insert_one({"id": "p1", "metadata": {}})
+    live = tmp_path / "scores-100-live-1.jsonl"
+    journal(live, score("live"))
+    journal(tmp_path / "scores-200-gone-1.jsonl", score("gone"))
+    (tmp_path / "200-gone.lock").touch()
+    journal(tmp_path / "scores-1.jsonl", score("legacy"))
+
+    with open(tmp_path / "100-live.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        buffer = ScoreWriteBuffer(tmp_path, enabled=True)
+        await buffer.start(db)
+        await buffer.close()
+
+    assert sorted(doc["id"] for doc in await db.scores.find().to_list(None)) == ["gone", "legacy"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["100-live.lock", live.name]
+    assert await plays(db) == 2
+
+
+async def test_board_loads_include_buffered_scores(db, tmp_path, monkeypatch):
+    from leaderboard_engine import LeaderboardEngine
+    from rank_index import RankIndex
+
+    await db.scores.insert_many([score("a", score=300), score("b", score=200)])
+    buffer = ScoreWriteBuffer(tmp_path, enabled=True)
+    monkeypatch.setattr(score_buffer, "score_buffer", buffer)
+    engine = LeaderboardEngine(capacity=2)
+    index = RankIndex()
+    await engine.warm(db)
+
+    # Accepted in buffered mode: on the boards, not in `scores` yet
+    submitted = {**score("new", score=250), "completed_at": datetime.now(timezone.utc)}
+    await buffer.add(submitted)
+    engine.add(submitted)
+    index.add(submitted)
+
+    # Board loads from `scores` alone would drop it
+    await engine.rebuild(db)
+    await index._load_board(db, ("p1", "*"))
+
+    assert [row["id"] for row in await engine.get_top(db, "p1", None, 2)] == ["a", "new"]
+    assert await index.rank(db, 250, "p1") == (2, 3)
+    assert await db.scores.count_documents({}) == 2
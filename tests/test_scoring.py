@@ -0,0 +1,34 @@
+import random
+
+import numpy as np
+
+from utils.scoring import DIFFICULTY_MULTIPLIERS, calculate_game_score, calculate_game_scores
+
+DIFFICULTIES = list(DIFFICULTY_MULTIPLIERS) + ["unknown", ""]
+
+
+def scalar_scores(difficulties, times, moves) -> list:
+    return [calculate_game_score(d, t, m) for d, t, m in zip(difficulties, times, moves)]
+
+
+def test_vectorized_scores_match_the_scalar_function():
+    rng = random.Random(13)
+    count = 5000
+    difficulties = [rng.choice(DIFFICULTIES) for _ in range(count)]
+    # Odd milliseconds exercise the truncation of the half-point time penalty
+    times = [rng.choice([rng.randint(0, 10_000), rng.randint(0, 10_000_000)]) for _ in range(count)]
+    moves = [rng.randint(0, 3000) for _ in range(count)]
+
+    vectorized = calculate_game_scores(difficulties, times, moves)
+
+    assert vectorized.dtype == np.int64
+    assert vectorized.tolist() == scalar_scores(difficulties, times, moves)
+
+
+def test_vectorized_scores_match_at_the_edges():
+    difficulties = ["beginner", "easy", "master", "expert", "hard", "unknown"]
+    times = [0, 499, 500, 999, 1_000_000_000, 1501]
+    moves = [0, 1, 999, 0, 0, 1000]
+
+    assert calculate_game_scores(difficulties, times, moves).tolist() == scalar_scores(difficulties, times, moves)
+    assert calculate_game_scores([], [], []).tolist() == []